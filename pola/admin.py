@@ -1,9 +1,24 @@
 from django.contrib import admin
 
-from .models import Query
+from .models import Query, SearchQueryStats
 
 
 @admin.register(Query)
 class QueryAdmin(admin.ModelAdmin):
     list_display = ('id', 'client', 'timestamp')
     list_filter = ('client', 'timestamp')
+
+
+@admin.register(SearchQueryStats)
+class SearchQueryStatsAdmin(admin.ModelAdmin):
+    list_display = ('text', 'day', 'count', 'zero_results_count')
+    search_fields = ('text',)
+    date_hierarchy = 'day'
+    # Latest days first, within a day the most common searches without results.
+    ordering = ('-day', '-zero_results_count', '-count')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
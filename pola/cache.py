@@ -0,0 +1,296 @@
+"""Tiered cache: a bounded cache in the memory of the process in front of a cache shared by all processes.
+
+Values read from or written to the shared cache (Redis in production) are also kept by the process for a few
+seconds, so repeated reads of popular keys, e.g. pages of the website or the configuration of the app, do not wait
+for the network. Changes made by other processes are seen when the local copy expires.
+
+Keys are grouped in namespaces by prefix, each with its own timeouts. Locks and counters, which must always be read
+from the shared cache, belong to namespaces with ``LOCAL_TIMEOUT`` 0. ``add()`` and ``incr()`` are always done by
+the shared cache.
+
+:meth:`TieredCache.get_or_set` computes a missing value once: other threads and processes wait for the value instead
+of computing it at the same time.
+
+Errors of Redis are logged and do not fail requests: reads are misses, writes and deletes are skipped, ``add()``
+returns ``False`` and ``incr()`` returns ``None``.
+
+Example configuration::
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'pola.cache.TieredCache',
+            'OPTIONS': {
+                'SHARED_CACHE': 'redis',
+                'MAX_ENTRIES': 10000,
+                'LOCAL_TIMEOUT': 5,
+                'NAMESPACES': {
+                    'views.decorators.cache.': {'LOCAL_TIMEOUT': 60},
+                    'concurency_': {'LOCAL_TIMEOUT': 0},
+                },
+            },
+        },
+        'redis': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://localhost:6379'},
+    }
+"""
+
+import logging
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from redis.exceptions import RedisError
+
+from pola import metrics
+
+# Threads of a process computing values in get_or_set() are serialized by one of these locks, chosen by the key.
+FLIGHT_LOCKS = 64
+FLIGHT_POLL_INTERVAL = 0.05
+
+_MISSING = object()
+
+LOGGER = logging.getLogger(__name__)
+
+
+class Namespace(NamedTuple):
+    # Timeout in the shared cache used instead of the default timeout of the cache.
+    timeout: object
+    local_timeout: float
+
+
+class LocalTier:
+    """LRU cache of pickled values shared by the threads of the process."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.flight_locks = [threading.Lock() for _ in range(FLIGHT_LOCKS)]
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, pickled, timeout):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + timeout, pickled)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+# Django creates instances of cache backends for every thread, so the local tiers are kept by location, like
+# LocMemCache does.
+_local_tiers = {}
+_local_tiers_lock = threading.Lock()
+
+metrics.register_gauge('cache.local', lambda: {location: tier.stats() for location, tier in _local_tiers.items()})
+
+
+class TieredCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = options['SHARED_CACHE']
+        self._default_namespace = Namespace(timeout=DEFAULT_TIMEOUT, local_timeout=options.get('LOCAL_TIMEOUT', 5))
+        # The longest prefix matching a key wins.
+        self._namespaces = [
+            (
+                prefix,
+                Namespace(
+                    timeout=config.get('TIMEOUT', DEFAULT_TIMEOUT),
+                    local_timeout=config.get('LOCAL_TIMEOUT', self._default_namespace.local_timeout),
+                ),
+            )
+            for prefix, config in sorted(options.get('NAMESPACES', {}).items(), key=lambda item: -len(item[0]))
+        ]
+        self._flight_timeout = options.get('FLIGHT_TIMEOUT', 10)
+        with _local_tiers_lock:
+            self._local = _local_tiers.get(location)
+            if self._local is None:
+                self._local = _local_tiers[location] = LocalTier(self._max_entries)
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    def _call_shared(self, default, method, *args, **kwargs):
+        """Call ``method`` of the shared cache, returning ``default`` if Redis fails."""
+        try:
+            return getattr(self.shared, method)(*args, **kwargs)
+        except RedisError:
+            LOGGER.warning("Shared cache is unavailable, %s skipped", method, exc_info=True)
+            metrics.increment('cache.shared_errors')
+            return default
+
+    def get_namespace(self, key):
+        for prefix, namespace in self._namespaces:
+            if key.startswith(prefix):
+                return namespace
+        return self._default_namespace
+
+    def _get_timeouts(self, key, timeout):
+        """Return timeouts of ``key`` in the shared cache and in the process."""
+        namespace = self.get_namespace(key)
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout if namespace.timeout is DEFAULT_TIMEOUT else namespace.timeout
+        local_timeout = namespace.local_timeout if timeout is None else min(namespace.local_timeout, timeout)
+        return timeout, local_timeout
+
+    def _set_local(self, key, value, local_timeout, version):
+        local_key = self.make_key(key, version=version)
+        if local_timeout > 0:
+            self._local.set(local_key, pickle.dumps(value, self.pickle_protocol), local_timeout)
+        else:
+            self._local.delete(local_key)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout, local_timeout = self._get_timeouts(key, timeout)
+        added = self._call_shared(False, 'add', key, value, timeout=timeout, version=version)
+        if added:
+            self._set_local(key, value, local_timeout, version)
+        else:
+            self._local.delete(self.make_key(key, version=version))
+        return added
+
+    def get(self, key, default=None, version=None):
+        namespace = self.get_namespace(key)
+        if namespace.local_timeout > 0:
+            pickled = self._local.get(self.make_key(key, version=version))
+            if pickled is not None:
+                return pickle.loads(pickled)
+        value = self._call_shared(_MISSING, 'get', key, _MISSING, version=version)
+        if value is _MISSING:
+            return default
+        if namespace.local_timeout > 0:
+            self._set_local(key, value, namespace.local_timeout, version)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout, local_timeout = self._get_timeouts(key, timeout)
+        self._call_shared(None, 'set', key, value, timeout=timeout, version=version)
+        self._set_local(key, value, local_timeout, version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout, _ = self._get_timeouts(key, timeout)
+        return self._call_shared(False, 'touch', key, timeout=timeout, version=version)
+
+    def delete(self, key, version=None):
+        self._local.delete(self.make_key(key, version=version))
+        return self._call_shared(False, 'delete', key, version=version)
+
+    def get_many(self, keys, version=None):
+        result = {}
+        missing = []
+        for key in keys:
+            pickled = None
+            if self.get_namespace(key).local_timeout > 0:
+                pickled = self._local.get(self.make_key(key, version=version))
+            if pickled is None:
+                missing.append(key)
+            else:
+                result[key] = pickle.loads(pickled)
+        if missing:
+            for key, value in self._call_shared({}, 'get_many', missing, version=version).items():
+                self._set_local(key, value, self.get_namespace(key).local_timeout, version)
+                result[key] = value
+        return result
+
+    def get_or_set(self, key, default, timeout=DEFAULT_TIMEOUT, version=None):
+        """Return the value of ``key``, computing it from ``default`` if it is missing.
+
+        Only one thread of all processes computes the value at a time, the others wait for it up to
+        ``FLIGHT_TIMEOUT`` seconds and compute the value themselves if it has not appeared.
+        """
+        value = self.get(key, version=version)
+        if value is not None:
+            return value
+        with self._local.flight_locks[hash(key) % FLIGHT_LOCKS]:
+            # Another thread of this process might have computed the value in the meantime.
+            value = self.get(key, version=version)
+            if value is not None:
+                return value
+            flight_key = f'{key}:flight'
+            # The value is computed without waiting if Redis fails.
+            computing = self._call_shared(None, 'add', flight_key, True, timeout=self._flight_timeout, version=version)
+            if computing is False:
+                metrics.increment('cache.flight_waits')
+                value = self._wait_for(key, flight_key, version)
+                if value is not None:
+                    return value
+            try:
+                value = default() if callable(default) else default
+                if value is not None:
+                    self.set(key, value, timeout=timeout, version=version)
+            finally:
+                if computing:
+                    self._call_shared(False, 'delete', flight_key, version=version)
+            return value
+
+    def _wait_for(self, key, flight_key, version):
+        deadline = time.monotonic() + self._flight_timeout
+        while time.monotonic() < deadline:
+            time.sleep(FLIGHT_POLL_INTERVAL)
+            value = self.get(key, version=version)
+            if value is not None:
+                return value
+            if not self._call_shared(False, 'has_key', flight_key, version=version):
+                # The value has not been stored, e.g. computing it failed.
+                return None
+        return None
+
+    def has_key(self, key, version=None):
+        if self.get_namespace(key).local_timeout > 0:
+            if self._local.get(self.make_key(key, version=version)) is not None:
+                return True
+        return self._call_shared(False, 'has_key', key, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        self._local.delete(self.make_key(key, version=version))
+        return self._call_shared(None, 'incr', key, delta, version=version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        # Keys of different namespaces may have different timeouts.
+        batches = {}
+        for key, value in data.items():
+            key_timeout, local_timeout = self._get_timeouts(key, timeout)
+            batches.setdefault(key_timeout, {})[key] = value
+            self._set_local(key, value, local_timeout, version)
+        failed_keys = []
+        for key_timeout, batch in batches.items():
+            failed_keys.extend(self._call_shared(list(batch), 'set_many', batch, timeout=key_timeout, version=version))
+        return failed_keys
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        for key in keys:
+            self._local.delete(self.make_key(key, version=version))
+        self._call_shared(None, 'delete_many', keys, version=version)
+
+    def clear(self):
+        self._local.clear()
+        self._call_shared(None, 'clear')
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.8 on 2026-10-18 17:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('company', '0034_alter_company_logotype'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='company',
+            name='scan_card',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+    ]
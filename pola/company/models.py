@@ -14,6 +14,11 @@ from storages.backends.s3boto3 import S3Boto3Storage
 
 from pola.concurency import concurency
 from pola.logic_score import get_pl_score
+from pola.text_utils import strip_urls_newlines
+
+# Bump when the structure of Company.scan_card changes. Stale cards are rebuilt on read until the
+# rebuild_company_cards command is run.
+SCAN_CARD_VERSION = 2
 
 
 class IntegerRangeField(models.IntegerField):
@@ -27,6 +32,36 @@ class IntegerRangeField(models.IntegerField):
         return super().formfield(**defaults)
 
 
+class TrackedFieldsMixin:
+    """Remembers the values of ``tracked_fields`` loaded from the database, see :meth:`pop_tracked_changes`."""
+
+    tracked_fields = ()
+    _tracked_values = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._tracked_values = instance._get_tracked_values()
+        return instance
+
+    def _get_tracked_values(self):
+        # Deferred fields are skipped, so that they are not loaded.
+        return tuple(self.__dict__.get(field) for field in self.tracked_fields)
+
+    def pop_tracked_changes(self):
+        """Return whether ``tracked_fields`` changed since they were loaded or checked last time."""
+        values = self._get_tracked_values()
+        changed = values != (self._tracked_values or (None,) * len(values))
+        self._tracked_values = values
+        return changed
+
+    def get_tracked_value(self, field):
+        """Return the value of a tracked ``field`` loaded from the database or checked last time."""
+        if self._tracked_values is None:
+            return None
+        return self._tracked_values[self.tracked_fields.index(field)]
+
+
 class CompanyQuerySet(models.query.QuerySet):
     def get_or_create(self, commit_desc=None, commit_user=None, *args, **kwargs):
         if not commit_desc:
@@ -41,8 +76,11 @@ class CompanyQuerySet(models.query.QuerySet):
             return obj, created
 
 
-@reversion.register
-class Company(TimeStampedModel):
+@reversion.register(exclude=['scan_card'])
+class Company(TrackedFieldsMixin, TimeStampedModel):
+    # Names in search vectors of products, see pola.product.search.
+    tracked_fields = ('name', 'common_name', 'official_name')
+
     name = models.CharField(
         max_length=255,
         null=True,
@@ -147,16 +185,14 @@ class Company(TimeStampedModel):
         choices=((True, _("Tak")), (False, _("Nie"))),
     )
 
+    scan_card = models.JSONField(null=True, blank=True, editable=False)
+
     objects = CompanyQuerySet.as_manager()
 
     @property
     def pl_score(self):
         return get_pl_score(self)
 
-    def increment_query_count(self):
-        with connection.cursor() as cursor:
-            cursor.execute('update company_company set query_count = query_count +1 ' 'where id=%s', [self.id])
-
     def recalculate_query_count_for_company(self):
         """Recalculate the query_count for the specific company."""
         with connection.cursor() as cursor:
@@ -247,6 +283,57 @@ class Company(TimeStampedModel):
 
         return ret
 
+    def build_scan_card(self):
+        """Build the company data shown on the scan card, except for the logotype URL."""
+        card = {
+            'name': self.common_name or self.official_name or self.name,
+            'plCapital': self.plCapital,
+            'plCapital_notes': self.plCapital_notes,
+            'plWorkers': self.plWorkers,
+            'plWorkers_notes': self.plWorkers_notes,
+            'plRnD': self.plRnD,
+            'plRnD_notes': self.plRnD_notes,
+            'plRegistered': self.plRegistered,
+            'plRegistered_notes': self.plRegistered_notes,
+            'plNotGlobEnt': self.plNotGlobEnt,
+            'plNotGlobEnt_notes': self.plNotGlobEnt_notes,
+            'is_friend': self.is_friend,
+        }
+        if self.is_friend:
+            card['friend_text'] = 'To jest przyjaciel Poli'
+        if self.description:
+            card['description'] = self.description
+        else:
+            desc = ''
+            for notes in (
+                self.plCapital_notes,
+                self.plWorkers_notes,
+                self.plRnD_notes,
+                self.plRegistered_notes,
+                self.plNotGlobEnt_notes,
+            ):
+                if notes:
+                    desc += strip_urls_newlines(notes) + '\n'
+            card['description'] = desc
+        card['sources'] = self.get_sources(raise_exp=False)
+        pl_score = get_pl_score(self)
+        if pl_score:
+            card['plScore'] = pl_score
+        card['official_url'] = self.official_url
+        return card
+
+    def get_scan_card(self):
+        """Return the stored scan card, or build it if it is missing or outdated."""
+        if self.scan_card and self.scan_card.get('version') == SCAN_CARD_VERSION:
+            return {**self.scan_card['data'], 'sources': dict(self.scan_card['data']['sources'])}
+        return self.build_scan_card()
+
+    def refresh_scan_card(self):
+        card = self.build_scan_card()
+        # jsonb does not keep the order of keys, so sources are stored as a list of [title, url] pairs.
+        card['sources'] = list(card['sources'].items())
+        self.scan_card = {'version': SCAN_CARD_VERSION, 'data': card}
+
     def clean(self, *args, **kwargs):
         if self.verified:
             YOU_CANT_SET_VERIFIED = (
@@ -268,6 +355,9 @@ class Company(TimeStampedModel):
 
     def save(self, commit_desc=None, commit_user=None, *args, **kwargs):
         self.full_clean()
+        self.refresh_scan_card()
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'scan_card'}
         if not commit_desc:
             super().save(*args, **kwargs)
             return
@@ -306,7 +396,10 @@ class BrandQuerySet(models.query.QuerySet):
 
 
 @reversion.register
-class Brand(TimeStampedModel):
+class Brand(TrackedFieldsMixin, TimeStampedModel):
+    # Names in search vectors of products, see pola.product.search.
+    tracked_fields = ('name', 'common_name')
+
     company = models.ForeignKey(Company, null=True, on_delete=models.CASCADE)
     name = models.CharField(
         max_length=128,
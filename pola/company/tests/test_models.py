@@ -0,0 +1,60 @@
+from unittest import mock
+
+from test_plus import TestCase
+
+from pola.company.factories import CompanyFactory
+from pola.company.models import SCAN_CARD_VERSION, Company
+
+
+class TestCompanyScanCard(TestCase):
+    def test_should_store_card_on_save(self):
+        company = CompanyFactory(
+            plCapital=100,
+            plWorkers=100,
+            plRnD=100,
+            plRegistered=100,
+            plNotGlobEnt=100,
+            description=None,
+            plCapital_notes="Kapitał https://example.com polski",
+            sources="TEST|http://example.com",
+        )
+
+        company = Company.objects.get(pk=company.pk)
+
+        self.assertEqual(SCAN_CARD_VERSION, company.scan_card['version'])
+        self.assertEqual(company.build_scan_card(), company.get_scan_card())
+        self.assertEqual(100, company.scan_card['data']['plScore'])
+        self.assertEqual("Kapitał  polski\n", company.scan_card['data']['description'])
+        self.assertEqual([["TEST", "http://example.com"]], company.scan_card['data']['sources'])
+
+    def test_should_keep_order_of_sources(self):
+        sources = [("Strona firmy", "https://example.com/b"), ("KRS", "https://example.com/a"), ("Z", "https://z.pl")]
+        company = CompanyFactory(sources="\n".join(f"{title}|{url}" for title, url in sources))
+
+        company = Company.objects.get(pk=company.pk)
+
+        self.assertEqual(sources, list(company.get_scan_card()['sources'].items()))
+
+    def test_should_refresh_card_when_saving_selected_fields(self):
+        company = CompanyFactory(description="OLD")
+        company.description = "NEW"
+        company.save(update_fields=['description'])
+
+        company.refresh_from_db()
+        self.assertEqual("NEW", company.scan_card['data']['description'])
+
+    def test_should_serve_stored_card(self):
+        company = Company.objects.get(pk=CompanyFactory().pk)
+
+        with mock.patch.object(Company, 'build_scan_card') as build_mock:
+            company.get_scan_card()
+
+        build_mock.assert_not_called()
+
+    def test_should_rebuild_outdated_card(self):
+        company = CompanyFactory(description="TEST")
+        Company.objects.filter(pk=company.pk).update(scan_card={'version': SCAN_CARD_VERSION - 1, 'data': {}})
+
+        company.refresh_from_db()
+
+        self.assertEqual("TEST", company.get_scan_card()['description'])
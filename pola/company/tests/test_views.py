@@ -1,3 +1,5 @@
+from unittest import mock
+
 import environ
 from bs4 import BeautifulSoup
 from django.test import override_settings
@@ -7,6 +9,7 @@ from reversion.models import Version
 from test_plus.test import TestCase
 from webtest import Upload
 
+from pola import counters
 from pola.company.factories import BrandFactory, CompanyFactory
 from pola.company.models import Brand, Company
 from pola.product.factories import ProductFactory
@@ -400,6 +403,25 @@ class TestCompanyListView(PermissionMixin, TemplateUsedMixin, WebTestMixin, Test
 class CompanyAutocomplete(PermissionMixin, TestCase):
     url = reverse_lazy('company:company-autocomplete')
 
+    def test_should_suggest_companies(self):
+        self.login()
+        company = CompanyFactory(name="Wedel", common_name="", query_count=10)
+        CompanyFactory(name="Wawel", common_name="")
+
+        response = self.client.get(f"{self.url}?q=wed")
+
+        self.assertEqual([str(company.pk)], [result['id'] for result in response.json()['results']])
+
+    def test_should_filter_by_names_until_suggest_index_is_built(self):
+        self.login()
+        company = CompanyFactory(name="Zakłady Wedel", common_name="", query_count=10)
+        CompanyFactory(name="Wawel", common_name="")
+
+        with mock.patch('pola.suggest.is_ready', return_value=False):
+            response = self.client.get(f"{self.url}?q=wedel")
+
+        self.assertEqual([str(company.pk)], [result['id'] for result in response.json()['results']])
+
 
 class TestBrandDeleteView(BrandInstanceMixin, PermissionMixin, TemplateUsedMixin, TestCase):
     template_name = 'company/brand_confirm_delete.html'
@@ -499,6 +521,9 @@ class TestCompanyMergeView(PermissionMixin, TemplateUsedMixin, TestCase):
         # Other companies deleted
         self.assertFalse(Company.objects.filter(id__in=[other1.id, other2.id]).exists())
 
+        # Products are found by the name of the target
+        self.assertEqual({p1, p2}, set(Product.objects.search('target')))
+
     def test_merge_requires_two_selected(self):
         self.login()
         only = CompanyFactory()
@@ -524,6 +549,17 @@ class TestCompanyMergeView(PermissionMixin, TemplateUsedMixin, TestCase):
         target.refresh_from_db()
         self.assertEqual(target.query_count, 2 + 3 + 7)
 
+    def test_merge_keeps_pending_query_counts(self):
+        self.login()
+        target = CompanyFactory(common_name='Target')
+        other = CompanyFactory(common_name='Other')
+        counters.increment(Company, {target.pk: 1, other.pk: 4})
+
+        resp = self.client.post(self.url, {'selected': [str(target.id), str(other.id)]})
+        self.assertEqual(resp.status_code, 302)
+
+        self.assertEqual(5, counters.get_query_count(target, exact=True))
+
     def test_merge_selects_best_target_not_first(self):
         self.login()
         # Poorly filled company (few scored fields set)
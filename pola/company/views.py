@@ -18,12 +18,13 @@ from django.views.generic.edit import (
 )
 from django_filters.views import FilterView
 
+from pola import counters, suggest
 from pola.company.models import Brand, Company
 from pola.concurency import ConcurencyProtectUpdateView
 from pola.mixins import LoginPermissionRequiredMixin
 from pola.product.models import Product
 from pola.report.models import Report
-from pola.views import ExprAutocompleteMixin
+from pola.views import SuggestAutocompleteMixin
 
 from ..logic_score import get_pl_score
 from .filters import BrandFilter, CompanyFilter, CompanyMergeFilter
@@ -119,9 +120,14 @@ class CompanyMergeView(LoginPermissionRequiredMixin, FilterView):
 
         with transaction.atomic():
             # move products to target company
-            Product.objects.filter(company_id__in=others).update(company_id=target_id)
+            moved_ids = list(Product.objects.filter(company_id__in=others).values_list('pk', flat=True))
+            Product.objects.filter(pk__in=moved_ids).update(company_id=target_id)
+            # search vectors include names of the company
+            Product.objects.filter(pk__in=moved_ids).update_search_vectors()
             # move brands to target company
             Brand.objects.filter(company_id__in=others).update(company_id=target_id)
+            # increments of deleted companies would be dropped when folded
+            counters.move(Company, others, target_id)
             Company.objects.filter(id__in=others).delete()
             # recalculate query_count for the target company after merge
             Company.objects.get(id=target_id).recalculate_query_count_for_company()
@@ -310,13 +316,10 @@ class CompanyDetailView(FieldsDisplayMixin, LoginPermissionRequiredMixin, Detail
         return context
 
 
-class CompanyAutocomplete(LoginRequiredMixin, ExprAutocompleteMixin, autocomplete.Select2QuerySetView):
-    search_expr = [
-        'name__icontains',
-        'official_name__icontains',
-        'common_name__icontains',
-    ]
+class CompanyAutocomplete(LoginRequiredMixin, SuggestAutocompleteMixin, autocomplete.Select2QuerySetView):
     model = Company
+    suggest_kind = suggest.COMPANY
+    search_expr = ['name__icontains', 'official_name__icontains', 'common_name__icontains']
 
 
 class BrandListView(LoginPermissionRequiredMixin, FilterView):
@@ -387,9 +390,7 @@ class BrandDetailView(FieldsDisplayMixin, LoginPermissionRequiredMixin, DetailVi
         return context
 
 
-class BrandAutocomplete(LoginRequiredMixin, ExprAutocompleteMixin, autocomplete.Select2QuerySetView):
-    search_expr = [
-        'name__icontains',
-        'common_name__icontains',
-    ]
+class BrandAutocomplete(LoginRequiredMixin, SuggestAutocompleteMixin, autocomplete.Select2QuerySetView):
     model = Brand
+    suggest_kind = suggest.BRAND
+    search_expr = ['name__icontains', 'common_name__icontains']
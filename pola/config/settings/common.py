@@ -332,6 +332,8 @@ CORS_URLS_REGEX = r"^/a/.*$"
 
 # APP CONFIGURATION
 # ------------------------
+# How long (in seconds) every process keeps its copy of pola.models.AppConfiguration. Set to 0 to disable the cache.
+APP_CONFIGURATION_CACHE_TIMEOUT = env.int("POLA_APP_APP_CONFIGURATION_CACHE_TIMEOUT", default=60)
 
 # OPEN API CORE
 # ---------------
@@ -341,6 +343,22 @@ from openapi_core import OpenAPI  # noqa: E402
 
 OPENAPI = OpenAPI.from_path(Path(str(ROOT_DIR)) / "pola" / "rpc_api" / "openapi-v1.yaml")
 
+# Requests are always validated against the spec, responses with the given probability: 1 validates all of them,
+# 0 only requests. ENDPOINTS overrides it for paths of the spec, e.g. {'/a/v4/get_by_code': 0.01}.
+OPENAPI_VALIDATION = {
+    'RESPONSE_SAMPLE_RATE': env.float("POLA_APP_OPENAPI_RESPONSE_SAMPLE_RATE", default=1.0),
+    'ENDPOINTS': {},
+}
+
+# JSON SCHEMA
+# ---------------
+# Responses of the v2 and v3 API are validated against JSON schemas with the given probability: 1 validates all of
+# them, 0 none. VIEWS overrides it for views by name, e.g. {'get_by_code_v3': 0.01}.
+JSON_RESPONSE_VALIDATION = {
+    'SAMPLE_RATE': env.float("POLA_APP_JSON_RESPONSE_SAMPLE_RATE", default=1.0),
+    'VIEWS': {},
+}
+
 # GET RESPONSE
 # ------------------------------------------------------------------------------
 GET_RESPONSE = {
@@ -353,8 +371,79 @@ GET_RESPONSE = {
 PRODUKTY_W_SIECI_ENABLE = env.bool("POLA_APP_PRODUKTY_W_SIECI_ENABLE", default=True)
 PRODUKTY_W_SIECI = {
     'API_TOKEN': env('POLA_APP_PRODUKTY_W_SIECI_API_TOKEN'),
+    # Maximum number of connections kept alive, per process.
+    'POOL_SIZE': env.int('POLA_APP_PRODUKTY_W_SIECI_POOL_SIZE', default=10),
+    'CONNECT_TIMEOUT': env.float('POLA_APP_PRODUKTY_W_SIECI_CONNECT_TIMEOUT', default=3.05),
+    'READ_TIMEOUT': env.float('POLA_APP_PRODUKTY_W_SIECI_READ_TIMEOUT', default=10),
+    'MAX_RETRIES': env.int('POLA_APP_PRODUKTY_W_SIECI_MAX_RETRIES', default=5),
+    # Requests per second sent by all processes together, 0 disables the limit. See pola.integrations.throttling.
+    'RATE_LIMIT': env.float('POLA_APP_PRODUKTY_W_SIECI_RATE_LIMIT', default=10),
+    'RATE_LIMIT_BURST': env.int('POLA_APP_PRODUKTY_W_SIECI_RATE_LIMIT_BURST', default=20),
+    # How long (in seconds) a request during a scan may wait for the rate limit.
+    'RATE_LIMIT_TIMEOUT': env.float('POLA_APP_PRODUKTY_W_SIECI_RATE_LIMIT_TIMEOUT', default=1),
+    # The circuit breaker stops requests for RESET_TIMEOUT seconds after FAILURE_THRESHOLD failed requests
+    # within FAILURE_WINDOW seconds. A threshold of 0 disables the circuit breaker.
+    'FAILURE_THRESHOLD': env.int('POLA_APP_PRODUKTY_W_SIECI_FAILURE_THRESHOLD', default=5),
+    'FAILURE_WINDOW': env.int('POLA_APP_PRODUKTY_W_SIECI_FAILURE_WINDOW', default=60),
+    'RESET_TIMEOUT': env.int('POLA_APP_PRODUKTY_W_SIECI_RESET_TIMEOUT', default=30),
+    # How long (in seconds) codes unknown to Produkty w Sieci are not looked up again during scans. The requery
+    # commands look them up regardless. Set to 0 to look them up on every scan.
+    'NOT_FOUND_TIMEOUT': env.int('POLA_APP_PRODUKTY_W_SIECI_NOT_FOUND_TIMEOUT', default=7 * 24 * 60 * 60),
+}
+# Number of concurrent lookups and the maximum number of lookups per second of the requery commands.
+PRODUKTY_W_SIECI_REQUERY_CONCURRENCY = env.int("POLA_APP_PRODUKTY_W_SIECI_REQUERY_CONCURRENCY", default=4)
+PRODUKTY_W_SIECI_REQUERY_RATE = env.float("POLA_APP_PRODUKTY_W_SIECI_REQUERY_RATE", default=5)
+# Query Produkty w Sieci for unknown products in the RQ worker instead of during the scan.
+PRODUKTY_W_SIECI_ASYNC = env.bool("POLA_APP_PRODUKTY_W_SIECI_ASYNC", default=False)
+
+# SCAN RESULT CACHE
+# ------------------------------------------------------------------------------
+# How long (in seconds) the results of /a/v*/get_by_code are cached. Set to 0 to disable the cache.
+SCAN_RESULT_CACHE_TIMEOUT = env.int("POLA_APP_SCAN_RESULT_CACHE_TIMEOUT", default=60 * 60)
+# How long (in seconds) the apps may show a previous result of /a/v4/get_by_code while revalidating it.
+SCAN_API_STALE_WHILE_REVALIDATE = env.int("POLA_APP_SCAN_API_STALE_WHILE_REVALIDATE", default=60)
+
+# SCAN EVENTS
+# ------------------------------------------------------------------------------
+# Scans are logged through a buffer, see pola.scan_events. Supported backends: sync, memory, redis.
+SCAN_EVENTS = {
+    'BACKEND': env.str("POLA_APP_SCAN_EVENTS_BACKEND", default='sync'),
+    # Maximum number of events written in one batch
+    'FLUSH_SIZE': env.int("POLA_APP_SCAN_EVENTS_FLUSH_SIZE", default=500),
+    # Maximum time (in seconds) an event waits in the buffer
+    'FLUSH_INTERVAL': env.int("POLA_APP_SCAN_EVENTS_FLUSH_INTERVAL", default=10),
 }
 
+# SEARCH EVENTS
+# ------------------------------------------------------------------------------
+# Searches are logged through a buffer, see pola.search_events. Supported backends: sync, memory, redis.
+SEARCH_EVENTS = {
+    'BACKEND': env.str("POLA_APP_SEARCH_EVENTS_BACKEND", default='sync'),
+    # Maximum number of events written in one batch
+    'FLUSH_SIZE': env.int("POLA_APP_SEARCH_EVENTS_FLUSH_SIZE", default=500),
+    # Maximum time (in seconds) an event waits in the buffer
+    'FLUSH_INTERVAL': env.int("POLA_APP_SEARCH_EVENTS_FLUSH_INTERVAL", default=30),
+}
+
+# SUGGEST
+# ------------------------------------------------------------------------------
+# Prefix suggestions of product, brand and company names, see pola.suggest.
+SUGGEST = {
+    # How often (in seconds) every process rebuilds its index, 0 rebuilds it for every suggestion
+    'REBUILD_INTERVAL': env.int("POLA_APP_SUGGEST_REBUILD_INTERVAL", default=3600),
+    # How often (in seconds) changes made by other processes are read
+    'SYNC_INTERVAL': env.int("POLA_APP_SUGGEST_SYNC_INTERVAL", default=5),
+    # Number of changes after which the index is rebuilt before the interval passes
+    'MAX_CHANGES': env.int("POLA_APP_SUGGEST_MAX_CHANGES", default=10000),
+    # Products scanned less often are not suggested, which saves memory
+    'MIN_PRODUCT_QUERY_COUNT': env.int("POLA_APP_SUGGEST_MIN_PRODUCT_QUERY_COUNT", default=0),
+}
+
+# QUERY COUNTERS
+# ------------------------------------------------------------------------------
+# Number of rows that increments of a single query_count are spread over, see pola.counters.
+QUERY_COUNT_SHARDS = env.int("POLA_APP_QUERY_COUNT_SHARDS", default=8)
+
 # CMS / Stats configuration
 # ------------------------------------------------------------------------------
 # External URL for the Stats page used in production deployments.
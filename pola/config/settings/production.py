@@ -11,9 +11,6 @@ Production Configurations
 # pylint: disable=unused-wildcard-import
 
 import os
-import tempfile
-from pathlib import Path
-from urllib import parse as urlparse
 
 import sentry_sdk
 from sentry_sdk.integrations.django import DjangoIntegration
@@ -99,20 +96,55 @@ DATABASES['default'] = env.db("DATABASE_URL")  # noqa: F405
 
 # CACHING
 # ------------------------------------------------------------------------------
-redis_url = urlparse.urlparse(os.environ.get('REDISTOGO_URL', 'redis://localhost:6959'))
-
+# Every process keeps values read from Redis for a few seconds, see pola.cache.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
-        'LOCATION': Path(tempfile.gettempdir()) / 'pola-app-cache',
+        'BACKEND': 'pola.cache.TieredCache',
+        'OPTIONS': {
+            'SHARED_CACHE': 'redis',
+            'MAX_ENTRIES': env.int('POLA_APP_LOCAL_CACHE_MAX_ENTRIES', default=10000),  # noqa: F405
+            'LOCAL_TIMEOUT': env.int('POLA_APP_LOCAL_CACHE_TIMEOUT', default=5),  # noqa: F405
+            'NAMESPACES': {
+                # Pages of the website, see pola.views_pola_web.
+                'views.decorators.cache.': {'LOCAL_TIMEOUT': 60},
+                # Locks, counters and logs of changes are always read from Redis.
+                'concurency_': {'LOCAL_TIMEOUT': 0},
+                'pola:enrichment:': {'LOCAL_TIMEOUT': 0},
+                'pola:suggest:': {'LOCAL_TIMEOUT': 0},
+            },
+        },
     },
     'redis': {
-        'BACKEND': 'redis_cache.RedisCache',
-        'LOCATION': f'{redis_url.hostname}:{redis_url.port}',
-        'OPTIONS': {'DB': 0, 'PASSWORD': redis_url.password},
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('REDISTOGO_URL', 'redis://localhost:6959'),
+        # Scans wait for the cache, so a hanging Redis must not block the workers, see pola.cache.
+        'OPTIONS': {
+            'socket_connect_timeout': env.float('POLA_APP_REDIS_CACHE_CONNECT_TIMEOUT', default=1),  # noqa: F405
+            'socket_timeout': env.float('POLA_APP_REDIS_CACHE_TIMEOUT', default=1),  # noqa: F405
+        },
     },
 }
 
+# SCAN EVENTS
+# ------------------------------------------------------------------------------
+SCAN_EVENTS['BACKEND'] = env.str("POLA_APP_SCAN_EVENTS_BACKEND", default='memory')  # noqa: F405
+
+# SEARCH EVENTS
+# ------------------------------------------------------------------------------
+SEARCH_EVENTS['BACKEND'] = env.str("POLA_APP_SEARCH_EVENTS_BACKEND", default='memory')  # noqa: F405
+
+# RESPONSE VALIDATION
+# ------------------------------------------------------------------------------
+# Responses are checked by tests, so only a sample of them is validated.
+OPENAPI_VALIDATION['RESPONSE_SAMPLE_RATE'] = env.float(  # noqa: F405
+    "POLA_APP_OPENAPI_RESPONSE_SAMPLE_RATE", default=0.01
+)
+JSON_RESPONSE_VALIDATION['SAMPLE_RATE'] = env.float("POLA_APP_JSON_RESPONSE_SAMPLE_RATE", default=0.01)  # noqa: F405
+
+# PRODUKTY W SIECI
+# ------------------------------------------------------------------------------
+PRODUKTY_W_SIECI_ASYNC = env.bool("POLA_APP_PRODUKTY_W_SIECI_ASYNC", default=True)  # noqa: F405
+
 # Your production stuff: Below this line define 3rd party library settings
 
 
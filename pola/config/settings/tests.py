@@ -26,6 +26,29 @@ EMAIL_BACKEND = env('DJANGO_EMAIL_BACKEND', default='django.core.mail.backends.c
 # CACHING
 # ------------------------------------------------------------------------------
 CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': ''}}
+# The cache is not cleared between tests, so tests that need the scan result or the configuration cache enable
+# it explicitly.
+SCAN_RESULT_CACHE_TIMEOUT = 0
+APP_CONFIGURATION_CACHE_TIMEOUT = 0
+
+# PRODUKTY W SIECI
+# ------------------------------------------------------------------------------
+# There is no Redis during tests. Tests of the rate limiter and the circuit breaker create their own instances.
+PRODUKTY_W_SIECI['RATE_LIMIT'] = 0  # noqa: F405
+PRODUKTY_W_SIECI['FAILURE_THRESHOLD'] = 0  # noqa: F405
+# The cache is not cleared between tests, see SCAN_RESULT_CACHE_TIMEOUT.
+PRODUKTY_W_SIECI['NOT_FOUND_TIMEOUT'] = 0  # noqa: F405
+
+# SUGGEST
+# ------------------------------------------------------------------------------
+# Indexes are rebuilt for every suggestion, so they do not outlive the test.
+SUGGEST['REBUILD_INTERVAL'] = 0  # noqa: F405
+
+# RESPONSE VALIDATION
+# ------------------------------------------------------------------------------
+# Every response is validated.
+OPENAPI_VALIDATION['RESPONSE_SAMPLE_RATE'] = 1.0  # noqa: F405
+JSON_RESPONSE_VALIDATION['SAMPLE_RATE'] = 1.0  # noqa: F405
 
 # TESTING
 # ------------------------------------------------------------------------------
@@ -49,6 +49,7 @@ urlpatterns += [
     path(r'cms/config', pola_views.AppConfigurationUpdateView.as_view(), name="app-config"),
     path(r'cms/editors-stats', pola_views.EditorsStatsPageView.as_view(), name="home-editors-stats"),
     path(r'cms/admin-stats', pola_views.AdminStatsPageView.as_view(), name="home-admin-stats"),
+    path(r'cms/metrics', pola_views.MetricsView.as_view(), name="metrics"),
     path(
         r'cms/lang/',
         login_required(TemplateView.as_view(template_name='pages/lang-cms.html')),
@@ -14,6 +14,7 @@ framework.
 
 """
 
+import logging
 import os
 
 from django.core.wsgi import get_wsgi_application
@@ -29,6 +30,16 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "pola.config.settings.production
 # setting points here.
 application = get_wsgi_application()
 
+# Load the configuration before the first scan of the worker, see AppConfiguration.get_cached.
+from pola.models import AppConfiguration  # noqa: E402
+
+try:
+    AppConfiguration.get_cached()
+except Exception:
+    # It is only an optimization, e.g. an outage of the database or the cache must not stop the worker. The first
+    # scan loads it then.
+    logging.getLogger(__name__).exception("Failed to preload the app configuration")
+
 # Apply WSGI middleware here.
 # from helloworld.wsgi import HelloWorldApplication
 # application = HelloWorldApplication(application)
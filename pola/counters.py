@@ -0,0 +1,122 @@
+"""Contention-free ``query_count`` counters.
+
+Incrementing ``query_count`` in place makes the row of a popular product or company a serialisation point for
+all concurrent writers. Instead, increments are added to one of ``QUERY_COUNT_SHARDS`` rows of the
+``pola_querycountdelta`` table, chosen at random, and periodically folded into ``query_count`` with
+:func:`fold`.
+
+``query_count`` of a model instance is therefore an approximate value. Use :func:`get_query_count` with
+``exact=True`` to include increments that were not folded yet.
+"""
+
+import random
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from pola.company.models import Company
+from pola.models import QueryCountDelta
+from pola.product.models import Product
+
+COUNTERS = {
+    'product': Product,
+    'company': Company,
+}
+
+
+def _get_counter_name(model):
+    for name, counter_model in COUNTERS.items():
+        if counter_model is model:
+            return name
+    raise ValueError(f"{model.__name__} has no query count counter")
+
+
+def increment(model, counts):
+    """Add ``counts`` (a mapping of object ID to number of queries) to query counts of ``model`` objects."""
+    counts = {object_id: value for object_id, value in counts.items() if value}
+    if not counts:
+        return
+    counter = _get_counter_name(model)
+    # Sorted IDs keep the lock order stable and prevent deadlocks between concurrent writers.
+    ids = sorted(counts)
+    shards = [random.randrange(settings.QUERY_COUNT_SHARDS) for _ in ids]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'insert into pola_querycountdelta (counter, object_id, shard, value) '
+            'select %s, delta.object_id, delta.shard, delta.value '
+            'from unnest(%s::integer[], %s::smallint[], %s::integer[]) as delta(object_id, shard, value) '
+            'on conflict (counter, object_id, shard) '
+            'do update set value = pola_querycountdelta.value + excluded.value',
+            [counter, ids, shards, [counts[i] for i in ids]],
+        )
+
+
+def move(model, from_ids, to_id):
+    """Move pending increments of ``model`` objects with ``from_ids`` to the object with ``to_id``, e.g. on merge."""
+    from_ids = [object_id for object_id in from_ids if object_id != to_id]
+    if not from_ids:
+        return
+    counter = _get_counter_name(model)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'with moved as ('
+            '  delete from pola_querycountdelta where counter = %s and object_id = any(%s) returning shard, value'
+            ') '
+            'insert into pola_querycountdelta (counter, object_id, shard, value) '
+            'select %s, %s, shard, sum(value) from moved group by shard '
+            'on conflict (counter, object_id, shard) '
+            'do update set value = pola_querycountdelta.value + excluded.value',
+            [counter, from_ids, counter, to_id],
+        )
+
+
+def fold(model=None):
+    """Apply pending increments to ``query_count``. Returns the number of updated objects."""
+    counter_models = [model] if model else COUNTERS.values()
+    updated = 0
+    for counter_model in counter_models:
+        counter = _get_counter_name(counter_model)
+        table = counter_model._meta.db_table
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Increments of deleted objects are dropped together with the rest.
+            cursor.execute(
+                f'with folded as ('
+                f'  delete from pola_querycountdelta where counter = %s returning object_id, value'
+                f'), summed as ('
+                f'  select object_id, sum(value) as value from folded group by object_id'
+                f') '
+                f'update {table} set query_count = {table}.query_count + summed.value '
+                f'from summed where {table}.id = summed.object_id',
+                [counter],
+            )
+            updated += cursor.rowcount
+    return updated
+
+
+def get_query_counts(model, ids, exact=False):
+    """Return query counts of ``model`` objects as a mapping of object ID to value.
+
+    Exact values include pending increments, which are read in the same statement.
+    """
+    total = F('query_count')
+    if exact:
+        pending = (
+            QueryCountDelta.objects.filter(counter=_get_counter_name(model), object_id=OuterRef('pk'))
+            .values('object_id')
+            .annotate(total=Sum('value'))
+            .values('total')
+        )
+        total = total + Coalesce(Subquery(pending), 0)
+    return dict(model.objects.filter(pk__in=ids).order_by().annotate(total=total).values_list('pk', 'total'))
+
+
+def get_query_count(obj, exact=False):
+    """Return the query count of a product or a company.
+
+    The approximate value is the one stored in the object and costs no query.
+    """
+    if not exact:
+        return obj.query_count
+    return get_query_counts(type(obj), [obj.pk], exact=True).get(obj.pk, 0)
@@ -2,6 +2,13 @@ from typing import Optional
 
 
 def get_registration_country(code: str) -> Optional[str]:
+    prefix = code[:3]
+    if len(prefix) == 3 and prefix.isascii() and prefix.isdigit():
+        return _PREFIX_TO_COUNTRY_TABLE[int(prefix)]
+    return _find_registration_country(code)
+
+
+def _find_registration_country(code: str) -> Optional[str]:
     for prefix, name in CODE_PREFIX_TO_COUNTRY.items():
         if code.startswith(prefix):
             return name
@@ -126,3 +133,7 @@ CODE_PREFIX_TO_COUNTRY = {
     "955": "Malezja",
     "958": "Makao",
 }
+
+
+# Prefixes have at most 3 digits, so the country of every code is determined by its first 3 digits.
+_PREFIX_TO_COUNTRY_TABLE = tuple(_find_registration_country(f'{prefix:03}') for prefix in range(1000))
@@ -1,51 +1,50 @@
-from random import random
-from time import sleep
-
-import requests
 from django.conf import settings
 
+from pola import metrics
+from pola.integrations.http import (
+    DEFAULT_TIMEOUT,
+    create_session,
+    get_pool_stats,
+)
+
 
 class GetResponseClient:
-    def __init__(self, api_token: str, base_url: str = "https://api.getresponse.com/v3"):
+    def __init__(
+        self,
+        api_token: str,
+        base_url: str = "https://api.getresponse.com/v3",
+        *,
+        pool_size: int = 2,
+        timeout=DEFAULT_TIMEOUT,
+        max_retries: int = 5,
+    ):
         self._api_token = api_token
         self._base_url = base_url
+        self._timeout = timeout
+        # Server errors are retried by the adapter of the session.
+        self._session = create_session(pool_size=pool_size, max_retries=max_retries)
 
-    def create_contact(self, campaign_id, email, name=None, num_retries=5):
+    def create_contact(self, campaign_id, email, name=None):
         uri = self._base_url + "/contacts"
         body = {
             "name": name,
             "campaign": {"campaignId": campaign_id},
             "email": email,
         }
-        response = self._send_request('post', uri, num_retries=num_retries, json=body)
+        response = self._send_request('post', uri, json=body)
         return response
 
-    def _send_request(self, method, url, *, num_retries, **kwargs):
+    def get_pool_stats(self):
+        return get_pool_stats(self._session)
+
+    def _send_request(self, method, url, **kwargs):
         kwargs.setdefault('headers', {})
         kwargs['headers']['X-Auth-Token'] = f"api-key {self._api_token}"
+        kwargs.setdefault('timeout', self._timeout)
 
-        with requests.Session() as session:
-            for retry_num in range(num_retries + 1):
-                if retry_num > 0:
-                    # Sleep before retrying.
-                    sleep_time = random() * 2**retry_num / 4
-                    sleep(sleep_time)
-                try:
-                    exception = None
-                    response = session.request(method, url, **kwargs)
-                    response.raise_for_status()
-                except requests.HTTPError as http_error:
-                    exception = http_error
-
-                if exception:
-                    if retry_num == num_retries or 400 <= response.status_code < 500:
-                        raise exception
-                    else:
-                        continue
-                else:
-                    break
-
-            return response
+        response = self._session.request(method, url, **kwargs)
+        response.raise_for_status()
+        return response
 
 
 if 'BASE_URL' in settings.GET_RESPONSE:
@@ -54,3 +53,4 @@ if 'BASE_URL' in settings.GET_RESPONSE:
     )
 else:
     get_response_client = GetResponseClient(api_token=settings.GET_RESPONSE['API_TOKEN'])
+metrics.register_gauge('get_response.pool', get_response_client.get_pool_stats)
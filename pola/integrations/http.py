@@ -0,0 +1,61 @@
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Default (connect, read) timeouts in seconds.
+DEFAULT_TIMEOUT = (3.05, 10)
+
+
+def create_session(*, pool_size, max_retries, backoff_factor=0.25) -> requests.Session:
+    """Create a long-lived session that keeps connections alive and retries server errors with a backoff.
+
+    Requests of methods which are not idempotent, e.g. POST, are retried only on connect errors, as the server might
+    have handled them already.
+    """
+    retry = Retry(
+        total=max_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=(500, 502, 503, 504),
+        # Return the last response, its status is checked by the client.
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_pool_stats(session: requests.Session):
+    """Return the number of requests sent by ``session`` and the number of connections it opened for them."""
+    requests_count = connections_count = 0
+    for adapter in {id(a): a for a in session.adapters.values()}.values():
+        for key in adapter.poolmanager.pools.keys():
+            pool = adapter.poolmanager.pools[key]
+            requests_count += pool.num_requests
+            connections_count += pool.num_connections
+    return {
+        'requests': requests_count,
+        'connections': connections_count,
+        'reused': requests_count - connections_count,
+    }
+
+
+class RateLimiter:
+    """Spaces out calls of :meth:`wait` shared by many threads to at most ``rate`` calls per second."""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate
+        self._lock = threading.Lock()
+        self._next_at = time.monotonic()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next_at - now
+            self._next_at = max(self._next_at, now) + self.interval
+        if delay > 0:
+            time.sleep(delay)
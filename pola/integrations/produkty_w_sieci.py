@@ -1,11 +1,18 @@
-from random import random
-from time import sleep
+import time
 from typing import Optional
 
 import requests
 from django.conf import settings
 from pydantic import BaseModel
 
+from pola import metrics
+from pola.integrations.http import (
+    DEFAULT_TIMEOUT,
+    create_session,
+    get_pool_stats,
+)
+from pola.integrations.throttling import CircuitBreaker, TokenBucket
+
 NOT_FOUND_ERRORMSG = "not_found"
 UNKNOWN_ERRORMSG = "unknown_error"
 
@@ -14,6 +21,10 @@ class ApiException(Exception):
     pass
 
 
+class ServiceUnavailable(ApiException):
+    """The request was not sent, because of the rate limit or the open circuit breaker."""
+
+
 class CompanyBase(BaseModel):
     name: str
     nip: Optional[str]
@@ -51,64 +62,138 @@ class NoResult(BaseModel):
 
 
 class ProduktyWSieciClient:
-    def __init__(self, api_token: str, base_url: str = "https://www.eprodukty.gs1.pl/external_api/v2/"):
-        self._api_token = api_token
-        self._base_url = base_url
-
-    def get_products(
+    def __init__(
         self,
+        api_token: str,
+        base_url: str = "https://www.eprodukty.gs1.pl/external_api/v2/",
         *,
-        gtin_number: str,
-        num_retries: Optional[int] = 5,
-    ) -> Optional[ProductBase]:
+        pool_size: int = 10,
+        timeout=DEFAULT_TIMEOUT,
+        max_retries: int = 5,
+        rate_limiter: Optional[TokenBucket] = None,
+        rate_limit_timeout: float = 0,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+    ):
+        self._api_token = api_token
+        self._base_url = base_url
+        self._timeout = timeout
+        self.pool_size = pool_size
+        self.rate_limiter = rate_limiter
+        self.rate_limit_timeout = rate_limit_timeout
+        self.circuit_breaker = circuit_breaker
+        # Server errors are retried by the adapter of the session.
+        self._session = create_session(pool_size=pool_size, max_retries=max_retries)
+
+    def get_products(self, *, gtin_number: str) -> Optional[ProductBase]:
         uri = self._base_url.rstrip("/") + "/products/" + gtin_number + "?include_local_data=true"
         params = {}
 
-        response = self._send_request('get', uri, params=params, num_retries=num_retries)
+        response = self._send_request('get', uri, params=params)
         return None if response is None else ProductBase.parse_obj(response)
 
-    def _send_request(self, method, url, *, num_retries, **kwargs):
+    def get_pool_stats(self):
+        return get_pool_stats(self._session)
+
+    def get_circuit_breaker_stats(self):
+        return self.circuit_breaker.get_stats() if self.circuit_breaker else None
+
+    def is_available(self):
+        """Return ``False`` while the circuit breaker is open and no requests are sent."""
+        return self.circuit_breaker is None or not self.circuit_breaker.is_open()
+
+    def _record_result(self, failed):
+        if self.circuit_breaker is None:
+            return
+        if failed:
+            self.circuit_breaker.record_failure()
+        else:
+            self.circuit_breaker.record_success()
+
+    def _send_request(self, method, url, **kwargs):
         kwargs.setdefault('headers', {})
         kwargs['headers']['X-API-KEY'] = self._api_token
-
-        with requests.Session() as session:
-            for retry_num in range(num_retries + 1):
-                if retry_num > 0:
-                    # Sleep before retrying.
-                    sleep_time = random() * 2**retry_num / 4
-                    sleep(sleep_time)
-                try:
-                    exception = None
-                    response = session.request(method, url, **kwargs)
-                    response.raise_for_status()
-                except requests.exceptions.HTTPError as http_error:
-                    exception = http_error
-
-                if exception:
-                    if retry_num == num_retries or 400 <= response.status_code < 500:
-                        raise ApiException(str(exception))
-                    else:
-                        continue
-
-                response_json = response.json()
-                if 'errors' in response_json:
-                    errorTable = response_json['errors']
-                    if NOT_FOUND_ERRORMSG in str(errorTable):  # when product not found in the GS1 API
-                        return None
-                    if errorTable and isinstance(errorTable, list):
-                        if len(errorTable) == 0:
-                            raise ApiException('Empty error response')
-                        error_msg = errorTable[0].get('message') or errorTable[0].get('detail') or UNKNOWN_ERRORMSG
-                        raise ApiException(error_msg)
-                    else:
-                        raise ApiException('Unknown error response: ' + str(errorTable))
-                break
-            return response_json
-
-
-if 'BASE_URL' in settings.PRODUKTY_W_SIECI:
-    produkty_w_sieci_client = ProduktyWSieciClient(
-        api_token=settings.PRODUKTY_W_SIECI['API_TOKEN'], base_url=settings.PRODUKTY_W_SIECI['BASE_URL']
+        kwargs.setdefault('timeout', self._timeout)
+
+        if self.circuit_breaker and not self.circuit_breaker.allow_request():
+            metrics.increment('produkty_w_sieci.rejected')
+            raise ServiceUnavailable("Circuit breaker is open")
+        if self.rate_limiter and not self.rate_limiter.acquire(timeout=self.rate_limit_timeout):
+            metrics.increment('produkty_w_sieci.throttled')
+            if self.circuit_breaker:
+                # Otherwise a half-open circuit would wait for the result of this request until the probe expires.
+                self.circuit_breaker.cancel_request()
+            raise ServiceUnavailable("Rate limit exceeded")
+
+        start = time.monotonic()
+        try:
+            response = self._session.request(method, url, **kwargs)
+            response.raise_for_status()
+        except requests.exceptions.HTTPError as http_error:
+            metrics.increment('produkty_w_sieci.errors')
+            # Client errors do not mean that the service is unhealthy.
+            self._record_result(failed=http_error.response is None or http_error.response.status_code >= 500)
+            raise ApiException(str(http_error))
+        except requests.exceptions.RequestException:
+            metrics.increment('produkty_w_sieci.errors')
+            self._record_result(failed=True)
+            raise
+        finally:
+            metrics.observe('produkty_w_sieci.request', time.monotonic() - start)
+        self._record_result(failed=False)
+
+        response_json = response.json()
+        if 'errors' in response_json:
+            errorTable = response_json['errors']
+            if NOT_FOUND_ERRORMSG in str(errorTable):  # when product not found in the GS1 API
+                return None
+            if errorTable and isinstance(errorTable, list):
+                if len(errorTable) == 0:
+                    raise ApiException('Empty error response')
+                error_msg = errorTable[0].get('message') or errorTable[0].get('detail') or UNKNOWN_ERRORMSG
+                raise ApiException(error_msg)
+            else:
+                raise ApiException('Unknown error response: ' + str(errorTable))
+        return response_json
+
+
+_rate_limiter = (
+    TokenBucket(
+        'produkty_w_sieci',
+        rate=settings.PRODUKTY_W_SIECI['RATE_LIMIT'],
+        capacity=settings.PRODUKTY_W_SIECI['RATE_LIMIT_BURST'],
+    )
+    if settings.PRODUKTY_W_SIECI['RATE_LIMIT']
+    else None
+)
+_circuit_breaker = (
+    CircuitBreaker(
+        'produkty_w_sieci',
+        failure_threshold=settings.PRODUKTY_W_SIECI['FAILURE_THRESHOLD'],
+        failure_window=settings.PRODUKTY_W_SIECI['FAILURE_WINDOW'],
+        reset_timeout=settings.PRODUKTY_W_SIECI['RESET_TIMEOUT'],
     )
-else:
-    produkty_w_sieci_client = ProduktyWSieciClient(api_token=settings.PRODUKTY_W_SIECI['API_TOKEN'])
+    if settings.PRODUKTY_W_SIECI['FAILURE_THRESHOLD']
+    else None
+)
+
+
+def create_client(**options) -> ProduktyWSieciClient:
+    """Create a client configured with ``settings.PRODUKTY_W_SIECI``. ``options`` override the settings."""
+    config = settings.PRODUKTY_W_SIECI
+    client_options = {
+        'pool_size': config['POOL_SIZE'],
+        'timeout': (config['CONNECT_TIMEOUT'], config['READ_TIMEOUT']),
+        'max_retries': config['MAX_RETRIES'],
+        'rate_limiter': _rate_limiter,
+        'rate_limit_timeout': config['RATE_LIMIT_TIMEOUT'],
+        'circuit_breaker': _circuit_breaker,
+    }
+    if 'BASE_URL' in config:
+        client_options['base_url'] = config['BASE_URL']
+    client_options.update(options)
+    return ProduktyWSieciClient(api_token=config['API_TOKEN'], **client_options)
+
+
+produkty_w_sieci_client = create_client()
+metrics.register_gauge('produkty_w_sieci.pool', produkty_w_sieci_client.get_pool_stats)
+metrics.register_gauge('produkty_w_sieci.circuit_breaker', produkty_w_sieci_client.get_circuit_breaker_stats)
@@ -0,0 +1,309 @@
+"""Back-pressure for requests to external services and from clients.
+
+:class:`TokenBucket` limits the rate of requests and :class:`CircuitBreaker` stops sending requests to a service
+that keeps failing. :class:`SlidingWindow` limits the rate of requests of clients to the API. Their state is kept in
+Redis, so it is shared by all web and worker processes. When Redis is unavailable, every process falls back to its
+own state in memory.
+"""
+
+import logging
+import threading
+import time
+
+from redis.exceptions import RedisError
+
+from pola.rq_worker import conn
+
+LOGGER = logging.getLogger(__name__)
+
+# How long (in seconds) the state in memory is used after Redis fails, before Redis is tried again.
+REDIS_RETRY_INTERVAL = 10
+
+# Returns the number of seconds to wait for ``requested`` tokens, 0 if the tokens were taken.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local requested = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(state[1]) or capacity
+local updated_at = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * rate)
+local wait = 0
+if tokens >= requested then
+    tokens = tokens - requested
+else
+    wait = (requested - tokens) / rate
+end
+redis.call('HMSET', KEYS[1], 'tokens', tokens, 'updated_at', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+"""
+
+# Checks the windows of all keys and counts the cost in all of them, unless the limit of any of them would be
+# exceeded. Every key is followed by the key of its previous window. Returns 1 if the cost was counted, 0 otherwise.
+SLIDING_WINDOW_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local cost = tonumber(ARGV[2])
+local weight = tonumber(ARGV[3])
+local ttl = tonumber(ARGV[4])
+local counts = redis.call('MGET', unpack(KEYS))
+for i = 1, #KEYS, 2 do
+    if (tonumber(counts[i]) or 0) + (tonumber(counts[i + 1]) or 0) * weight + cost > limit then
+        return 0
+    end
+end
+for i = 1, #KEYS, 2 do
+    redis.call('INCRBY', KEYS[i], cost)
+    redis.call('EXPIRE', KEYS[i], ttl)
+end
+return 1
+"""
+
+
+class _RedisFallback:
+    """Runs operations on Redis or, for a while after Redis fails, on the state in memory."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self._retry_at = 0
+
+    def run(self, redis_func, local_func):
+        if time.monotonic() >= self._retry_at:
+            try:
+                return redis_func()
+            except RedisError:
+                LOGGER.warning("Redis is unavailable, using state in memory", exc_info=True)
+                self._retry_at = time.monotonic() + REDIS_RETRY_INTERVAL
+        return local_func()
+
+
+class LocalStore:
+    """Thread-safe subset of the Redis API used by :class:`CircuitBreaker`, kept in memory."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}
+        self._expires_at = {}
+
+    def _purge(self, name):
+        expires_at = self._expires_at.get(name)
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._values.pop(name, None)
+            self._expires_at.pop(name, None)
+
+    def exists(self, *names):
+        with self._lock:
+            for name in names:
+                self._purge(name)
+            return sum(name in self._values for name in names)
+
+    def set(self, name, value, ex=None, nx=False):
+        with self._lock:
+            self._purge(name)
+            if nx and name in self._values:
+                return None
+            self._values[name] = value
+            self._expires_at.pop(name, None)
+            if ex is not None:
+                self._expires_at[name] = time.monotonic() + ex
+            return True
+
+    def incr(self, name):
+        with self._lock:
+            self._purge(name)
+            self._values[name] = int(self._values.get(name, 0)) + 1
+            return self._values[name]
+
+    def expire(self, name, seconds):
+        with self._lock:
+            self._purge(name)
+            if name not in self._values:
+                return False
+            self._expires_at[name] = time.monotonic() + seconds
+            return True
+
+    def get(self, name):
+        with self._lock:
+            self._purge(name)
+            return self._values.get(name)
+
+    def delete(self, *names):
+        with self._lock:
+            deleted = 0
+            for name in names:
+                self._purge(name)
+                deleted += self._values.pop(name, None) is not None
+                self._expires_at.pop(name, None)
+            return deleted
+
+
+class TokenBucket:
+    """Lets through ``rate`` requests per second on average and bursts of up to ``capacity`` requests."""
+
+    def __init__(self, name, *, rate, capacity, connection=conn):
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+        self._key = f'pola:token_bucket:{name}'
+        self._fallback = _RedisFallback(connection)
+        self._script = connection.register_script(TOKEN_BUCKET_SCRIPT)
+        self._lock = threading.Lock()
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+
+    def acquire(self, timeout=0):
+        """Take a token, waiting up to ``timeout`` seconds for it. Returns ``False`` if no token was taken."""
+        deadline = time.monotonic() + timeout
+        while True:
+            wait = self._fallback.run(self._take_from_redis, self._take_from_memory)
+            if wait <= 0:
+                return True
+            if time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def _take_from_redis(self):
+        return float(self._script(keys=[self._key], args=[self.rate, self.capacity, time.time(), 1]))
+
+    def _take_from_memory(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.rate
+
+
+class SlidingWindow:
+    """Lets through ``limit`` units of cost per key within any ``window`` seconds.
+
+    The count of the sliding window is approximated by the count of the current fixed window and the part of the
+    count of the previous fixed window that is still within the sliding window, so only two counters are kept per key.
+    Requests are rejected without being counted.
+    """
+
+    # The number of counters in memory, above which expired counters are removed.
+    MAX_LOCAL_COUNTERS = 10000
+
+    def __init__(self, name, *, limit, window, connection=conn):
+        self.name = name
+        self.limit = limit
+        self.window = window
+        self._prefix = f'pola:sliding_window:{name}'
+        self._fallback = _RedisFallback(connection)
+        self._script = connection.register_script(SLIDING_WINDOW_SCRIPT)
+        self._lock = threading.Lock()
+        self._counters = {}
+
+    def hit(self, keys, cost=1):
+        """Count ``cost`` for all ``keys``. Returns ``False`` if the limit of any of them is exceeded."""
+        now = time.time()
+        index, elapsed = divmod(now, self.window)
+        # The part of the previous window which is still within the sliding window.
+        weight = 1 - elapsed / self.window
+        names = []
+        for key in keys:
+            names += [f'{self._prefix}:{key}:{int(index)}', f'{self._prefix}:{key}:{int(index) - 1}']
+        if not names:
+            return True
+        return self._fallback.run(
+            lambda: bool(self._script(keys=names, args=[self.limit, cost, weight, 2 * self.window])),
+            lambda: self._hit_in_memory(names, cost, weight, now),
+        )
+
+    def _hit_in_memory(self, names, cost, weight, now):
+        with self._lock:
+            if len(self._counters) > self.MAX_LOCAL_COUNTERS:
+                self._counters = {name: counter for name, counter in self._counters.items() if counter[1] > now}
+            counts = []
+            for name in names:
+                count, expires_at = self._counters.get(name, (0, 0))
+                counts.append(count if expires_at > now else 0)
+            for i in range(0, len(names), 2):
+                if counts[i] + counts[i + 1] * weight + cost > self.limit:
+                    return False
+            for i in range(0, len(names), 2):
+                self._counters[names[i]] = (counts[i] + cost, now + 2 * self.window)
+            return True
+
+
+class CircuitBreaker:
+    """Stops requests to a service after ``failure_threshold`` failures within ``failure_window`` seconds.
+
+    The circuit stays open for ``reset_timeout`` seconds. Then it is half-open: a single request is let through
+    to probe the service. Its success closes the circuit, its failure opens it again.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, *, failure_threshold, failure_window, reset_timeout, connection=conn):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.failure_window = failure_window
+        self.reset_timeout = reset_timeout
+        self._fallback = _RedisFallback(connection)
+        self._local_store = LocalStore()
+        prefix = f'pola:circuit_breaker:{name}'
+        self._open_key = f'{prefix}:open'
+        self._tripped_key = f'{prefix}:tripped'
+        self._probe_key = f'{prefix}:probe'
+        self._failures_key = f'{prefix}:failures'
+
+    def _call(self, method, *args, **kwargs):
+        return self._fallback.run(
+            lambda: getattr(self._fallback.connection, method)(*args, **kwargs),
+            lambda: getattr(self._local_store, method)(*args, **kwargs),
+        )
+
+    def get_state(self):
+        if self._call('exists', self._open_key):
+            return self.OPEN
+        # The circuit stays tripped until a request succeeds.
+        if self._call('exists', self._tripped_key):
+            return self.HALF_OPEN
+        return self.CLOSED
+
+    def get_stats(self):
+        return {'state': self.get_state(), 'failures': int(self._call('get', self._failures_key) or 0)}
+
+    def is_open(self):
+        return self.get_state() == self.OPEN
+
+    def allow_request(self):
+        state = self.get_state()
+        if state == self.CLOSED:
+            return True
+        if state == self.OPEN:
+            return False
+        # The probe expires in case its result is never recorded.
+        return bool(self._call('set', self._probe_key, 1, ex=self.reset_timeout, nx=True))
+
+    def cancel_request(self):
+        """Call when a request let through by :meth:`allow_request` is not sent, so that another one can probe."""
+        self._call('delete', self._probe_key)
+
+    def record_success(self):
+        if self._call('delete', self._tripped_key, self._probe_key):
+            LOGGER.info("Circuit breaker %s closed", self.name)
+        self._call('delete', self._failures_key)
+
+    def record_failure(self):
+        if self.get_state() != self.CLOSED:
+            self._open()
+            return
+        failures = self._call('incr', self._failures_key)
+        if failures == 1:
+            self._call('expire', self._failures_key, self.failure_window)
+        if failures >= self.failure_threshold:
+            self._open()
+
+    def _open(self):
+        LOGGER.warning("Circuit breaker %s opened for %d seconds", self.name, self.reset_timeout)
+        self._call('set', self._open_key, 1, ex=self.reset_timeout)
+        self._call('set', self._tripped_key, 1)
+        self._call('delete', self._probe_key, self._failures_key)
@@ -1,16 +1,33 @@
+import functools
+import logging
+from collections import defaultdict
+
+import redis
 import sentry_sdk
 from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rq import Queue
 
-from pola.company.models import Brand
+from pola import result_cache
 from pola.countries import get_registration_country
 from pola.integrations.produkty_w_sieci import (
     ApiException,
+    ServiceUnavailable,
     produkty_w_sieci_client,
 )
-from pola.logic_produkty_w_sieci import create_from_api, is_code_supported
+from pola.logic_produkty_w_sieci import (
+    create_from_api,
+    is_code_supported,
+    is_known_not_found,
+    remember_not_found,
+)
 from pola.logic_score import get_pl_score
 from pola.product.models import Product
-from pola.text_utils import _shorten_txt, strip_urls_newlines
+from pola.rq_worker import conn
+from pola.text_utils import _shorten_txt
+
+LOGGER = logging.getLogger(__name__)
 
 WAR_COUNTRIES = ('Federacja Rosyjska', "Białoruś")
 
@@ -53,17 +70,88 @@ DEFAULT_STATS = {'was_verified': False, 'was_590': False, 'was_plScore': False}
 
 
 def get_result_from_code(code, multiple_company_supported=False, report_as_object=False):
+    if not result_cache.is_enabled():
+        return _get_result_from_code(code, multiple_company_supported, report_as_object)
+
+    cached, generation = result_cache.lookup(code, multiple_company_supported, report_as_object)
+    if cached is not None:
+        return cached
+
+    result, stats, product = _get_result_from_code(code, multiple_company_supported, report_as_object)
+    timeout = _get_result_cache_timeout(code, product)
+    if timeout:
+        result_cache.store(
+            code, multiple_company_supported, report_as_object, generation, (result, stats, product), timeout=timeout
+        )
+    return result, stats, product
+
+
+def get_results_from_codes(codes, multiple_company_supported=False, report_as_object=False):
+    """Batch variant of :func:`get_result_from_code`.
+
+    Returns a mapping of code to ``(result, stats, product)``. Products of all codes are loaded at once.
+    """
+    codes = list(dict.fromkeys(codes))
+    results, generation = {}, None
+    if result_cache.is_enabled():
+        results, generation = result_cache.lookup_many(codes, multiple_company_supported, report_as_object)
+
+    missing = [code for code in codes if code not in results]
+    products = get_by_codes([code for code in missing if is_ean(code)])
+    computed = {
+        code: _get_result_from_code(code, multiple_company_supported, report_as_object, product=products.get(code))
+        for code in missing
+    }
+    if result_cache.is_enabled():
+        by_timeout = defaultdict(dict)
+        for code, value in computed.items():
+            by_timeout[_get_result_cache_timeout(code, value[2])][code] = value
+        by_timeout.pop(0, None)
+        for timeout, values in by_timeout.items():
+            result_cache.store_many(values, multiple_company_supported, report_as_object, generation, timeout=timeout)
+    results.update(computed)
+    return {code: results[code] for code in codes}
+
+
+def _get_result_cache_timeout(code, product):
+    """Return how long (in seconds) the result of ``code`` may be cached, ``0`` if it must not be cached."""
+    if product is None:
+        return 0
+    if product.company_id is None and is_code_supported(code) and settings.PRODUKTY_W_SIECI_ENABLE:
+        if is_known_not_found(code):
+            # Unknown codes are not looked up again until they expire or are requeried. A product found by the
+            # requery is saved, which invalidates its cached results.
+            return settings.SCAN_RESULT_CACHE_TIMEOUT
+        if not produkty_w_sieci_client.is_available():
+            # The lookup is skipped while the circuit breaker is open, keep the result until it may close.
+            return produkty_w_sieci_client.circuit_breaker.reset_timeout
+        # A product without a company is looked up in Produkty w Sieci on every scan, so the result may change
+        # without any change in our database. The asynchronous lookup refreshes the cache itself.
+        if not settings.PRODUKTY_W_SIECI_ASYNC:
+            return 0
+    return settings.SCAN_RESULT_CACHE_TIMEOUT
+
+
+def is_ean(code):
+    return code.isdigit() and (len(code) == 8 or len(code) == 13)
+
+
+def _get_result_from_code(code, multiple_company_supported=False, report_as_object=False, product=None):
+    """Build the scan result of ``code``.
+
+    ``product`` is the product of an EAN code loaded in advance, see :func:`get_by_codes`.
+    """
     result = DEFAULT_RESULT.copy()
     stats = DEFAULT_STATS.copy()
     report = DEFAULT_REPORT_DATA.copy()
-    product = None
 
     result['code'] = code
     if not multiple_company_supported:
         result.update(DEFAULT_COMPANY_DATA)
-    if code.isdigit() and (len(code) == 8 or len(code) == 13):
+    if is_ean(code):
         # code is EAN8 or EAN13
-        product = get_by_code(code)
+        if product is None:
+            product = get_by_code(code)
         if product:
             product_company = product.company
             brand_company = product.brand.company if product.brand else None
@@ -115,7 +203,8 @@ def serialize_brand(brand):
 def _find_replacements(replacements_rel):
     """Find replacements for a product and serialize them."""
     items = []
-    for r in replacements_rel.order_by("id"):
+    # Sorted in Python to reuse the replacements prefetched by Product.objects.for_scan().
+    for r in sorted(replacements_rel.all(), key=lambda r: r.id):
         company = r.company
         company_name = None
         if company:
@@ -195,13 +284,13 @@ def append_brands_if_enabled(company, company_data):
     if company_data['description']:
         company_data['description'] += "\n"
 
-    brand_list = ", ".join(sorted(str(brand) for brand in Brand.objects.filter(company=company)))
+    brand_list = ", ".join(sorted(str(brand) for brand in company.brand_set.all()))
     company_data['description'] += f'Ten producent psoiada marki: {brand_list}.'
 
 
 def add_brands(company_data, product_company):
     if product_company:
-        company_data['brands'] = [serialize_brand(brand) for brand in Brand.objects.filter(company=product_company)]
+        company_data['brands'] = [serialize_brand(brand) for brand in product_company.brand_set.all()]
 
 
 def handle_multiple_companies(code, companies, result, stats, product_company):
@@ -278,69 +367,91 @@ def handle_unknown_company(code, report, result, multiple_company_supported):
 
 
 def serialize_company(company):
-    plScore = get_pl_score(company)
     company_data = DEFAULT_COMPANY_DATA.copy()
     # we know the manufacturer of the product
-    company_data['name'] = company.common_name or company.official_name or company.name
-    company_data['plCapital'] = company.plCapital
-    company_data['plCapital_notes'] = company.plCapital_notes
-    company_data['plWorkers'] = company.plWorkers
-    company_data['plWorkers_notes'] = company.plWorkers_notes
-    company_data['plRnD'] = company.plRnD
-    company_data['plRnD_notes'] = company.plRnD_notes
-    company_data['plRegistered'] = company.plRegistered
-    company_data['plRegistered_notes'] = company.plRegistered_notes
-    company_data['plNotGlobEnt'] = company.plNotGlobEnt
-    company_data['plNotGlobEnt_notes'] = company.plNotGlobEnt_notes
-    company_data['is_friend'] = company.is_friend
-    if company.is_friend:
-        company_data['friend_text'] = 'To jest przyjaciel Poli'
-    if company.description:
-        company_data['description'] = company.description
-    else:
-        desc = ''
-        if company.plCapital_notes:
-            desc += strip_urls_newlines(company.plCapital_notes) + '\n'
-        if company.plWorkers_notes:
-            desc += strip_urls_newlines(company.plWorkers_notes) + '\n'
-        if company.plRnD_notes:
-            desc += strip_urls_newlines(company.plRnD_notes) + '\n'
-        if company.plRegistered_notes:
-            desc += strip_urls_newlines(company.plRegistered_notes) + '\n'
-        if company.plNotGlobEnt_notes:
-            desc += strip_urls_newlines(company.plNotGlobEnt_notes) + '\n'
-
-        company_data['description'] = desc
-    company_data['sources'] = company.get_sources(raise_exp=False)
-    if plScore:
-        company_data['plScore'] = plScore
-    company_data['official_url'] = company.official_url
+    company_data.update(company.get_scan_card())
     if company.logotype:
         company_data['logotype_url'] = company.logotype.url
     return company_data
 
 
 def _process_with_produkty_w_sieci(code, product=None) -> Product | None:
+    if not (is_code_supported(code) and settings.PRODUKTY_W_SIECI_ENABLE):
+        return None
+    if is_known_not_found(code):
+        return None
+    if not produkty_w_sieci_client.is_available():
+        # Produkty w Sieci keeps failing, do not wait for it until the circuit breaker lets requests through.
+        return None
+    if settings.PRODUKTY_W_SIECI_ASYNC:
+        schedule_enrichment(code)
+        return None
+    return process_with_produkty_w_sieci(code, product=product)
+
+
+def process_with_produkty_w_sieci(code, product=None) -> Product | None:
     try:
         if is_code_supported(code) and settings.PRODUKTY_W_SIECI_ENABLE:
             products_response = produkty_w_sieci_client.get_products(gtin_number=code)
+            if products_response is None:
+                remember_not_found(code)
+                return None
             return create_from_api(code, products_response, product=product)
+    except ServiceUnavailable as ex:
+        LOGGER.info("Skipped lookup of %s: %s", code, ex)
     except ApiException as ex:
         sentry_sdk.capture_exception(ex)
     return None
 
 
 def get_by_code(code):
-    try:
-        product = Product.objects.get(code=code)
+    return _complete_product(code, Product.objects.for_scan().filter(code=code).first())
+
+
+def get_by_codes(codes):
+    """Batch variant of :func:`get_by_code`. Returns a mapping of code to product."""
+    products = {product.code: product for product in Product.objects.for_scan().filter(code__in=codes)}
+    return {code: _complete_product(code, products.get(code)) for code in codes}
+
+
+def _complete_product(code, product):
+    if product is not None:
         # If product exists but has no assigned company, still try to create from API
         if not product.company:
             res = _process_with_produkty_w_sieci(code, product=product)
             if res:
                 return res
         return product
-    except Product.DoesNotExist:
-        res = _process_with_produkty_w_sieci(code, product=None)
-        if res:
-            return res
+    res = _process_with_produkty_w_sieci(code, product=None)
+    if res:
+        return res
     return Product.objects.create(code=code)
+
+
+# Longer than the worst case of the lookup, including retries of the Produkty w Sieci client.
+ENRICHMENT_LOCK_TIMEOUT = 15 * 60
+
+
+def get_enrichment_lock_key(code):
+    return f'pola:enrichment:{code}'
+
+
+def schedule_enrichment(code):
+    """Enqueue a lookup of ``code`` in Produkty w Sieci, unless one is already in flight.
+
+    Returns ``True`` if the lookup was enqueued.
+    """
+    if not cache.add(get_enrichment_lock_key(code), 1, timeout=ENRICHMENT_LOCK_TIMEOUT):
+        return False
+    # The job reads the product created by the current request.
+    transaction.on_commit(functools.partial(_enqueue_enrichment, code))
+    return True
+
+
+def _enqueue_enrichment(code):
+    try:
+        # Referenced by name, pola.logic_workers imports this module.
+        Queue(connection=conn).enqueue('pola.logic_workers.enrich_product', code)
+    except redis.exceptions.RedisError:
+        LOGGER.exception("Failed to enqueue enrichment of %s", code)
+        cache.delete(get_enrichment_lock_key(code))
@@ -1,14 +1,39 @@
+from collections.abc import Iterable
+from typing import NamedTuple
+
+from pola.product.models import Product
 from pola.report.models import Report
 
+BOT_CLIENT = 'krs-bot'
+
+
+class BotReport(NamedTuple):
+    product: Product
+    description: str
+    check_if_already_exists: bool = False
+
 
 def create_bot_report(product, description, check_if_already_exists=False):
-    if (
-        check_if_already_exists
-        and Report.objects.filter(product=product, client='krs-bot', description=description).exists()
-    ):
-        return
-
-    report = Report(description=description)
-    report.product = product
-    report.client = 'krs-bot'
-    report.save()
+    create_bot_reports([BotReport(product, description, check_if_already_exists)])
+
+
+def create_bot_reports(reports: Iterable[BotReport]):
+    """Create many bot reports with one query for existing reports and one insert.
+
+    Reports with ``check_if_already_exists`` are skipped if the same report was already created.
+    Returns the number of created reports.
+    """
+    reports = [(report, Report.get_dedup_key(report.product.pk, BOT_CLIENT, report.description)) for report in reports]
+    checked_keys = {dedup_key for report, dedup_key in reports if report.check_if_already_exists}
+    # The same as creating the reports one by one, each after checking the previous ones.
+    created_keys = set(Report.objects.filter(dedup_key__in=checked_keys).values_list('dedup_key', flat=True))
+    new_reports = []
+    for report, dedup_key in reports:
+        if report.check_if_already_exists and dedup_key in created_keys:
+            continue
+        created_keys.add(dedup_key)
+        new_reports.append(
+            Report(product=report.product, client=BOT_CLIENT, description=report.description, dedup_key=dedup_key)
+        )
+    Report.objects.bulk_create(new_reports)
+    return len(new_reports)
@@ -1,26 +1,80 @@
+import hashlib
+import json
 import logging
+import random
 from typing import Optional
 
+from django.conf import settings
+from django.core.cache import cache
+
 from pola.company.models import Brand, Company
 from pola.gpc.models import GPCBrick
 from pola.integrations.produkty_w_sieci import ProductBase
-from pola.logic_bot_report import create_bot_report
+from pola.logic_bot_report import BotReport, create_bot_reports
 from pola.product.models import Product
 from pola.text_utils import strip_dbl_spaces
 
 LOGGER = logging.getLogger(__file__)
 
+# Codes unknown to Produkty w Sieci expire at random within this fraction of the timeout, so that codes looked up
+# together are not looked up together again.
+NOT_FOUND_TIMEOUT_JITTER = 0.2
+
 
 def is_code_supported(code: str):
     # Check if 590 only is supported by GS1
     return code[0:3] == '590' and len(code) == 13
 
 
+def get_not_found_key(code):
+    return f'pola:produkty_w_sieci:not_found:{code}'
+
+
+def is_known_not_found(code):
+    """Return ``True`` if Produkty w Sieci has recently replied that it does not know ``code``."""
+    if not settings.PRODUKTY_W_SIECI['NOT_FOUND_TIMEOUT']:
+        return False
+    return cache.get(get_not_found_key(code)) is not None
+
+
+def remember_not_found(code):
+    timeout = settings.PRODUKTY_W_SIECI['NOT_FOUND_TIMEOUT']
+    if not timeout:
+        return
+    timeout = round(timeout * random.uniform(1, 1 + NOT_FOUND_TIMEOUT_JITTER))
+    cache.set(get_not_found_key(code), 1, timeout=timeout)
+
+
+def forget_not_found(code):
+    cache.delete(get_not_found_key(code))
+
+
+def get_gs1_response_hash(data: dict) -> str:
+    """Return the hash of a response of Produkty w Sieci, as stored in ``Product.gs1_last_response``."""
+    normalized = json.dumps(data, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
 def create_from_api(
-    code: str, get_products_response: Optional[ProductBase], product: Optional[Product] = None
+    code: str,
+    get_products_response: Optional[ProductBase],
+    product: Optional[Product] = None,
+    bot_reports: Optional[list[BotReport]] = None,
 ) -> Product | None:
+    """Create or update the product of ``code`` with a response of Produkty w Sieci.
+
+    Differences that need a review are reported by the bot. The reports are appended to ``bot_reports``,
+    if given, to be created in bulk by the caller.
+    """
     if not is_code_supported(code):
         raise Exception(f"Unsupported code: {code}")
+    response_data = get_products_response.dict() if get_products_response else None
+    response_hash = get_gs1_response_hash(response_data) if response_data else None
+    if product and response_hash and product.gs1_response_hash == response_hash:
+        # The response was already applied. Comparing the product again would only repeat the same reports.
+        LOGGER.info("The response did not change since the last query. Skipping the product.")
+        return product
+
     result_product = get_products_response
     result_company = result_product.company if result_product else None
 
@@ -33,6 +87,8 @@ def create_from_api(
     if not product and result_product:
         LOGGER.info("Product missing. Creating a new product.")
         product = Product.objects.create(
+            gs1_last_response=response_data,
+            gs1_response_hash=response_hash,
             name=result_product.name,
             code=code,
             company=expected_company,
@@ -48,6 +104,7 @@ def create_from_api(
         return product
 
     LOGGER.info("Product exists. Updating a product.")
+    reports = []
     product_commit_desc = ""
     if product.name:
         if result_product and result_product.name and product.name != result_product.name:
@@ -56,10 +113,12 @@ def create_from_api(
                 product.name,
                 result_product.name,
             )
-            create_bot_report(
-                product,
-                f"Wg. najnowszego odpytania w bazie ILiM nazwa tego produktu to: {result_product.name}",
-                check_if_already_exists=not company_created,
+            reports.append(
+                BotReport(
+                    product,
+                    f"Wg. najnowszego odpytania w bazie ILiM nazwa tego produktu to: {result_product.name}",
+                    check_if_already_exists=not company_created,
+                )
             )
     else:
         if result_product and result_product.name != code and result_product.name:
@@ -74,10 +133,12 @@ def create_from_api(
                 product.company.name,
                 result_company.name,
             )
-            create_bot_report(
-                product,
-                f"Wg. najnowszego odpytania w bazie ILiM producent tego produktu to: {result_company.name!r}",
-                check_if_already_exists=not company_created,
+            reports.append(
+                BotReport(
+                    product,
+                    f"Wg. najnowszego odpytania w bazie ILiM producent tego produktu to: {result_company.name!r}",
+                    check_if_already_exists=not company_created,
+                )
             )
         else:
             LOGGER.info("A previously unknown company was found. Updating the product.")
@@ -88,10 +149,12 @@ def create_from_api(
         if product.brand:
             if result_product and product.brand.name != result_product.brand:
                 LOGGER.info("Brand name mismatch. Creating a report.")
-                create_bot_report(
-                    product,
-                    f"Wg. najnowszego odpytania w bazie ILiM marka tego produktu to: {result_product.brand!r}",
-                    check_if_already_exists=not company_created,
+                reports.append(
+                    BotReport(
+                        product,
+                        f"Wg. najnowszego odpytania w bazie ILiM marka tego produktu to: {result_product.brand!r}",
+                        check_if_already_exists=not company_created,
+                    )
                 )
         else:
             LOGGER.info("A previously unknown brand was found. Updating the product.")
@@ -110,10 +173,12 @@ def create_from_api(
                 product.name,
                 result_product.name,
             )
-            create_bot_report(
-                product,
-                f"Wg. najnowszego odpytania w bazie ILiM kod GPC tego produktu to: {result_product.gpc[0].code}",
-                check_if_already_exists=not company_created,
+            reports.append(
+                BotReport(
+                    product,
+                    f"Wg. najnowszego odpytania w bazie ILiM kod GPC tego produktu to: {result_product.gpc[0].code}",
+                    check_if_already_exists=not company_created,
+                )
             )
     else:
         if result_product and result_product.gpc:
@@ -121,8 +186,13 @@ def create_from_api(
             product_commit_desc += 'Kod GPC zmieniony na podstawie bazy GS1. '
             product.gpc_brick = GPCBrick.objects.filter(code=result_product.gpc[0].code).first()
 
-    product.gs1_last_response = get_products_response.dict()
+    product.gs1_last_response = response_data
+    product.gs1_response_hash = response_hash
     product.save(commit_desc=product_commit_desc)
+    if bot_reports is None:
+        create_bot_reports(reports)
+    else:
+        bot_reports.extend(reports)
 
     return product
 
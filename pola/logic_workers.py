@@ -1,19 +1,44 @@
+import logging
+import time
+from collections import Counter
 from collections.abc import Iterable
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import timedelta
 
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import QuerySet
 from django.utils import timezone
 
-from pola.integrations.produkty_w_sieci import produkty_w_sieci_client
-from pola.logic_produkty_w_sieci import create_from_api, is_code_supported
+from pola import logic, metrics, result_cache
+from pola.integrations.http import RateLimiter
+from pola.integrations.produkty_w_sieci import ApiException, create_client
+from pola.logic_bot_report import create_bot_reports
+from pola.logic_produkty_w_sieci import (
+    create_from_api,
+    forget_not_found,
+    is_code_supported,
+    remember_not_found,
+)
 from pola.product.models import Product
 
 REQUERY_590_FREQUENCY_DAYS = 30
 REQUERY_590_LIMIT = 10000
 REQUERY_ALL_FREQUENCY_DAYS = 60
 REQUERY_ALL_LIMIT = 10000
+# Number of products read from the database and updated at once.
+REQUERY_BATCH_SIZE = 500
+# How long (in seconds) a lookup may wait for the shared rate limit of Produkty w Sieci.
+REQUERY_RATE_LIMIT_TIMEOUT = 60
 
+LOGGER = logging.getLogger(__name__)
 
-def requery_590_codes():
+# Flags of get_result_from_code used by the v2/v3 and the v4 API.
+SCAN_RESULT_VARIANTS = ((False, False), (True, True))
+
+
+def requery_590_codes(*, concurrency=None, rate=None):
     print("Starting requering 590 codes...")
 
     p590 = Product.objects.filter(
@@ -23,40 +48,152 @@ def requery_590_codes():
         ilim_queried_at__lt=timezone.now() - timedelta(days=REQUERY_590_FREQUENCY_DAYS),
     ).order_by('-query_count')[:REQUERY_590_LIMIT]
 
-    requery_products(p590)
+    requery_products(p590, concurrency=concurrency, rate=rate)
 
     print("Finished requering 590 codes...")
 
 
-def requery_all_codes():
+def requery_all_codes(*, concurrency=None, rate=None):
     print("Starting requering all codes...")
 
     products = Product.objects.filter(
         ilim_queried_at__lt=timezone.now() - timedelta(days=REQUERY_ALL_FREQUENCY_DAYS),
     ).order_by('-query_count')[:REQUERY_ALL_LIMIT]
 
-    requery_products(products)
+    requery_products(products, concurrency=concurrency, rate=rate)
 
     print("Finished requering all codes...")
 
 
-def requery_products(products: Iterable[Product]):
-    for prod in products:
-        print(prod.code, prod.query_count, " -> ")
-
-        prod.ilim_queried_at = timezone.now()
-        prod.save()
-
-        try:
+def requery_products(products: Iterable[Product], *, concurrency=None, rate=None):
+    """Look up ``products`` in Produkty w Sieci again and update them with the responses.
+
+    Lookups are sent by ``concurrency`` threads, at most ``rate`` per second in total (``0`` disables the limit).
+    The responses are applied to the database by the calling thread. Products of failed lookups are requeried
+    by the next run. The run stops early while the circuit breaker of Produkty w Sieci is open. Returns the number
+    of requeried products and the number of failed lookups.
+    """
+    if concurrency is None:
+        concurrency = settings.PRODUKTY_W_SIECI_REQUERY_CONCURRENCY
+    if rate is None:
+        rate = settings.PRODUKTY_W_SIECI_REQUERY_RATE
+    # Connections that do not fit in the pool would be closed after every request. Unlike scans, the requery
+    # may wait for the shared rate limit of Produkty w Sieci.
+    client = create_client(
+        pool_size=max(concurrency, settings.PRODUKTY_W_SIECI['POOL_SIZE']),
+        rate_limit_timeout=REQUERY_RATE_LIMIT_TIMEOUT,
+    )
+    rate_limiter = RateLimiter(rate) if rate else None
+
+    def lookup(code):
+        if rate_limiter:
+            rate_limiter.wait()
+        return client.get_products(gtin_number=code)
+
+    if isinstance(products, QuerySet):
+        products = products.iterator(chunk_size=REQUERY_BATCH_SIZE)
+
+    stats = Counter(products=0, errors=0)
+    start = time.monotonic()
+    queried = []
+    bot_reports = []
+    pending = {}
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='requery')
+    try:
+        for prod in products:
+            if not client.is_available():
+                print("Produkty w Sieci is unavailable, stopping.")
+                break
             if is_code_supported(prod.code):
-                products_response = produkty_w_sieci_client.get_products(gtin_number=prod.code)
-                p = create_from_api(prod.code, products_response, product=prod)
-                if p and p.company and p.company.name:
-                    print(p.company.name.encode(), p.brand)
-                else:
-                    print(".")
+                pending[executor.submit(lookup, prod.code)] = prod
             else:
-                print(";")
-        except ConnectionError as e:
-            print(e)
-            raise e
+                _count_requeried(stats)
+                print(prod.code, prod.query_count, " -> ;")
+                queried.append(prod)
+            # Keep the workers busy, without reading all products into memory.
+            while len(pending) >= 2 * concurrency:
+                queried += _collect_requery_responses(pending, stats, bot_reports)
+            if len(queried) >= REQUERY_BATCH_SIZE:
+                _save_requeried(queried, bot_reports)
+                queried, bot_reports = [], []
+        while pending:
+            queried += _collect_requery_responses(pending, stats, bot_reports)
+    finally:
+        executor.shutdown(cancel_futures=True)
+        _save_requeried(queried, bot_reports)
+
+    elapsed = time.monotonic() - start
+    print(
+        f"Requeried {stats['products']} products in {elapsed:.1f}s "
+        f"({stats['products'] / elapsed if elapsed else 0:.1f} products/s), {stats['errors']} errors"
+    )
+    print("Connection pool:", client.get_pool_stats())
+    return dict(stats)
+
+
+def _collect_requery_responses(pending, stats, bot_reports):
+    """Wait for lookups of ``pending`` products and apply their responses. Returns the requeried products."""
+    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+    requeried = []
+    for future in done:
+        prod = pending.pop(future)
+        if _apply_requery_response(prod, future, stats, bot_reports):
+            requeried.append(prod)
+    return requeried
+
+
+def _apply_requery_response(prod, future, stats, bot_reports):
+    _count_requeried(stats)
+    try:
+        products_response = future.result()
+    except (ApiException, requests.RequestException) as e:
+        stats['errors'] += 1
+        metrics.increment('requery.errors')
+        LOGGER.warning("Failed to requery %s: %s", prod.code, e)
+        print(prod.code, prod.query_count, " -> error:", e)
+        return False
+    # The requery refreshes the list of codes unknown to Produkty w Sieci, which is used by scans.
+    if products_response is None:
+        remember_not_found(prod.code)
+        print(prod.code, prod.query_count, " -> not found")
+        return True
+    forget_not_found(prod.code)
+    p = create_from_api(prod.code, products_response, product=prod, bot_reports=bot_reports)
+    if p and p.company and p.company.name:
+        print(prod.code, prod.query_count, " -> ", p.company.name.encode(), p.brand)
+    else:
+        print(prod.code, prod.query_count, " -> .")
+    return True
+
+
+def _count_requeried(stats):
+    stats['products'] += 1
+    metrics.increment('requery.products')
+
+
+def _save_requeried(products, bot_reports):
+    # Only the time of the query is saved, the responses are saved by create_from_api.
+    now = timezone.now()
+    for prod in products:
+        prod.ilim_queried_at = now
+    Product.objects.bulk_update(products, ['ilim_queried_at'])
+    create_bot_reports(bot_reports)
+
+
+def enrich_product(code):
+    """Look up ``code`` in Produkty w Sieci and refresh its cached scan results.
+
+    Enqueued by :func:`pola.logic.schedule_enrichment`.
+    """
+    try:
+        product = Product.objects.filter(code=code).first()
+        if product is None or product.company_id is None:
+            logic.process_with_produkty_w_sieci(code, product=product)
+        if result_cache.is_enabled():
+            # Replace the results cached while the lookup was in flight. The lock is still held, so building
+            # the results does not enqueue another lookup.
+            result_cache.invalidate_codes([code])
+            for multiple_company_supported, report_as_object in SCAN_RESULT_VARIANTS:
+                logic.get_result_from_code(code, multiple_company_supported, report_as_object)
+    finally:
+        cache.delete(logic.get_enrichment_lock_key(code))
@@ -0,0 +1,114 @@
+import json
+import statistics
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.http import JsonResponse
+
+from pola.logic import DEFAULT_COMPANY_DATA, DEFAULT_REPORT_DATA
+from pola.rpc_api.api_models import (
+    BrandBasicInfo,
+    CompanyBasicInfo,
+    SearchResult,
+    SearchResultCollection,
+)
+from pola.rpc_api.http import JsonDataResponse
+
+
+def create_scan_result(i):
+    """Return a result of ``/a/v4/get_by_code`` with one company and replacements."""
+    company = {
+        **DEFAULT_COMPANY_DATA,
+        'name': f'Zakłady Mięsne Łódź {i} Sp. z o.o.',
+        'plCapital': 100,
+        'plCapital_notes': 'Spółka należy w całości do polskich właścicieli.',
+        'plWorkers': 100,
+        'plRnD': 100,
+        'plRegistered': 100,
+        'plNotGlobEnt': 100,
+        'plScore': 100,
+        'official_url': 'https://example.com',
+        'description': 'Polska firma rodzinna założona w 1990 roku. ' * 8,
+        'sources': {'KRS': 'https://example.com/krs', 'Strona firmy': 'https://example.com/o-nas'},
+        'is_friend': i % 2 == 0,
+        'brands': [{'name': f'Marka {j}', 'logotype_url': None} for j in range(3)],
+    }
+    return {
+        'product_id': i,
+        'code': f'590{i:010d}',
+        'name': f'Kiełbasa śląska {i}',
+        'card_type': 'type_grey',
+        'altText': None,
+        'report': DEFAULT_REPORT_DATA,
+        'companies': [company],
+        'replacements': [
+            {'code': f'590{j:010d}', 'name': f'Kiełbasa {j}', 'company': 'Żywiec', 'display_name': f'Kiełbasa {j}'}
+            for j in range(3)
+        ],
+        'donate': {'show_button': True, 'title': 'Potrzebujemy 1 zł', 'url': 'https://example.com/wesprzyj'},
+    }
+
+
+def create_search_page():
+    return SearchResultCollection(
+        nextPageToken='eyJhZnRlciI6WzAuNSwxMF19:1s2Qz5:x' * 2,
+        products=[
+            SearchResult(
+                name=f'Czekolada gorzka {i}',
+                code=f'590{i:010d}',
+                company=CompanyBasicInfo(name='Wedel', score=70),
+                brand=BrandBasicInfo(name='Wedel'),
+            )
+            for i in range(10)
+        ],
+        totalItems=1234,
+    )
+
+
+PAYLOADS = {
+    'get_by_code': lambda: create_scan_result(1),
+    'get_by_codes (50)': lambda: {'products': [create_scan_result(i) for i in range(50)]},
+    'search': create_search_page,
+}
+
+
+class Command(BaseCommand):
+    help = 'Compares serialization of API responses by JsonResponse and JsonDataResponse'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        for name, create_payload in PAYLOADS.items():
+            data = create_payload()
+            legacy, current = JsonResponse(data), JsonDataResponse(data)
+            if json.loads(legacy.content) != json.loads(current.content):
+                raise AssertionError(f'Different content of {name}')
+            print(f"{name}:")
+            for response_cls in (JsonResponse, JsonDataResponse):
+                timing = self._measure_time(lambda: response_cls(data), options['repeat'])
+                peak = self._measure_peak_memory(lambda: response_cls(data))
+                size = len(response_cls(data).content)
+                print(f"  {response_cls.__name__:>16}: {timing}, peak memory {peak / 1024:7.1f} KiB, {size} bytes")
+
+    @staticmethod
+    def _measure_time(func, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1_000_000)
+        timings.sort()
+        p95 = timings[max(0, round(len(timings) * 0.95) - 1)]
+        return f"p50 {statistics.median(timings):8.1f} µs, p95 {p95:8.1f} µs"
+
+    @staticmethod
+    def _measure_peak_memory(func):
+        tracemalloc.start()
+        try:
+            baseline = tracemalloc.get_traced_memory()[0]
+            func()
+            return tracemalloc.get_traced_memory()[1] - baseline
+        finally:
+            tracemalloc.stop()
@@ -0,0 +1,112 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from pola.product.models import Product
+
+# Codes of generated products start with this prefix. Scans create products of EAN codes only, so real products
+# never have it and are never deleted by --cleanup.
+GENERATED_CODE_PREFIX = 'bench-'
+
+WORDS = [
+    'baton',
+    'czekolada',
+    'gorzka',
+    'mleczna',
+    'ciastka',
+    'herbatniki',
+    'sok',
+    'jabłkowy',
+    'pomarańczowy',
+    'woda',
+    'mineralna',
+    'gazowana',
+    'masło',
+    'śmietana',
+    'jogurt',
+    'naturalny',
+    'kawa',
+    'ziarnista',
+    'herbata',
+    'zielona',
+    'chleb',
+    'żytni',
+    'płatki',
+    'owsiane',
+    'makaron',
+    'świderki',
+    'ser',
+    'żółty',
+    'kiełbasa',
+    'szynka',
+]
+
+DEFAULT_QUERIES = ['baton', 'czekolada gorzka', 'zolty ser', 'płatki', 'sok jabł', 'kielbasa szynka', 'xyz']
+
+
+class Command(BaseCommand):
+    help = 'Measures the latency of the product search, optionally on generated products'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--generate', type=int, default=0, help='Number of products to generate first')
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--query', action='append', dest='queries', help='Query to measure, can be repeated')
+        parser.add_argument('--cleanup', action='store_true', help='Delete the generated products and exit')
+
+    def handle(self, *args, **options):
+        if options['cleanup']:
+            deleted = Product.objects.filter(code__startswith=GENERATED_CODE_PREFIX).delete()
+            print(f'Deleted {deleted[0]} objects')
+            return
+        if options['generate']:
+            self._generate(options['generate'])
+
+        print(f"Products: {Product.objects.count()}")
+        for query in options['queries'] or DEFAULT_QUERIES:
+            legacy = self._measure(
+                lambda: Product.objects.filter(name__icontains=query).order_by('pk'), options['repeat']
+            )
+            current = self._measure(lambda: Product.objects.search(query), options['repeat'])
+            print(f"{query!r:>20}  icontains: {legacy}  search: {current}")
+
+    @staticmethod
+    def _measure(get_queryset, repeat):
+        # The search API reads the first page and counts all results.
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            qs = get_queryset()
+            list(qs[:10])
+            qs.count()
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        p95 = timings[max(0, round(len(timings) * 0.95) - 1)]
+        return f"p50 {statistics.median(timings):8.1f} ms, p95 {p95:8.1f} ms"
+
+    @staticmethod
+    def _generate(count):
+        start = time.perf_counter()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'select coalesce(max(substr(code, %s)::bigint), 0) from product_product where code like %s',
+                [len(GENERATED_CODE_PREFIX) + 1, GENERATED_CODE_PREFIX + '%'],
+            )
+            (offset,) = cursor.fetchone()
+            cursor.execute(
+                'insert into product_product '
+                '(created, modified, ilim_queried_at, code, name, query_count, ai_pics_count) '
+                'select now(), now(), now(), %s || lpad((%s + i)::text, 11, %s), '
+                '  initcap(w[1 + (i * 7) %% array_length(w, 1)]) || %s || w[1 + (i * 13) %% array_length(w, 1)] '
+                '    || %s || w[1 + (i / 31) %% array_length(w, 1)] || %s || i::text, '
+                '  (random() * random() * 10000)::integer, 0 '
+                'from generate_series(1, %s) as i, (select %s::text[] as w) as words',
+                [GENERATED_CODE_PREFIX, offset, '0', ' ', ' ', ' ', count, WORDS],
+            )
+        Product.objects.filter(
+            code__startswith=GENERATED_CODE_PREFIX, search_vector__isnull=True
+        ).update_search_vectors()
+        with connection.cursor() as cursor:
+            cursor.execute('analyze product_product')
+        print(f"Generated {count} products in {time.perf_counter() - start:.1f} s")
@@ -0,0 +1,21 @@
+import timeit
+
+from django.core.management.base import BaseCommand
+
+from pola.countries import _find_registration_country, get_registration_country
+
+# Codes registered in Poland or in a country at the end of the list are the slowest case of the linear lookup.
+CODES = ['5901234123457', '9581234123457', '0001234123457']
+
+
+class Command(BaseCommand):
+    help = 'Compares the lookup of registration countries of codes with the linear lookup'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--number', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        for func in (_find_registration_country, get_registration_country):
+            timing = min(timeit.repeat(lambda: [func(code) for code in CODES], number=options['number'], repeat=5))
+            per_lookup = timing / options['number'] / len(CODES) * 1_000_000
+            print(f"{func.__name__:>28}: {per_lookup:6.2f} µs per code")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from pola.scan_events import flush_scan_events
+
+
+class Command(BaseCommand):
+    help = 'Writes buffered scan events to the database'
+
+    def handle(self, *args, **options):
+        written = flush_scan_events()
+        print(f'Written {written} scan events')
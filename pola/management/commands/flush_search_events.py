@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from pola.search_events import flush_search_events
+
+
+class Command(BaseCommand):
+    help = 'Writes buffered search events to the database'
+
+    def handle(self, *args, **options):
+        written = flush_search_events()
+        print(f'Written {written} search events')
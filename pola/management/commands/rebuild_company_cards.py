@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from pola import result_cache
+from pola.company.models import SCAN_CARD_VERSION, Company
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the precomputed scan cards of companies'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--only-outdated', action='store_true', help='Rebuild only missing cards and cards of an older version'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        qs = Company.objects.order_by('pk')
+        if options['only_outdated']:
+            qs = qs.filter(Q(scan_card__isnull=True) | ~Q(scan_card__version=SCAN_CARD_VERSION))
+
+        rebuilt = 0
+        batch = []
+        for company in qs.iterator(chunk_size=batch_size):
+            company.refresh_scan_card()
+            batch.append(company)
+            if len(batch) >= batch_size:
+                rebuilt += self._save(batch)
+                batch = []
+        rebuilt += self._save(batch)
+        # bulk_update sends no signals, so cached scan results with the old cards are dropped here.
+        result_cache.invalidate_all()
+        print(f'Rebuilt {rebuilt} company cards')
+
+    @staticmethod
+    def _save(companies):
+        # bulk_update leaves the modification time untouched, the data shown to users does not change.
+        Company.objects.bulk_update(companies, ['scan_card'])
+        return len(companies)
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from pola.product.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the search vectors of products'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_pk = 0
+        rebuilt = 0
+        # Batches keep the transactions short, the table is updated while the command is running.
+        while True:
+            pks = list(Product.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                break
+            rebuilt += Product.objects.filter(pk__gte=pks[0], pk__lte=pks[-1]).update_search_vectors()
+            last_pk = pks[-1]
+        print(f'Rebuilt {rebuilt} search vectors')
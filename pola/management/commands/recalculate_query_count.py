@@ -1,13 +1,26 @@
 from django.core.management.base import BaseCommand
 
+from pola import counters
 from pola.company.models import Company
 from pola.product.models import Product
 
 
 class Command(BaseCommand):
-    help = 'Recalculates query counts'
+    help = 'Applies pending query count increments. With --full, recalculates all counts from scratch'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Recalculate query counts and AI pics counts of all products and companies',
+        )
 
     def handle(self, *args, **options):
+        print('Folding pending query count increments')
+        updated = counters.fold()
+        print(f'Updated {updated} query counts')
+        if not options['full']:
+            return
         print('Recalculating product query count')
         Product.recalculate_query_count()
         print('Recalculating product ai pics count')
@@ -6,5 +6,17 @@ from pola.logic_workers import requery_590_codes
 class Command(BaseCommand):
     help = 'Requeries all codes for data from ILiM'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            help='Number of concurrent lookups (default: PRODUKTY_W_SIECI_REQUERY_CONCURRENCY)',
+        )
+        parser.add_argument(
+            '--rate',
+            type=float,
+            help='Maximum number of lookups per second, 0 disables the limit (default: PRODUKTY_W_SIECI_REQUERY_RATE)',
+        )
+
     def handle(self, *args, **options):
-        requery_590_codes()
+        requery_590_codes(concurrency=options['concurrency'], rate=options['rate'])
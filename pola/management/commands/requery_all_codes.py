@@ -6,5 +6,17 @@ from pola.logic_workers import requery_all_codes
 class Command(BaseCommand):
     help = 'Requeries all codes for data from ILiM'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            help='Number of concurrent lookups (default: PRODUKTY_W_SIECI_REQUERY_CONCURRENCY)',
+        )
+        parser.add_argument(
+            '--rate',
+            type=float,
+            help='Maximum number of lookups per second, 0 disables the limit (default: PRODUKTY_W_SIECI_REQUERY_RATE)',
+        )
+
     def handle(self, *args, **options):
-        requery_all_codes()
+        requery_all_codes(concurrency=options['concurrency'], rate=options['rate'])
@@ -0,0 +1,53 @@
+"""Process-local metrics.
+
+Counters, timings and gauges live in the memory of the current process, so every web and worker process reports
+its own values. They are exported as JSON by :class:`pola.views.MetricsView`.
+"""
+
+import os
+import threading
+from collections import Counter
+
+_lock = threading.Lock()
+_counters = Counter()
+_timings = {}
+_gauges = {}
+
+
+def increment(name, value=1):
+    with _lock:
+        _counters[name] += value
+
+
+def observe(name, seconds):
+    """Record the duration of an operation."""
+    with _lock:
+        timing = _timings.setdefault(name, {'count': 0, 'total': 0.0, 'max': 0.0})
+        timing['count'] += 1
+        timing['total'] += seconds
+        timing['max'] = max(timing['max'], seconds)
+
+
+def register_gauge(name, func):
+    """Register ``func`` to be called for the current value of ``name`` whenever metrics are read."""
+    _gauges[name] = func
+
+
+def get_metrics():
+    with _lock:
+        counters = dict(sorted(_counters.items()))
+        timings = {
+            name: {**timing, 'avg': timing['total'] / timing['count']} for name, timing in sorted(_timings.items())
+        }
+    return {
+        'pid': os.getpid(),
+        'counters': counters,
+        'timings': timings,
+        'gauges': {name: func() for name, func in sorted(_gauges.items())},
+    }
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _timings.clear()
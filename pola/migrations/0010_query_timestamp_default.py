@@ -0,0 +1,19 @@
+# Generated by Django 5.1.8 on 2026-10-18 17:07
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pola', '0009_appconfiguration'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='query',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.1.8 on 2026-10-18 17:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pola', '0010_query_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueryCountDelta',
+            fields=[
+                (
+                    'id',
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                ('counter', models.CharField(max_length=40)),
+                ('object_id', models.IntegerField()),
+                ('shard', models.SmallIntegerField()),
+                ('value', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [
+                    models.UniqueConstraint(
+                        fields=('counter', 'object_id', 'shard'),
+                        name='pola_querycountdelta_unique_shard',
+                    )
+                ],
+            },
+        ),
+        # Deltas are written on every flush of scan events and folded periodically. They can be recalculated
+        # from pola_query, so we don't need to pay for WAL writes.
+        migrations.RunSQL(
+            'ALTER TABLE pola_querycountdelta SET UNLOGGED',
+            reverse_sql='ALTER TABLE pola_querycountdelta SET LOGGED',
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.8 on 2026-10-18 19:06
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pola', '0011_querycountdelta'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='searchquery',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.CreateModel(
+            name='SearchQueryStats',
+            fields=[
+                (
+                    'id',
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                ('text', models.CharField(max_length=255)),
+                ('day', models.DateField()),
+                ('count', models.IntegerField(default=0)),
+                ('zero_results_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'search query stats',
+                'constraints': [
+                    models.UniqueConstraint(fields=('day', 'text'), name='pola_searchquerystats_unique_day')
+                ],
+            },
+        ),
+    ]
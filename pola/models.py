@@ -1,12 +1,19 @@
+import functools
+import time
 from datetime import datetime, timedelta
 
+from django.conf import settings
 from django.contrib.postgres.indexes import BrinIndex
-from django.db import models
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.timezone import get_default_timezone
 
-from pola.company.models import Company
+from pola import result_cache, suggest
+from pola.company.models import Brand, Company
 from pola.product.models import Product
 from pola.report.models import Report
 
@@ -17,7 +24,8 @@ class Query(models.Model):
     was_verified = models.BooleanField(default=False)
     was_plScore = models.BooleanField(default=False)
     was_590 = models.BooleanField(default=False)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Queries are written in batches, so the timestamp of a scan is set when the event is recorded.
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
         get_latest_by = 'timestamp'
@@ -27,13 +35,43 @@ class Query(models.Model):
 class SearchQuery(models.Model):
     client = models.CharField(max_length=40, blank=True, null=True, default=None)
     text = models.CharField(max_length=255, blank=True, null=True, default=None)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Searches are written in batches, so the timestamp of a search is set when the event is recorded.
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
         get_latest_by = 'timestamp'
         indexes = [BrinIndex(fields=['timestamp'], pages_per_range=64)]
 
 
+class SearchQueryStats(models.Model):
+    """Daily number of searches of a normalized query, updated by :mod:`pola.search_events`."""
+
+    text = models.CharField(max_length=255)
+    day = models.DateField()
+    count = models.IntegerField(default=0)
+    zero_results_count = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = 'search query stats'
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'text'], name='pola_searchquerystats_unique_day'),
+        ]
+
+
+class QueryCountDelta(models.Model):
+    """Not yet applied increments of ``query_count``, see :mod:`pola.counters`."""
+
+    counter = models.CharField(max_length=40)
+    object_id = models.IntegerField()
+    shard = models.SmallIntegerField()
+    value = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['counter', 'object_id', 'shard'], name='pola_querycountdelta_unique_shard'),
+        ]
+
+
 class Stats(models.Model):
     year = models.IntegerField()
     month = models.IntegerField()
@@ -138,6 +176,11 @@ class AppConfiguration(SingletonModel):
     def get_absolute_url(self):
         return reverse('app-config')
 
+    CACHE_KEY = 'app_configuration_v1'
+
+    # The copy of the current process and the monotonic time when it expires.
+    _cached = None
+
     @staticmethod
     def get_singleton():
         app_config = AppConfiguration.objects.first()
@@ -145,3 +188,104 @@ class AppConfiguration(SingletonModel):
             app_config = AppConfiguration()
             app_config.save()
         return app_config
+
+    @classmethod
+    def get_cached(cls):
+        """Return the singleton kept by the process or by the cache, to be read only.
+
+        Every process keeps its copy for ``APP_CONFIGURATION_CACHE_TIMEOUT`` and then reads it from the cache, which
+        is cleared when the configuration is saved. So changes are seen by all processes after this time at most.
+        """
+        timeout = settings.APP_CONFIGURATION_CACHE_TIMEOUT
+        if not timeout:
+            return cls.get_singleton()
+        now = time.monotonic()
+        if cls._cached is not None and cls._cached[1] > now:
+            return cls._cached[0]
+        # The timeout limits how long a copy read during a save may be kept. Only one process reads the database when
+        # the cache is empty, see pola.cache.TieredCache.get_or_set().
+        app_config = cache.get_or_set(cls.CACHE_KEY, cls.get_singleton, timeout=timeout)
+        cls._cached = (app_config, now + timeout)
+        return app_config
+
+    @classmethod
+    def invalidate_cache(cls):
+        cls._cached = None
+        cache.delete(cls.CACHE_KEY)
+
+
+@receiver(post_save, sender=AppConfiguration)
+@receiver(post_delete, sender=AppConfiguration)
+def invalidate_app_configuration(**kwargs):
+    # Other processes could read the previous configuration again before the change is committed.
+    transaction.on_commit(AppConfiguration.invalidate_cache)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_scan_results(instance, **kwargs):
+    result_cache.invalidate_codes([instance.code])
+
+
+@receiver(post_save, sender=Company)
+@receiver(post_delete, sender=Company)
+@receiver(post_save, sender=Brand)
+@receiver(post_delete, sender=Brand)
+def invalidate_all_scan_results(**kwargs):
+    # Companies and brands are shared by many products, so we invalidate all results at once.
+    result_cache.invalidate_all()
+
+
+@receiver(post_save, sender=Company)
+def update_company_search_vectors(instance, created, update_fields=None, **kwargs):
+    if not _includes_search_names(update_fields) or not instance.pop_tracked_changes() or created:
+        return
+    Product.objects.filter(company=instance).update_search_vectors()
+
+
+@receiver(post_save, sender=Brand)
+def update_brand_search_vectors(instance, created, update_fields=None, **kwargs):
+    if not _includes_search_names(update_fields) or not instance.pop_tracked_changes() or created:
+        return
+    Product.objects.filter(brand=instance).update_search_vectors()
+
+
+def _includes_search_names(update_fields):
+    # Names of companies and brands are a part of search vectors of their products.
+    return update_fields is None or bool({'name', 'common_name', 'official_name'}.intersection(update_fields))
+
+
+# Fields of products, brands and companies that are suggested, see pola.suggest.
+SUGGESTED_FIELDS = frozenset(['name', 'common_name', 'official_name'])
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Brand)
+@receiver(post_save, sender=Company)
+def update_suggestions(instance, update_fields=None, **kwargs):
+    if update_fields is not None and not SUGGESTED_FIELDS.intersection(update_fields):
+        return
+    # Products without a name, e.g. of unknown codes created by scans, are never suggested. Product.save checks
+    # changes of names after this receiver, so the name loaded from the database is still tracked.
+    if isinstance(instance, Product) and not instance.name and not instance.get_tracked_value('name'):
+        return
+    transaction.on_commit(functools.partial(suggest.record_saved, instance))
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Brand)
+@receiver(post_delete, sender=Company)
+def remove_suggestions(sender, instance, **kwargs):
+    transaction.on_commit(functools.partial(suggest.record_deleted, sender, instance.pk))
+
+
+@receiver(m2m_changed, sender=Product.replacements.through)
+def invalidate_replacements_scan_results(instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        result_cache.invalidate_codes([instance.code])
+    elif pk_set:
+        result_cache.invalidate_codes(Product.objects.filter(pk__in=pk_set).values_list('code', flat=True))
+    else:
+        result_cache.invalidate_all()
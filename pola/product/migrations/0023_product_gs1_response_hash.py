@@ -0,0 +1,42 @@
+# Generated by Django 5.1.8 on 2026-10-18 18:29
+import hashlib
+import json
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def get_gs1_response_hash(data):
+    # A copy of pola.logic_produkty_w_sieci.get_gs1_response_hash at the time of the migration.
+    normalized = json.dumps(data, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+def fill_gs1_response_hash(apps, schema):
+    Product = apps.get_model('product', 'product')
+    products = Product.objects.filter(gs1_last_response__isnull=False).only('id', 'gs1_last_response')
+    batch = []
+    for product in products.order_by('pk').iterator(chunk_size=BATCH_SIZE):
+        product.gs1_response_hash = get_gs1_response_hash(product.gs1_last_response)
+        batch.append(product)
+        if len(batch) >= BATCH_SIZE:
+            Product.objects.bulk_update(batch, ['gs1_response_hash'])
+            batch = []
+    Product.objects.bulk_update(batch, ['gs1_response_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0022_alter_product_replacements_asym'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='gs1_response_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.RunPython(fill_gs1_response_hash, migrations.RunPython.noop, elidable=True),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.1.8 on 2026-10-18 18:43
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+# pola.text_utils.DIACRITICS and FOLDED_DIACRITICS at the time of the migration.
+DIACRITICS = 'ąćęłńóśźżáàâäãåçčďéèêëěíìîïľňñòôöõřšťúùûüůýÿžĄĆĘŁŃÓŚŹŻÁÀÂÄÃÅÇČĎÉÈÊËĚÍÌÎÏĽŇÑÒÔÖÕŘŠŤÚÙÛÜŮÝŸŽ'
+FOLDED_DIACRITICS = 'acelnoszzaaaaaaccdeeeeeiiiilnnoooorstuuuuuyyzacelnoszzaaaaaaccdeeeeeiiiilnnoooorstuuuuuyyz'
+
+# The same value as pola.product.search.get_search_vector.
+FILL_SEARCH_VECTOR_SQL = """
+update product_product set search_vector =
+    setweight(to_tsvector('simple', coalesce(lower(translate(name, %(from)s, %(to)s)), '')), 'A')
+    || setweight(to_tsvector('simple', coalesce(lower(translate((
+        select concat_ws(' ', name, common_name) from company_brand where company_brand.id = brand_id
+    ), %(from)s, %(to)s)), '')), 'B')
+    || setweight(to_tsvector('simple', coalesce(lower(translate((
+        select concat_ws(' ', name, common_name, official_name) from company_company
+        where company_company.id = company_id
+    ), %(from)s, %(to)s)), '')), 'C')
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('company', '0035_company_scan_card'),
+        ('product', '0023_product_gs1_response_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(
+            [(FILL_SEARCH_VECTOR_SQL, {'from': DIACRITICS, 'to': FOLDED_DIACRITICS})],
+            migrations.RunSQL.noop,
+            elidable=True,
+        ),
+        # Created after the backfill, which is faster without the index.
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='product_search_vector_gin'),
+        ),
+    ]
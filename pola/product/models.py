@@ -1,4 +1,5 @@
-from django.contrib.postgres.indexes import BrinIndex
+from django.contrib.postgres.indexes import BrinIndex, GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core import validators
 from django.db import connection, models
 from django.urls import reverse
@@ -7,9 +8,10 @@ from django.utils.translation import gettext_lazy as _
 from model_utils.models import TimeStampedModel
 from reversion import revisions as reversion
 
-from pola.company.models import Brand, Company
+from pola.company.models import Brand, Company, TrackedFieldsMixin
 from pola.concurency import concurency
 from pola.gpc.models import GPCBrick
+from pola.product import search
 
 
 class ProductQuerySet(models.query.QuerySet):
@@ -27,9 +29,34 @@ class ProductQuerySet(models.query.QuerySet):
             reversion.add_to_revision(obj)
             return obj
 
+    def for_scan(self):
+        """Load everything needed to build a scan result in a fixed number of queries.
+
+        Brands of the companies are available as ``company.brand_set.all()``, replacements together with
+        their companies and brands as ``replacements.all()``.
+        """
+        return self.select_related('company', 'brand__company').prefetch_related(
+            'company__brand_set',
+            'brand__company__brand_set',
+            models.Prefetch('replacements', queryset=self.model.objects.select_related('company', 'brand')),
+        )
+
+    def search(self, text):
+        """Find products by name, brand, company or code. See :mod:`pola.product.search`."""
+        return search.search(self, text)
+
+    def update_search_vectors(self):
+        return self.update(search_vector=search.get_search_vector())
+
+
+# Fields of a product the search vector is built from.
+SEARCH_VECTOR_FIELDS = frozenset(['name', 'brand', 'brand_id', 'company', 'company_id'])
+
+
+@reversion.register(exclude=['gs1_response_hash', 'search_vector'])
+class Product(TrackedFieldsMixin, TimeStampedModel):
+    tracked_fields = ('name', 'brand_id', 'company_id')
 
-@reversion.register
-class Product(TimeStampedModel):
     ilim_queried_at = models.DateTimeField(default=timezone.now, null=False)
     name = models.CharField(max_length=255, null=True, verbose_name="Nazwa")
     code = models.CharField(
@@ -41,6 +68,9 @@ class Product(TimeStampedModel):
     query_count = models.PositiveIntegerField(null=False, default=0, db_index=True)
     ai_pics_count = models.PositiveIntegerField(null=False, default=0)
     gs1_last_response = models.JSONField(null=True)
+    # Hash of gs1_last_response, see pola.logic_produkty_w_sieci.get_gs1_response_hash.
+    gs1_response_hash = models.CharField(max_length=64, null=True, blank=True, editable=False)
+    search_vector = SearchVectorField(null=True, editable=False)
     replacements = models.ManyToManyField(
         'self',
         symmetrical=False,
@@ -66,17 +96,18 @@ class Product(TimeStampedModel):
     def save(self, commit_desc=None, commit_user=None, *args, **kwargs):
         if not commit_desc:
             super().save(*args, **kwargs)
-            return
-
-        with reversion.create_revision(manage_manually=True, atomic=True):
-            super().save(*args, **kwargs)
-            reversion.set_comment(commit_desc)
-            reversion.set_user(commit_user)
-            reversion.add_to_revision(self)
-
-    def increment_query_count(self):
-        with connection.cursor() as cursor:
-            cursor.execute('update product_product set query_count = query_count +1 ' 'where id=%s', [self.id])
+        else:
+            with reversion.create_revision(manage_manually=True, atomic=True):
+                super().save(*args, **kwargs)
+                reversion.set_comment(commit_desc)
+                reversion.set_user(commit_user)
+                reversion.add_to_revision(self)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or SEARCH_VECTOR_FIELDS.intersection(update_fields):
+            # New products without a name, brand and company, e.g. of unknown codes, have nothing to be found by.
+            if self.pop_tracked_changes():
+                # The vector includes names of the brand and the company, so it is built by the database.
+                Product.objects.filter(pk=self.pk).update_search_vectors()
 
     def increment_ai_pics_count(self):
         with connection.cursor() as cursor:
@@ -111,4 +142,7 @@ class Product(TimeStampedModel):
             # ("change_product", "Can edit the product"),
             # ("delete_product", "Can delete the product"),
         )
-        indexes = [BrinIndex(fields=['created'], pages_per_range=16)]
+        indexes = [
+            BrinIndex(fields=['created'], pages_per_range=16),
+            GinIndex(fields=['search_vector'], name='product_search_vector_gin'),
+        ]
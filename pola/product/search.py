@@ -0,0 +1,112 @@
+"""Full-text search of products.
+
+Every product has a ``search_vector`` built from its name (weight A), the names of its brand (weight B) and the
+names of its company (weight C). Texts are folded to lower case ASCII letters, so "zolc" finds "Żółć". There is
+no Polish dictionary in PostgreSQL, so words are not stemmed. Instead, every word of the query matches as a prefix.
+
+The vectors are updated by ``Product.save`` and by the receivers in :mod:`pola.models`. They can be rebuilt with
+the ``rebuild_search_vectors`` command.
+"""
+
+import re
+
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+)
+from django.db.models import (
+    Case,
+    ExpressionWrapper,
+    F,
+    FloatField,
+    Func,
+    OuterRef,
+    Q,
+    Subquery,
+    TextField,
+    Value,
+    When,
+)
+from django.db.models.functions import Cast, Ln
+
+from pola.company.models import Brand, Company
+from pola.text_utils import DIACRITICS, FOLDED_DIACRITICS, fold_diacritics
+
+SEARCH_CONFIG = 'simple'
+
+# How much popular products are preferred: the text rank is multiplied by 1 + weight * ln(1 + query_count).
+QUERY_COUNT_WEIGHT = 0.1
+
+# Exact matches of the code come first.
+CODE_MATCH_RANK = 1000.0
+
+# Order of the results, the pk makes it unique.
+ORDERING = ('-search_rank', 'pk')
+
+_WORD_RE = re.compile(r'[^\W_]+')
+
+
+class FoldDiacritics(Func):
+    """SQL counterpart of :func:`pola.text_utils.fold_diacritics`."""
+
+    template = "lower(translate(%(expressions)s, '" + DIACRITICS + "', '" + FOLDED_DIACRITICS + "'))"
+    output_field = TextField()
+
+
+class ConcatWS(Func):
+    function = 'concat_ws'
+    output_field = TextField()
+
+    def __init__(self, *expressions, separator=' '):
+        super().__init__(Value(separator), *expressions)
+
+
+def get_search_vector():
+    """Return the expression of ``Product.search_vector``, to be used in ``update()``."""
+    # Keep in sync with the backfill in migration product.0024_product_search_vector.
+    brand_names = Brand.objects.filter(pk=OuterRef('brand_id')).values(names=ConcatWS('name', 'common_name'))
+    company_names = Company.objects.filter(pk=OuterRef('company_id')).values(
+        names=ConcatWS('name', 'common_name', 'official_name')
+    )
+    return (
+        SearchVector(FoldDiacritics('name'), config=SEARCH_CONFIG, weight='A')
+        + SearchVector(FoldDiacritics(Subquery(brand_names)), config=SEARCH_CONFIG, weight='B')
+        + SearchVector(FoldDiacritics(Subquery(company_names)), config=SEARCH_CONFIG, weight='C')
+    )
+
+
+def normalize_query(text):
+    """Return the words of ``text`` as the search sees them, separated with single spaces."""
+    return ' '.join(_WORD_RE.findall(fold_diacritics(text)))
+
+
+def get_search_query(text):
+    """Return a query matching products with all words of ``text`` as prefixes, ``None`` if it has no words."""
+    words = _WORD_RE.findall(fold_diacritics(text))
+    if not words:
+        return None
+    return SearchQuery(' & '.join(f'{word}:*' for word in words), config=SEARCH_CONFIG, search_type='raw')
+
+
+def is_code_query(text):
+    return len(text) in (13, 9) and text.isnumeric()
+
+
+def search(queryset, text):
+    """Filter ``queryset`` of products by ``text`` and order by relevance, blended with popularity."""
+    search_query = get_search_query(text)
+    predicate = Q(search_vector=search_query) if search_query else Q(pk__in=[])
+    rank = Value(0.0)
+    if search_query:
+        rank = SearchRank(F('search_vector'), search_query) * (
+            1 + QUERY_COUNT_WEIGHT * Ln(Cast(F('query_count') + 1, FloatField()))
+        )
+    if is_code_query(text):
+        predicate |= Q(code=text)
+        rank = Case(When(code=text, then=Value(CODE_MATCH_RANK)), default=rank)
+    return (
+        queryset.filter(predicate)
+        .annotate(search_rank=ExpressionWrapper(rank, output_field=FloatField()))
+        .order_by(*ORDERING)
+    )
@@ -1,13 +1,18 @@
 import textwrap
+from importlib import import_module
+from unittest import mock
 
+from django.db import connection
 from django.test import override_settings
 from django.urls import reverse, reverse_lazy
+from django.utils import timezone
 from django_webtest import WebTestMixin
 from parameterized import parameterized
 from reversion.models import Version
 from test_plus.test import TestCase
 
 from pola.company.factories import CompanyFactory
+from pola.company.models import Brand, Company
 from pola.product.factories import ProductFactory
 from pola.product.forms import AddBulkProductForm
 from pola.product.models import Product
@@ -172,6 +177,52 @@ class TestProductAutocomplete(PermissionMixin, TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json(), self._get_expected_result([('4', '004 - A4')]))
 
+        response = self.client.get(f"{self.url}?q=00")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            self._get_expected_result([('1', '001 - A1'), ('2', '002 - A2'), ('3', '003 - A3'), ('4', '004 - A4')]),
+        )
+
+    def test_should_find_codes_and_names_containing_text(self):
+        self.login()
+        ProductFactory(id=1, name="Czekolada gorzka", code="5901234123457")
+        ProductFactory(id=2, name="Baton", code="5900000000001")
+
+        response = self.client.get(f"{self.url}?q=1234")
+        self.assertEqual(response.json(), self._get_expected_result([('1', '5901234123457 - Czekolada gorzka')]))
+
+        response = self.client.get(f"{self.url}?q=orzk")
+        self.assertEqual(response.json(), self._get_expected_result([('1', '5901234123457 - Czekolada gorzka')]))
+
+    def test_should_prefer_names_starting_with_text(self):
+        self.login()
+        ProductFactory(id=1, name="Baton", code="001", query_count=1)
+        ProductFactory(id=2, name="Wafel z batonem", code="002", query_count=1)
+        ProductFactory(id=3, name="Mini baton", code="003", query_count=5)
+        ProductFactory(id=4, name="Superbaton", code="004", query_count=100)
+
+        response = self.client.get(f"{self.url}?q=bat")
+        self.assertEqual(
+            response.json(),
+            self._get_expected_result(
+                [('3', '003 - Mini baton'), ('1', '001 - Baton'), ('2', '002 - Wafel z batonem')]
+            ),
+        )
+
+    def test_should_order_by_popularity(self):
+        self.login()
+        company = CompanyFactory(name="Baton SA")
+        ProductFactory(id=1, name="Wafel", code="001", company=company, query_count=50)
+        ProductFactory(id=2, name="Baton", code="002", query_count=1)
+        ProductFactory(id=3, name="Baton mleczny", code="003", query_count=10)
+
+        response = self.client.get(f"{self.url}?q=bat")
+        self.assertEqual(
+            response.json(),
+            self._get_expected_result([('3', '003 - Baton mleczny'), ('2', '002 - Baton'), ('1', '001 - Wafel')]),
+        )
+
     def _get_expected_result(self, elements):
         return {
             'pagination': {'more': False},
@@ -307,3 +358,87 @@ class TestUrls(TestCase):
         self.assertEqual("/cms/product/123/history", reverse('product:view-history', args=[123]))
         self.assertEqual("/cms/product/123/", reverse('product:detail', args=[123]))
         self.assertEqual("/cms/product/", reverse('product:list'))
+
+
+class TestProductSearch(TestCase):
+    def _search(self, text):
+        return list(Product.objects.search(text))
+
+    def test_should_ignore_case_and_diacritics(self):
+        product = ProductFactory(name="Żółta Gęś")
+
+        self.assertEqual([product], self._search("zolta ges"))
+        self.assertEqual([product], self._search("ŻÓŁ"))
+        self.assertEqual([], self._search("zielona"))
+
+    def test_should_find_by_brand_and_company_names(self):
+        product = ProductFactory(name="Baton", brand__name="Wawel", company__common_name="Łakocie")
+
+        self.assertEqual([product], self._search("wawel baton"))
+        self.assertEqual([product], self._search("lakocie"))
+
+    def test_should_rank_name_matches_and_popular_products_first(self):
+        by_brand = ProductFactory(name="Ciastka", brand__name="Baton")
+        rare = ProductFactory(name="Baton", query_count=0)
+        popular = ProductFactory(name="Baton", query_count=1000)
+
+        self.assertEqual([popular, rare, by_brand], self._search("baton"))
+
+    def test_should_put_code_match_first(self):
+        other = ProductFactory(name="Baton")
+        product = ProductFactory(name="Inny", code="5900000000017")
+
+        self.assertEqual([product], self._search("5900000000017"))
+        self.assertEqual([other], self._search("baton"))
+
+    def test_should_return_nothing_for_query_without_words(self):
+        ProductFactory(name="Baton")
+
+        self.assertEqual([], self._search("%&!"))
+
+    def test_should_update_vectors_when_company_is_renamed(self):
+        product = ProductFactory(name="Baton", company__common_name="Stara")
+
+        product.company.common_name = "Nowa"
+        product.company.save()
+
+        self.assertEqual([product], self._search("nowa"))
+        self.assertEqual([], self._search("stara"))
+
+    def test_should_not_update_vectors_when_names_do_not_change(self):
+        product = ProductFactory(name="Baton", company__common_name="Stara", brand__name="Wawel")
+        company = Company.objects.get(pk=product.company_id)
+        brand = Brand.objects.get(pk=product.brand_id)
+        product = Product.objects.get(pk=product.pk)
+
+        with mock.patch('pola.product.models.ProductQuerySet.update_search_vectors') as update_search_vectors:
+            company.description = "Opis"
+            company.save()
+            brand.website_url = "wawel.pl"
+            brand.save()
+            product.ilim_queried_at = timezone.now()
+            product.save()
+            Product.objects.create(code="5900000000024")
+
+        update_search_vectors.assert_not_called()
+
+    def test_should_update_vector_when_product_is_renamed(self):
+        product = Product.objects.get(pk=ProductFactory(name="Baton").pk)
+
+        product.name = "Wafel"
+        product.save()
+
+        self.assertEqual([product], self._search("wafel"))
+
+    def test_should_match_backfill_of_migration(self):
+        migration = import_module('pola.product.migrations.0024_product_search_vector')
+        product = ProductFactory(name="Żółw-1", brand__common_name="Ćma", company__official_name="Łoś S.A.")
+        expected = Product.objects.values_list('search_vector', flat=True).get(pk=product.pk)
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                migration.FILL_SEARCH_VECTOR_SQL,
+                {'from': migration.DIACRITICS, 'to': migration.FOLDED_DIACRITICS},
+            )
+
+        self.assertEqual(expected, Product.objects.values_list('search_vector', flat=True).get(pk=product.pk))
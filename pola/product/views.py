@@ -2,6 +2,7 @@ from braces.views import FormValidMessageMixin, MessageMixin
 from dal import autocomplete
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.db.models import Q
 from django.http import HttpResponse, HttpResponseRedirect
 from django.urls import reverse_lazy
 from django.utils.translation import gettext_lazy as _
@@ -17,11 +18,12 @@ from django_filters.views import FilterView
 from reportlab.graphics import renderPM
 from reversion.models import Version
 
+from pola import suggest
 from pola.concurency import ConcurencyProtectUpdateView
 from pola.mixins import LoginPermissionRequiredMixin
 from pola.product.models import Product
 from pola.report.models import Report
-from pola.views import ExprAutocompleteMixin
+from pola.views import SuggestAutocompleteMixin, order_by_position
 
 from . import filters, models
 from .forms import AddBulkProductForm, ProductForm
@@ -97,7 +99,9 @@ def get_image(request, code):
     return response
 
 
-class ProductAutocomplete(LoginRequiredMixin, ExprAutocompleteMixin, autocomplete.Select2QuerySetView):
+class ProductAutocomplete(LoginRequiredMixin, SuggestAutocompleteMixin, autocomplete.Select2QuerySetView):
+    model = Product
+    suggest_kind = suggest.PRODUCT
     search_expr = [
         'name__icontains',
         'code__icontains',
@@ -105,7 +109,25 @@ class ProductAutocomplete(LoginRequiredMixin, ExprAutocompleteMixin, autocomplet
         'company__official_name__icontains',
         'company__common_name__icontains',
     ]
-    model = Product
+
+    def get_queryset(self):
+        qs = Product.objects.all()
+        if not self.q:
+            return qs
+        if self.q.isdigit():
+            by_prefix = qs.filter(code__startswith=self.q).order_by('code')
+            if by_prefix.exists():
+                return by_prefix
+            return qs.filter(self.get_search_filters())
+        if not suggest.is_ready():
+            return qs.filter(self.get_search_filters())
+        product_ids = self.get_suggested_ids(suggest.PRODUCT)
+        company_ids = self.get_suggested_ids(suggest.COMPANY)
+        if not product_ids and not company_ids:
+            return qs.filter(self.get_search_filters())
+        # Products with a matching name first, then the most popular products of matching companies.
+        ordering = [order_by_position(product_ids)] if product_ids else []
+        return qs.filter(Q(pk__in=product_ids) | Q(company__in=company_ids)).order_by(*ordering, '-query_count', 'pk')
 
     def get_result_label(self, item):
         return f"{item.code} - {item.name}"
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.8 on 2026-10-18 18:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report', '0011_alter_attachment_attachment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='dedup_key',
+            field=models.CharField(editable=False, max_length=64, null=True),
+        ),
+        # Same value as Report.get_dedup_key.
+        migrations.RunSQL(
+            "update report_report set dedup_key = encode(sha256(convert_to("
+            "coalesce(product_id::text, '') || E'\\n' || coalesce(client, '') || E'\\n' || description, 'UTF8'"
+            ")), 'hex')",
+            migrations.RunSQL.noop,
+            elidable=True,
+        ),
+        # Created after the backfill, which is faster without the index.
+        migrations.AlterField(
+            model_name='report',
+            name='dedup_key',
+            field=models.CharField(db_index=True, editable=False, max_length=64, null=True),
+        ),
+    ]
@@ -1,3 +1,4 @@
+import hashlib
 import re
 from pathlib import Path
 
@@ -40,8 +41,22 @@ class Report(TimeStampedModel):
         on_delete=models.CASCADE,
     )
     description = models.TextField(verbose_name=_('Opis'))
+    # Identifies reports with the same product, client and description, see get_dedup_key.
+    dedup_key = models.CharField(max_length=64, null=True, editable=False, db_index=True)
     objects = ReportQuerySet.as_manager()
 
+    @staticmethod
+    def get_dedup_key(product_id, client, description):
+        # Keep in sync with the backfill in migration 0012_report_dedup_key.
+        value = f'{product_id or ""}\n{client or ""}\n{description}'
+        return hashlib.sha256(value.encode()).hexdigest()
+
+    def save(self, *args, **kwargs):
+        self.dedup_key = self.get_dedup_key(self.product_id, self.client, self.description)
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'dedup_key'}
+        super().save(*args, **kwargs)
+
     def status(self):
         if self.resolved_at is not None:
             return self.RESOLVED
@@ -0,0 +1,103 @@
+"""Read-through cache for the scan results returned by :func:`pola.logic.get_result_from_code`.
+
+Every entry is stamped with a generation number. Changes that may affect many results (e.g. an editor
+saving a company or a brand) only bump the generation, which makes all entries stale at once. Changes
+of a single product delete the entries of its code only.
+"""
+
+import itertools
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+# Bump when the structure of the scan result or of the cached entry changes.
+RESULT_CACHE_VERSION = 1
+
+GENERATION_KEY = f'scan_result_v{RESULT_CACHE_VERSION}_generation'
+
+
+def is_enabled():
+    return bool(settings.SCAN_RESULT_CACHE_TIMEOUT)
+
+
+def _make_key(code, multiple_company_supported, report_as_object):
+    return f'scan_result_v{RESULT_CACHE_VERSION}_{code}_{int(multiple_company_supported)}_{int(report_as_object)}'
+
+
+def _init_generation():
+    # A timestamp based value guarantees that a generation evicted from the cache is never reused.
+    cache.add(GENERATION_KEY, time.time_ns(), timeout=None)
+    return cache.get(GENERATION_KEY)
+
+
+def lookup(code, multiple_company_supported, report_as_object):
+    """Return ``(value, generation)``.
+
+    ``value`` is ``None`` on a cache miss. ``generation`` must be passed to :func:`store` so that a value
+    computed while the data was being changed is never considered fresh.
+    """
+    values, generation = lookup_many([code], multiple_company_supported, report_as_object)
+    return values.get(code), generation
+
+
+def lookup_many(codes, multiple_company_supported, report_as_object):
+    """Return ``(values, generation)``, where ``values`` maps codes to fresh cached values.
+
+    Codes missing from ``values`` are cache misses.
+    """
+    keys = {_make_key(code, multiple_company_supported, report_as_object): code for code in codes}
+    entries = cache.get_many([GENERATION_KEY, *keys])
+    generation = entries.pop(GENERATION_KEY, None)
+    if generation is None:
+        return {}, _init_generation()
+    values = {keys[key]: entry['value'] for key, entry in entries.items() if entry['generation'] == generation}
+    return values, generation
+
+
+def store(code, multiple_company_supported, report_as_object, generation, value, timeout=None):
+    store_many({code: value}, multiple_company_supported, report_as_object, generation, timeout=timeout)
+
+
+def store_many(values, multiple_company_supported, report_as_object, generation, timeout=None):
+    """Store ``values``, a mapping of codes to values, computed at ``generation``.
+
+    ``timeout`` defaults to ``SCAN_RESULT_CACHE_TIMEOUT``.
+    """
+    if generation is None or not values:
+        return
+    cache.set_many(
+        {
+            _make_key(code, multiple_company_supported, report_as_object): {'generation': generation, 'value': value}
+            for code, value in values.items()
+        },
+        timeout=timeout or settings.SCAN_RESULT_CACHE_TIMEOUT,
+    )
+
+
+def _delete_codes(codes):
+    keys = [_make_key(code, *flags) for code in codes for flags in itertools.product((False, True), repeat=2)]
+    cache.delete_many(keys)
+
+
+def _bump_generation():
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        _init_generation()
+
+
+def invalidate_codes(codes):
+    codes = [code for code in codes if code]
+    if not codes:
+        return
+    _delete_codes(codes)
+    # Drop the entries again once the change is visible to other transactions, in case a concurrent
+    # request has cached a result computed from the old data in the meantime.
+    transaction.on_commit(lambda: _delete_codes(codes))
+
+
+def invalidate_all():
+    _bump_generation()
+    transaction.on_commit(_bump_generation)
@@ -40,3 +40,12 @@ class SearchResultCollection(TypedDict):
     nextPageToken: Optional[str]
     products: list[SearchResult]
     totalItems: int
+
+
+class Suggestion(TypedDict):
+    text: str
+    type: str
+
+
+class SuggestionCollection(TypedDict):
+    suggestions: list[Suggestion]
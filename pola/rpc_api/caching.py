@@ -0,0 +1,67 @@
+"""HTTP caching of scan results.
+
+The ETag of a scan result is built from the modification times of all objects shown in the result, so it can be
+compared with ``If-None-Match`` without serializing the response. Responses are ``private``: every scan has to reach
+the server, because it is recorded as a ``Query``.
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags, quote_etag
+
+from pola import result_cache
+from pola.company.models import SCAN_CARD_VERSION
+
+
+def _describe(label, obj):
+    return f'{label}:{obj.pk}:{obj.modified.isoformat()}'
+
+
+def _describe_company(company):
+    yield _describe('company', company)
+    # Brands of the company are listed in the result.
+    for brand in sorted(company.brand_set.all(), key=lambda b: b.pk):
+        yield _describe('company_brand', brand)
+
+
+def get_scan_etag(code, product, app_configuration):
+    """Return a strong ETag of the scan result of ``code``."""
+    parts = [
+        f'v{result_cache.RESULT_CACHE_VERSION}.{SCAN_CARD_VERSION}',
+        code,
+        app_configuration.donate_text,
+        app_configuration.donate_url,
+    ]
+    if product is not None:
+        parts.append(_describe('product', product))
+        if product.company:
+            parts.extend(_describe_company(product.company))
+        if product.brand:
+            parts.append(_describe('brand', product.brand))
+            if product.brand.company:
+                parts.extend(_describe_company(product.brand.company))
+        for replacement in sorted(product.replacements.all(), key=lambda r: r.pk):
+            parts.append(_describe('replacement', replacement))
+            if replacement.company:
+                parts.append(_describe('replacement_company', replacement.company))
+            if replacement.brand:
+                parts.append(_describe('replacement_brand', replacement.brand))
+    return quote_etag(hashlib.sha256('\n'.join(parts).encode()).hexdigest())
+
+
+def is_not_modified(request, etag):
+    if_none_match = request.headers.get('If-None-Match')
+    if not if_none_match:
+        return False
+    # If-None-Match uses the weak comparison.
+    etags = [e.removeprefix('W/') for e in parse_etags(if_none_match)]
+    return '*' in etags or etag in etags
+
+
+def patch_scan_response(response, etag):
+    response['ETag'] = etag
+    patch_cache_control(
+        response, private=True, max_age=0, stale_while_revalidate=settings.SCAN_API_STALE_WHILE_REVALIDATE
+    )
@@ -1,9 +1,45 @@
+import json
 from typing import Any
 
-from django.http import JsonResponse
+import orjson
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, JsonResponse
 
+# Dates and times are passed to DjangoJSONEncoder, so they are formatted the same as by JsonResponse.
+ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
 
-class JsonProblemResponse(JsonResponse):
+_django_encoder = DjangoJSONEncoder()
+
+
+def dumps(data):
+    """Serialize ``data`` to JSON with orjson, which is several times faster than the json module.
+
+    The result is the same JSON as of ``json.dumps(data, cls=DjangoJSONEncoder)``, only without whitespace and with
+    non-ASCII characters encoded in UTF-8 instead of escaped. Dataclasses are supported as well.
+    """
+    try:
+        return orjson.dumps(data, default=_django_encoder.default, option=ORJSON_OPTIONS)
+    except orjson.JSONEncodeError:
+        # orjson does not support some values that the json module does, e.g. integers over 64 bits.
+        return json.dumps(data, cls=DjangoJSONEncoder).encode()
+
+
+class JsonDataResponse(JsonResponse):
+    """JSON response serialized with :func:`dumps`.
+
+    It keeps the serialized data, so that it can be validated without parsing the content.
+    """
+
+    def __init__(self, data, safe=True, **kwargs):
+        if safe and not isinstance(data, dict):
+            raise TypeError('In order to allow non-dict objects to be serialized set the safe parameter to False.')
+        kwargs.setdefault('content_type', 'application/json')
+        # JsonResponse.__init__ would serialize the data with the json module.
+        HttpResponse.__init__(self, content=dumps(data), **kwargs)
+        self.data = data
+
+
+class JsonProblemResponse(JsonDataResponse):
     def __init__(
         self,
         title: str,
@@ -1,30 +1,65 @@
 import functools
 import json
 import logging
+import random
+import time
 
+from django.conf import settings
 from django.http import HttpResponse, HttpResponseServerError
 from jsonschema.validators import validator_for
 
+from pola import metrics
+from pola.rpc_api.http import JsonDataResponse
+
 log = logging.getLogger(__file__)
 
 
+def get_sample_rate(view_name):
+    config = settings.JSON_RESPONSE_VALIDATION
+    return config['VIEWS'].get(view_name, config['SAMPLE_RATE'])
+
+
+def get_errors(validator, response):
+    """Return the errors of the content of ``response``.
+
+    The data of :class:`JsonDataResponse` is validated instead of parsing the content. It may differ from the parsed
+    content, e.g. have tuples instead of lists, so the content is parsed after all if the data is invalid.
+    """
+    if isinstance(response, JsonDataResponse) and validator.is_valid(response.data):
+        return []
+    return list(validator.iter_errors(json.loads(response.content)))
+
+
 def validate_json_response(schema, *args, **kwargs):
+    """Validate JSON responses of the view against ``schema``.
+
+    Only a sample of responses is validated, see the ``JSON_RESPONSE_VALIDATION`` setting. Invalid responses are
+    replaced with an error only if all responses are validated, e.g. in tests. Otherwise they are logged and returned.
+    """
     cls = validator_for(schema)
 
     cls.check_schema(schema)
     validator = cls(schema, *args, **kwargs)
 
     def wrapper(func):
+        view_name = func.__name__
+
         @functools.wraps(func)
         def validate_json_schema(*args, **kwargs):
             response: HttpResponse = func(*args, **kwargs)
-            if response['Content-Type'] == 'application/json':
-                errors = list(validator.iter_errors(json.loads(response.content)))
-                if errors:
-                    log.error("Invalid response. %d errors encountered", len(errors))
-                    for error in errors:
-                        log.error("%s", error)
-                        print(error)
+            sample_rate = get_sample_rate(view_name)
+            if response['Content-Type'] != 'application/json' or random.random() >= sample_rate:
+                return response
+
+            start = time.perf_counter()
+            errors = get_errors(validator, response)
+            metrics.observe(f'json_response_validation[{view_name}]', time.perf_counter() - start)
+            if errors:
+                metrics.increment(f'json_response_errors[{view_name}]')
+                log.error("Invalid response. %d errors encountered", len(errors))
+                for error in errors:
+                    log.error("%s", error)
+                if sample_rate >= 1:
                     return HttpResponseServerError("The server generated an invalid response.")
             return response
 
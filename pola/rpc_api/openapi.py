@@ -1,13 +1,42 @@
+"""Validation of API requests and responses against the OpenAPI spec.
+
+openapi-core looks up the spec and builds the schema validators for every request, which takes milliseconds.
+Instead, the validators of every operation are built once, see :class:`CompiledOperation`. openapi-core only runs
+when they find an error or meet something they do not support, so the error responses do not change.
+
+Requests are always validated. Responses are validated with the probability set by the ``OPENAPI_VALIDATION``
+setting, so tests validate all of them and production only a sample.
+"""
+
+import json
+import logging
+import random
+import time
 from collections.abc import Iterable
+from functools import wraps
+from typing import Callable, NamedTuple
 
 import sentry_sdk
+from django.conf import settings
 from django.http import JsonResponse
 from openapi_core.contrib.django.decorators import DjangoOpenAPIViewDecorator
 from openapi_core.contrib.django.handlers import DjangoOpenAPIErrorsHandler
+from openapi_core.validation.schemas import (
+    oas30_read_schema_validators_factory,
+    oas30_write_schema_validators_factory,
+)
 from openapi_core.validation.schemas.exceptions import InvalidSchemaValue
 
+from pola import metrics
 from pola.rpc_api.http import JsonProblemResponse
 
+LOGGER = logging.getLogger(__name__)
+
+HTTP_METHODS = ('get', 'put', 'post', 'delete', 'options', 'head', 'patch', 'trace')
+
+# Name of the endpoint in metrics and settings for requests of paths that are not in the spec.
+UNKNOWN_ENDPOINT = 'unknown'
+
 
 class PolaDjangoOpenAPIErrorsHandler(DjangoOpenAPIErrorsHandler):
 
@@ -40,10 +69,222 @@ class PolaDjangoOpenAPIErrorsHandler(DjangoOpenAPIErrorsHandler):
         )
 
 
-# Build a single decorator object for the entire application.
-openapi_decorator = DjangoOpenAPIViewDecorator()
-# HACK: Workaround for: https://github.com/python-openapi/openapi-core/pull/979
-openapi_decorator.errors_handler_cls = PolaDjangoOpenAPIErrorsHandler
+def _cast_boolean(value):
+    if value.lower() not in ('true', 'false'):
+        raise ValueError(f"{value!r} is not a boolean")
+    return value.lower() == 'true'
+
+
+# Casts a query parameter like openapi-core does, ValueError means that the value is invalid.
+PARAMETER_CASTERS = {
+    'string': str,
+    'integer': int,
+    'number': float,
+    'boolean': _cast_boolean,
+}
+
+
+class Parameter(NamedTuple):
+    name: str
+    required: bool
+    cast: Callable
+    validator: object
+
+
+def _create_validator(factory, schema):
+    """Build the validator of ``schema`` the same way as ``factory`` of openapi-core does for every request."""
+    with schema.resolve() as resolved:
+        return factory.schema_validator_class(
+            resolved.contents, _resolver=resolved.resolver, format_checker=factory.format_checker
+        )
+
+
+def _compile_content(factory, content):
+    """Return the validators of JSON media types of ``content`` by the media type."""
+    validators = {}
+    for mimetype, media_type in content.items():
+        if (mimetype == 'application/json' or mimetype.endswith('+json')) and 'schema' in media_type:
+            validators[mimetype] = _create_validator(factory, media_type / 'schema')
+    return validators
+
+
+def _is_valid_content(validators, content_type, body):
+    mimetype = content_type.split(';')[0].lower().strip()
+    if mimetype not in validators or not body:
+        return False
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return False
+    return validators[mimetype].is_valid(data)
+
+
+class CompiledOperation:
+    """Validators of one operation of the spec, built once.
+
+    :meth:`is_valid_request` and :meth:`is_valid_response` return ``True`` only if openapi-core accepts the request
+    or the response. ``False`` means that it is invalid or that it is not supported here, e.g. parameters in headers,
+    and openapi-core has to tell.
+    """
+
+    def __init__(self, path, path_item, method, spec):
+        operation = path_item / method
+        self.path = path
+        self.method = method
+        self.supports_requests = 'security' not in spec and 'security' not in operation
+
+        parameters = {}
+        for parameter in [*path_item.get('parameters', []), *operation.get('parameters', [])]:
+            parameters[(parameter['in'], parameter['name'])] = parameter
+        self.parameters = []
+        for (location, name), parameter in parameters.items():
+            schema = parameter / 'schema'
+            cast = PARAMETER_CASTERS.get(schema.getkey('type'))
+            if location != 'query' or cast is None:
+                self.supports_requests = False
+                continue
+            self.parameters.append(
+                Parameter(
+                    name=name,
+                    required=parameter.getkey('required', False),
+                    cast=cast,
+                    validator=_create_validator(oas30_write_schema_validators_factory, schema),
+                )
+            )
+
+        self.request_body = None
+        if 'requestBody' in operation:
+            self.request_body = _compile_content(
+                oas30_write_schema_validators_factory, operation / 'requestBody' / 'content'
+            )
+
+        # None stands for a response without content, no validators for one that is not supported.
+        self.responses = {}
+        for status, response in (operation / 'responses').items():
+            if 'headers' in response:
+                self.responses[status] = {}
+            elif 'content' in response:
+                self.responses[status] = _compile_content(oas30_read_schema_validators_factory, response / 'content')
+            else:
+                self.responses[status] = None
+
+    def __repr__(self):
+        return f'<CompiledOperation {self.method.upper()} {self.path}>'
+
+    def is_valid_request(self, request):
+        if not self.supports_requests:
+            return False
+        for parameter in self.parameters:
+            values = request.GET.getlist(parameter.name)
+            if not values:
+                if parameter.required:
+                    return False
+                continue
+            # Empty values are not allowed by default and repeated ones depend on the style of the parameter.
+            if len(values) > 1 or not values[0]:
+                return False
+            try:
+                value = parameter.cast(values[0])
+            except ValueError:
+                return False
+            if not parameter.validator.is_valid(value):
+                return False
+        if self.request_body is not None:
+            return _is_valid_content(self.request_body, request.content_type or '', request.body)
+        return True
+
+    def is_valid_response(self, response):
+        if response.streaming:
+            return False
+        # The same order as in openapi-core: the exact status, the range of statuses and the default.
+        status = str(response.status_code)
+        for key in (status, f'{status[0]}XX', 'default'):
+            if key in self.responses:
+                validators = self.responses[key]
+                break
+        else:
+            return False
+        if validators is None:
+            return True
+        return _is_valid_content(validators, response.get('Content-Type', ''), response.content)
+
+
+def compile_operations(spec):
+    """Return the compiled operations of ``spec`` by the path and the method.
+
+    Paths with templates, e.g. ``/products/{code}``, are left to openapi-core.
+    """
+    operations = {}
+    for path, path_item in (spec / 'paths').items():
+        if '{' in path:
+            continue
+        for method in HTTP_METHODS:
+            if method in path_item:
+                operations[(path, method)] = CompiledOperation(path, path_item, method, spec)
+    return operations
+
+
+def get_response_sample_rate(endpoint):
+    config = settings.OPENAPI_VALIDATION
+    return config['ENDPOINTS'].get(endpoint, config['RESPONSE_SAMPLE_RATE'])
+
+
+class PolaOpenAPIViewDecorator(DjangoOpenAPIViewDecorator):
+    """Validates requests and sampled responses of the view with compiled validators.
+
+    Invalid responses are replaced with errors only if all responses are validated, e.g. in tests. Otherwise they are
+    reported and returned.
+
+    Timings of the validation are recorded in :mod:`pola.metrics` for every endpoint, i.e. path of the spec.
+    """
+
+    errors_handler_cls = PolaDjangoOpenAPIErrorsHandler
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.operations = compile_operations(self.openapi.spec)
+
+    def __call__(self, view_func):
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            operation = self.operations.get((request.path, request.method.lower()))
+            endpoint = operation.path if operation else UNKNOWN_ENDPOINT
+            errors_handler = self.errors_handler_cls()
+
+            start = time.perf_counter()
+            errors = None
+            if operation is None or not operation.is_valid_request(request):
+                errors = self.unmarshal_request(request).errors
+            metrics.observe(f'openapi.request_validation[{endpoint}]', time.perf_counter() - start)
+            if errors:
+                metrics.increment(f'openapi.request_errors[{endpoint}]')
+                return errors_handler(errors)
+
+            response = view_func(request, *args, **kwargs)
+            sample_rate = get_response_sample_rate(endpoint)
+            if not self.should_validate_response() or random.random() >= sample_rate:
+                return response
+
+            start = time.perf_counter()
+            errors = None
+            if operation is None or not operation.is_valid_response(response):
+                errors = self.unmarshal_response(request, response).errors
+            metrics.observe(f'openapi.response_validation[{endpoint}]', time.perf_counter() - start)
+            if errors:
+                metrics.increment(f'openapi.response_errors[{endpoint}]')
+                if sample_rate >= 1:
+                    return errors_handler(errors)
+                # Failing only sampled responses would fail random requests, so the errors are only reported.
+                for error in errors:
+                    LOGGER.warning("Invalid response of %s: %s", endpoint, error)
+                    sentry_sdk.capture_exception(error)
+            return response
+
+        return _wrapped_view
+
+
+# Build a single decorator object for the entire application, it compiles the spec on import of the views.
+openapi_decorator = PolaOpenAPIViewDecorator()
 
 # For backward compatibility
 validate_pola_openapi_spec = openapi_decorator
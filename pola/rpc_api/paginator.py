@@ -1,12 +1,35 @@
+import json
+import operator
+from collections.abc import Sequence
+from functools import reduce
+
 from django.core import signing
 from django.core.paginator import InvalidPage, Page, Paginator
 from django.core.signing import BadSignature
+from django.db.models import Q
 
 
 class InvalidPageToken(InvalidPage):
     pass
 
 
+def _load_page_token(page_token, salt):
+    """Return the message of a page token, or ``None`` if it is empty or not a dict."""
+    if not page_token:
+        return None
+    try:
+        msg = signing.loads(page_token, salt=salt)
+    except BadSignature:
+        raise InvalidPageToken("Invalid page token")
+    return msg if isinstance(msg, dict) else None
+
+
+def estimate_count(queryset):
+    """Return the number of rows of ``queryset`` estimated by the query planner."""
+    plan = json.loads(queryset.order_by().explain(format='json'))
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
 class TokenizedPage(Page):
     def next_page_token(self):
         return signing.dumps({"page_num": self.next_page_number()}, compress=True, salt=self.paginator.token_salt)
@@ -24,12 +47,93 @@ class TokenizedPaginator(Paginator):
         return self.get_page(self._page_token_to_page_num(page_token))
 
     def _page_token_to_page_num(self, page_token):
-        if not page_token:
+        msg = _load_page_token(page_token, self.token_salt)
+        if msg is None:
             return 1
-        try:
-            msg = signing.loads(page_token, salt=self.token_salt)
-            if not isinstance(msg, dict):
-                return 1
-            return msg.get('page_num', 1)
-        except BadSignature:
+        return msg.get('page_num', 1)
+
+
+class KeysetPage(Sequence):
+    def __init__(self, object_list, paginator, next_key):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_key = next_key
+
+    def __repr__(self):
+        return f'<KeysetPage of {len(self)} items>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_key is not None
+
+    def next_page_token(self):
+        return signing.dumps({"after": self.next_key}, compress=True, salt=self.paginator.token_salt)
+
+
+class KeysetPaginator:
+    """Paginates a queryset by the sort key of the last item instead of the page number.
+
+    A page is read with ``WHERE <sort key> > <last key> LIMIT per_page``, so deep pages cost the same as
+    the first one. The last field of ``ordering`` has to be unique, e.g. ``pk``, and all fields have to be
+    non-null attributes of the items (model fields or annotations) with JSON serializable values.
+
+    Tokens of :class:`TokenizedPaginator` with the same salt are still accepted, they are read with OFFSET.
+    """
+
+    def __init__(self, object_list, per_page, *, ordering, token_salt='search', exact_count_limit=1000):
+        self.object_list = object_list.order_by(*ordering)
+        self.per_page = int(per_page)
+        self.ordering = [(field.lstrip('-'), field.startswith('-')) for field in ordering]
+        self.token_salt = token_salt
+        self.exact_count_limit = exact_count_limit
+        self._count = None
+
+    def get_page_by_token(self, page_token=None):
+        msg = _load_page_token(page_token, self.token_salt) or {}
+        queryset = self.object_list
+        if 'after' in msg:
+            queryset = queryset.filter(self._get_after_filter(msg['after']))
+        elif 'page_num' in msg:
+            page_num = msg['page_num']
+            if not isinstance(page_num, int) or page_num < 1:
+                raise InvalidPageToken("Invalid page token")
+            offset = (page_num - 1) * self.per_page
+            queryset = queryset[offset:]
+
+        # One more item tells if there is a next page.
+        object_list = list(queryset[: self.per_page + 1])
+        next_key = None
+        if len(object_list) > self.per_page:
+            object_list = object_list[: self.per_page]
+            next_key = [getattr(object_list[-1], field) for field, _ in self.ordering]
+        elif not msg:
+            # The first page is the last one, so it has all items.
+            self._count = len(object_list)
+        return KeysetPage(object_list, self, next_key)
+
+    @property
+    def count(self):
+        """The number of all items, exact up to ``exact_count_limit`` and estimated above it."""
+        if self._count is None:
+            limit = self.exact_count_limit
+            count = self.object_list.order_by()[: limit + 1].count()
+            if count > limit:
+                count = max(estimate_count(self.object_list), count)
+            self._count = count
+        return self._count
+
+    def _get_after_filter(self, key):
+        if not isinstance(key, list) or len(key) != len(self.ordering):
             raise InvalidPageToken("Invalid page token")
+        # (a, b) > (x, y) is a > x OR (a = x AND b > y), with the comparison reversed for descending fields.
+        conditions = []
+        for i, ((field, descending), value) in enumerate(zip(self.ordering, key)):
+            lookup = f'{field}__lt' if descending else f'{field}__gt'
+            equal = {prefix_field: prefix_value for (prefix_field, _), prefix_value in zip(self.ordering[:i], key)}
+            conditions.append(Q(**equal, **{lookup: value}))
+        return reduce(operator.or_, conditions)
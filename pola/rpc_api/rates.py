@@ -1,11 +1,70 @@
+import functools
+import re
+
 from django.conf import settings
+from django.core.exceptions import PermissionDenied
+
+from pola import metrics
+from pola.integrations.throttling import SlidingWindow
+
+# E.g. "2/s" or "60/30s".
+RATE_RE = re.compile(r'^(\d+)/(\d*)([smhd])$')
+RATE_UNITS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+
+
+class RateLimited(PermissionDenied):
+    pass
+
+
+def is_whitelisted(request):
+    return request.META.get('REMOTE_ADDR') in settings.WHITELIST_API_IP_ADDRESS
+
+
+def parse_rate(rate):
+    """Return the limit and the window in seconds of ``rate``, e.g. ``(60, 30)`` for ``'60/30s'``."""
+    match = RATE_RE.match(rate)
+    if match is None:
+        raise ValueError(f"Invalid rate: {rate}")
+    limit, multiplier, unit = match.groups()
+    return int(limit), int(multiplier or 1) * RATE_UNITS[unit]
+
+
+def get_client_keys(request):
+    keys = [f"ip:{request.META.get('REMOTE_ADDR')}"]
+    device_id = request.GET.get('device_id')
+    if device_id:
+        keys.append(f"device:{device_id}")
+    return keys
+
+
+@functools.cache
+def get_sliding_window(name, limit, window):
+    # method_decorator decorates methods on every call, so the windows are kept here.
+    return SlidingWindow(name, limit=limit, window=window)
+
+
+def rate_limit(rate, cost=1):
+    """Limit requests of every client to ``rate``, e.g. ``'2/s'``, unless its IP address is whitelisted.
+
+    Requests are counted by the IP address and by the ``device_id`` parameter in Redis, so the limit is shared by all
+    processes. ``cost`` is counted for every request, it can be a function of the request, e.g. returning the number
+    of codes looked up at once. Rejected requests raise :class:`RateLimited`, which results in a 403 response.
+    """
+    limit, window = parse_rate(rate)
+
+    def decorator(view_func):
+        name = f'{view_func.__module__}.{view_func.__qualname__}'
+        sliding_window = get_sliding_window(name, limit, window)
 
+        @functools.wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if not is_whitelisted(request):
+                request_cost = cost(request) if callable(cost) else cost
+                if not sliding_window.hit(get_client_keys(request), request_cost):
+                    metrics.increment(f'rate_limit.rejections[{name}]')
+                    raise RateLimited()
+            return view_func(request, *args, **kwargs)
 
-def whitelist(default):
-    def rate(group, request):
-        ip = request.META.get('REMOTE_ADDR')
-        if ip in settings.WHITELIST_API_IP_ADDRESS:
-            return None
-        return default
+        return wrapper
 
-    return rate
+    return decorator
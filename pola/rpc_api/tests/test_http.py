@@ -0,0 +1,74 @@
+import dataclasses
+import datetime
+import decimal
+import json
+import uuid
+
+from django.http import JsonResponse
+from django.test import SimpleTestCase
+from django.utils.translation import gettext_lazy
+
+from pola.rpc_api.api_models import SearchResult, SearchResultCollection
+from pola.rpc_api.http import JsonDataResponse, JsonProblemResponse, dumps
+
+
+@dataclasses.dataclass
+class Donate:
+    show_button: bool
+    title: str
+
+
+class TestDumps(SimpleTestCase):
+    def assert_same_json(self, data):
+        self.assertEqual(json.loads(JsonResponse(data, safe=False).content), json.loads(dumps(data)))
+
+    def test_should_serialize_like_json_response(self):
+        for data in [
+            {'name': 'Żółć', 'altText': None, 'plScore': 70, 'companies': [{'is_friend': True}, ()]},
+            {'created': datetime.datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=datetime.timezone.utc)},
+            {'day': datetime.date(2024, 5, 1), 'time': datetime.time(12, 30)},
+            {'capital': decimal.Decimal('12.50'), 'id': uuid.UUID(int=1), 'text': gettext_lazy('Zgłoś')},
+            {1: 'key is not a string'},
+            {'count': 2**70},
+            SearchResultCollection(
+                nextPageToken=None,
+                products=[SearchResult(name='Pola', code='5900000000000', company=None, brand=None)],
+                totalItems=1,
+            ),
+        ]:
+            with self.subTest(data=repr(data)):
+                self.assert_same_json(data)
+
+    def test_should_not_escape_unicode(self):
+        self.assertEqual('{"name":"Żółć"}'.encode(), dumps({'name': 'Żółć'}))
+
+    def test_should_serialize_dataclasses(self):
+        self.assertEqual(
+            b'{"donate":{"show_button":true,"title":"Wesprzyj"}}', dumps({'donate': Donate(True, 'Wesprzyj')})
+        )
+
+
+class TestJsonDataResponse(SimpleTestCase):
+    def test_should_keep_data(self):
+        data = {'name': 'Pola'}
+
+        response = JsonDataResponse(data, status=201)
+
+        self.assertIs(data, response.data)
+        self.assertEqual(201, response.status_code)
+        self.assertEqual('application/json', response['Content-Type'])
+        self.assertEqual(b'{"name":"Pola"}', response.content)
+
+    def test_should_require_dict(self):
+        with self.assertRaises(TypeError):
+            JsonDataResponse([1])
+        self.assertEqual(b'[1]', JsonDataResponse([1], safe=False).content)
+
+    def test_should_serialize_problem(self):
+        response = JsonProblemResponse(status=400, title="Invalid", detail="Too long", context_data={'field': 'query'})
+
+        self.assertEqual(400, response.status_code)
+        self.assertEqual(
+            {'type': 'about:blank', 'title': 'Invalid', 'detail': 'Too long', 'status': 400, 'field': 'query'},
+            json.loads(response.content),
+        )
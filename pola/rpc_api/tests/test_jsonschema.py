@@ -0,0 +1,79 @@
+from unittest import mock
+
+from django.http import HttpResponse, JsonResponse
+from django.test import SimpleTestCase, override_settings
+
+from pola import metrics
+from pola.rpc_api.http import JsonDataResponse
+from pola.rpc_api.jsonschema import validate_json_response
+
+SCHEMA = {
+    "$schema": "http://json-schema.org/draft-07/schema#",
+    "type": "object",
+    "properties": {"id": {"type": "integer"}, "signed_requests": {"type": "array", "items": {"type": "string"}}},
+    "required": ["id", "signed_requests"],
+}
+
+JSON_RESPONSE_VALIDATION = {'SAMPLE_RATE': 1.0, 'VIEWS': {}}
+
+
+def create_view(response):
+    def view(request):
+        return response
+
+    return validate_json_response(SCHEMA)(view)
+
+
+@override_settings(JSON_RESPONSE_VALIDATION=JSON_RESPONSE_VALIDATION)
+class TestValidateJsonResponse(SimpleTestCase):
+    def setUp(self):
+        metrics.reset()
+
+    def test_should_validate_data_without_parsing_content(self):
+        response = JsonDataResponse({'id': 1, 'signed_requests': ['a']})
+
+        with mock.patch('pola.rpc_api.jsonschema.json.loads') as loads:
+            self.assertIs(response, create_view(response)(None))
+
+        loads.assert_not_called()
+        self.assertEqual(1, metrics.get_metrics()['timings']['json_response_validation[view]']['count'])
+
+    def test_should_reject_invalid_data(self):
+        response = create_view(JsonDataResponse({'id': '1', 'signed_requests': []}))(None)
+
+        self.assertEqual(500, response.status_code)
+        self.assertEqual({'json_response_errors[view]': 1}, metrics.get_metrics()['counters'])
+
+    def test_should_accept_data_valid_after_serialization(self):
+        response = JsonDataResponse({'id': 1, 'signed_requests': ('a', 'b')})
+
+        self.assertIs(response, create_view(response)(None))
+
+    def test_should_parse_content_of_other_responses(self):
+        self.assertEqual(200, create_view(JsonResponse({'id': 1, 'signed_requests': []}))(None).status_code)
+        self.assertEqual(500, create_view(JsonResponse({'id': 1}))(None).status_code)
+
+    def test_should_skip_other_content_types(self):
+        response = HttpResponse('Pola', content_type='text/plain')
+
+        self.assertIs(response, create_view(response)(None))
+
+    def test_should_skip_responses_out_of_sample(self):
+        response = JsonDataResponse({'id': '1'})
+
+        with override_settings(JSON_RESPONSE_VALIDATION={**JSON_RESPONSE_VALIDATION, 'VIEWS': {'view': 0.0}}):
+            self.assertIs(response, create_view(response)(None))
+
+        self.assertEqual({}, metrics.get_metrics()['timings'])
+
+    def test_should_log_invalid_sampled_responses(self):
+        response = JsonDataResponse({'id': '1', 'signed_requests': []})
+
+        with (
+            override_settings(JSON_RESPONSE_VALIDATION={**JSON_RESPONSE_VALIDATION, 'SAMPLE_RATE': 0.01}),
+            mock.patch('pola.rpc_api.jsonschema.random.random', return_value=0.005),
+            self.assertLogs(level='ERROR'),
+        ):
+            self.assertIs(response, create_view(response)(None))
+
+        self.assertEqual({'json_response_errors[view]': 1}, metrics.get_metrics()['counters'])
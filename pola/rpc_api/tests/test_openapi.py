@@ -0,0 +1,142 @@
+import json
+from unittest import mock
+
+from django.http import HttpResponse, JsonResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from pola import metrics
+from pola.rpc_api.openapi import openapi_decorator
+
+OPENAPI_VALIDATION = {'RESPONSE_SAMPLE_RATE': 1.0, 'ENDPOINTS': {}}
+
+SUGGESTIONS = {'suggestions': [{'text': 'Pola', 'type': 'brand'}]}
+
+
+class TestCompiledOperation(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def assert_agrees_with_openapi_core(self, request, response=None):
+        """Compiled validators accept exactly what openapi-core accepts."""
+        if response is None:
+            is_valid = self.get_operation(request).is_valid_request(request)
+            errors = openapi_decorator.unmarshal_request(request).errors
+        else:
+            is_valid = self.get_operation(request).is_valid_response(response)
+            errors = openapi_decorator.unmarshal_response(request, response).errors
+        self.assertEqual(not errors, is_valid, errors)
+        return is_valid
+
+    @staticmethod
+    def get_operation(request):
+        return openapi_decorator.operations[(request.path, request.method.lower())]
+
+    def test_should_accept_valid_request(self):
+        request = self.factory.get('/a/v4/get_by_code', {'code': '5900000000000', 'device_id': 'a', 'noai': 'True'})
+        self.assertTrue(self.assert_agrees_with_openapi_core(request))
+
+    def test_should_reject_invalid_requests(self):
+        for params in [
+            {'device_id': 'a'},
+            {'code': '', 'device_id': 'a'},
+            {'code': '5900000000000', 'device_id': 'a', 'noai': 'maybe'},
+        ]:
+            with self.subTest(params=params):
+                request = self.factory.get('/a/v4/get_by_code', params)
+                self.assertFalse(self.assert_agrees_with_openapi_core(request))
+
+    def test_should_check_length_of_query(self):
+        self.assertTrue(self.assert_agrees_with_openapi_core(self.factory.get('/a/v4/suggest', {'query': 'a' * 255})))
+        self.assertFalse(self.assert_agrees_with_openapi_core(self.factory.get('/a/v4/suggest', {'query': 'a' * 256})))
+
+    def test_should_validate_request_body(self):
+        for body, is_valid in [({'codes': ['5900000000000']}, True), ({}, False), ({'codes': 'x'}, False)]:
+            with self.subTest(body=body):
+                request = self.factory.post(
+                    '/a/v4/get_by_codes?device_id=a', json.dumps(body), content_type='application/json'
+                )
+                self.assertEqual(is_valid, self.assert_agrees_with_openapi_core(request))
+
+    def test_should_validate_response(self):
+        request = self.factory.get('/a/v4/suggest', {'query': 'pol'})
+        for response, is_valid in [
+            (JsonResponse(SUGGESTIONS), True),
+            (JsonResponse({'suggestions': [{'text': 'Pola'}]}), False),
+            (JsonResponse({**SUGGESTIONS, 'extra': 1}), False),
+            (JsonResponse(SUGGESTIONS, status=201), False),
+            (HttpResponse('Pola', content_type='text/plain'), False),
+        ]:
+            with self.subTest(status=response.status_code, content=response.content.decode()):
+                self.assertEqual(is_valid, self.assert_agrees_with_openapi_core(request, response))
+
+    def test_should_accept_response_without_content(self):
+        request = self.factory.get('/a/v4/get_by_code', {'code': '5900000000000', 'device_id': 'a'})
+        self.assertTrue(self.assert_agrees_with_openapi_core(request, HttpResponse(status=304)))
+
+
+@override_settings(OPENAPI_VALIDATION=OPENAPI_VALIDATION)
+class TestPolaOpenAPIViewDecorator(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.request = self.factory.get('/a/v4/suggest', {'query': 'pol'})
+        metrics.reset()
+
+    def test_should_not_call_view_when_request_is_invalid(self):
+        view = mock.Mock(return_value=JsonResponse(SUGGESTIONS))
+
+        response = openapi_decorator(view)(self.factory.get('/a/v4/suggest'))
+
+        self.assertEqual(400, response.status_code)
+        self.assertEqual(['Missing required query parameter: query'], json.loads(response.content)['errors'])
+        view.assert_not_called()
+        self.assertEqual({'openapi.request_errors[/a/v4/suggest]': 1}, metrics.get_metrics()['counters'])
+
+    def test_should_not_run_openapi_core_when_valid(self):
+        view = openapi_decorator(lambda request: JsonResponse(SUGGESTIONS))
+
+        with (
+            mock.patch.object(openapi_decorator, 'unmarshal_request') as unmarshal_request,
+            mock.patch.object(openapi_decorator, 'unmarshal_response') as unmarshal_response,
+        ):
+            response = view(self.request)
+
+        self.assertEqual(200, response.status_code)
+        unmarshal_request.assert_not_called()
+        unmarshal_response.assert_not_called()
+        timings = metrics.get_metrics()['timings']
+        self.assertEqual(1, timings['openapi.request_validation[/a/v4/suggest]']['count'])
+        self.assertEqual(1, timings['openapi.response_validation[/a/v4/suggest]']['count'])
+
+    def test_should_reject_invalid_response(self):
+        view = openapi_decorator(lambda request: JsonResponse({'suggestions': None}))
+
+        response = view(self.request)
+
+        self.assertEqual(400, response.status_code)
+        self.assertEqual('OpenAPI Spec validation failed', json.loads(response.content)['title'])
+        self.assertEqual({'openapi.response_errors[/a/v4/suggest]': 1}, metrics.get_metrics()['counters'])
+
+    def test_should_skip_responses_out_of_sample(self):
+        view = openapi_decorator(lambda request: JsonResponse({'suggestions': None}))
+
+        with override_settings(OPENAPI_VALIDATION={**OPENAPI_VALIDATION, 'ENDPOINTS': {'/a/v4/suggest': 0.0}}):
+            response = view(self.request)
+
+        self.assertEqual(200, response.status_code)
+        self.assertNotIn('openapi.response_validation[/a/v4/suggest]', metrics.get_metrics()['timings'])
+
+    def test_should_report_invalid_sampled_responses(self):
+        view = openapi_decorator(lambda request: JsonResponse({'suggestions': None}))
+
+        with (
+            override_settings(OPENAPI_VALIDATION={**OPENAPI_VALIDATION, 'RESPONSE_SAMPLE_RATE': 0.01}),
+            mock.patch('pola.rpc_api.openapi.random.random', side_effect=[0.5, 0.005]),
+            mock.patch('pola.rpc_api.openapi.sentry_sdk.capture_exception') as capture_exception,
+            self.assertLogs('pola.rpc_api.openapi', 'WARNING'),
+        ):
+            responses = [view(self.request), view(self.request)]
+
+        self.assertEqual([200, 200], [response.status_code for response in responses])
+        self.assertEqual(1, metrics.get_metrics()['timings']['openapi.response_validation[/a/v4/suggest]']['count'])
+        self.assertEqual({'openapi.response_errors[/a/v4/suggest]': 1}, metrics.get_metrics()['counters'])
+        capture_exception.assert_called()
@@ -0,0 +1,77 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from pola.product.factories import ProductFactory
+from pola.product.models import Product
+from pola.rpc_api.paginator import InvalidPageToken, KeysetPaginator
+
+
+class TestKeysetPaginator(TestCase):
+    def setUp(self):
+        self.products = ProductFactory.create_batch(5)
+
+    def get_paginator(self, **kwargs):
+        return KeysetPaginator(Product.objects.all(), 2, ordering=('-query_count', 'pk'), **kwargs)
+
+    def test_should_read_pages_in_order(self):
+        Product.objects.filter(pk=self.products[3].pk).update(query_count=10)
+        paginator = self.get_paginator()
+
+        pages = [paginator.get_page_by_token()]
+        while pages[-1].has_next():
+            pages.append(paginator.get_page_by_token(pages[-1].next_page_token()))
+
+        self.assertEqual([2, 2, 1], [len(page) for page in pages])
+        products = [product for page in pages for product in page]
+        self.assertEqual(list(Product.objects.order_by('-query_count', 'pk')), products)
+        self.assertEqual(self.products[3], products[0])
+
+    def test_should_read_deep_page_with_one_query(self):
+        paginator = self.get_paginator()
+        page_token = paginator.get_page_by_token().next_page_token()
+
+        with self.assertNumQueries(1):
+            page = paginator.get_page_by_token(page_token)
+
+        self.assertEqual(list(Product.objects.order_by('pk')[2:4]), list(page))
+
+    def test_should_count_first_page_without_query(self):
+        paginator = KeysetPaginator(Product.objects.all(), 10, ordering=('pk',))
+
+        with self.assertNumQueries(1):
+            paginator.get_page_by_token()
+            self.assertEqual(5, paginator.count)
+
+    def test_should_count_exactly_up_to_limit(self):
+        paginator = self.get_paginator(exact_count_limit=5)
+        paginator.get_page_by_token()
+
+        with mock.patch('pola.rpc_api.paginator.estimate_count') as estimate_count:
+            self.assertEqual(5, paginator.count)
+        estimate_count.assert_not_called()
+
+    def test_should_estimate_count_above_limit(self):
+        paginator = self.get_paginator(exact_count_limit=3)
+
+        with mock.patch('pola.rpc_api.paginator.estimate_count', return_value=1000):
+            self.assertEqual(1000, paginator.count)
+
+    def test_should_not_estimate_less_than_counted(self):
+        paginator = self.get_paginator(exact_count_limit=3)
+
+        with mock.patch('pola.rpc_api.paginator.estimate_count', return_value=1):
+            self.assertEqual(4, paginator.count)
+
+    def test_should_reject_invalid_token(self):
+        paginator = self.get_paginator()
+
+        with self.assertRaises(InvalidPageToken):
+            paginator.get_page_by_token('invalid')
+
+    def test_should_reject_key_of_other_ordering(self):
+        other_paginator = KeysetPaginator(Product.objects.all(), 2, ordering=('pk',))
+        page_token = other_paginator.get_page_by_token().next_page_token()
+
+        with self.assertRaises(InvalidPageToken):
+            self.get_paginator().get_page_by_token(page_token)
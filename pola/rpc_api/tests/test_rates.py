@@ -0,0 +1,69 @@
+from unittest import mock
+
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from pola import metrics
+from pola.rpc_api.rates import (
+    RateLimited,
+    get_sliding_window,
+    parse_rate,
+    rate_limit,
+)
+
+
+def view(request):
+    return HttpResponse('OK')
+
+
+@override_settings(WHITELIST_API_IP_ADDRESS=['127.0.0.1'])
+class TestRateLimit(SimpleTestCase):
+    def setUp(self):
+        metrics.reset()
+        self.factory = RequestFactory()
+        self.sliding_window = mock.Mock()
+        self.sliding_window.hit.return_value = True
+        patcher = mock.patch('pola.rpc_api.rates.get_sliding_window', return_value=self.sliding_window)
+        self.get_sliding_window = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_should_parse_rate(self):
+        self.assertEqual((2, 1), parse_rate('2/s'))
+        self.assertEqual((60, 30), parse_rate('60/30s'))
+        self.assertEqual((100, 86400), parse_rate('100/d'))
+        with self.assertRaises(ValueError):
+            parse_rate('2 per second')
+
+    def test_should_count_requests_by_ip_and_device(self):
+        request = self.factory.get('/', {'device_id': 'abc'}, REMOTE_ADDR='10.0.0.1')
+
+        self.assertEqual(200, rate_limit('2/s')(view)(request).status_code)
+
+        self.get_sliding_window.assert_called_once_with(f'{__name__}.view', 2, 1)
+        self.sliding_window.hit.assert_called_once_with(['ip:10.0.0.1', 'device:abc'], 1)
+
+    def test_should_count_cost_of_request(self):
+        request = self.factory.get('/', {'codes': '1,2,3'}, REMOTE_ADDR='10.0.0.1')
+
+        rate_limit('60/30s', cost=lambda request: len(request.GET['codes'].split(',')))(view)(request)
+
+        self.sliding_window.hit.assert_called_once_with(['ip:10.0.0.1'], 3)
+
+    def test_should_reject_requests_over_limit(self):
+        self.sliding_window.hit.return_value = False
+
+        with self.assertRaises(RateLimited):
+            rate_limit('2/s')(view)(self.factory.get('/', REMOTE_ADDR='10.0.0.1'))
+
+        self.assertEqual({f'rate_limit.rejections[{__name__}.view]': 1}, metrics.get_metrics()['counters'])
+
+    def test_should_not_limit_whitelisted_addresses(self):
+        self.sliding_window.hit.return_value = False
+
+        self.assertEqual(200, rate_limit('2/s')(view)(self.factory.get('/')).status_code)
+        self.sliding_window.hit.assert_not_called()
+
+
+class TestGetSlidingWindow(SimpleTestCase):
+    def test_should_keep_windows(self):
+        self.assertIs(get_sliding_window('test', 2, 1), get_sliding_window('test', 2, 1))
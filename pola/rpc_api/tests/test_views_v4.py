@@ -1,9 +1,14 @@
 import json
 import os
 import unittest
+from unittest import mock
 
 from django.conf import settings
+from django.core.cache import cache
 from django.core.files.base import ContentFile
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from test_plus import TestCase
 from vcr import VCR
 
@@ -12,11 +17,15 @@ from pola.models import (
     DEFAULT_DONATE_TEXT,
     DEFAULT_DONATE_URL,
     AppConfiguration,
+    Query,
     SearchQuery,
+    SearchQueryStats,
 )
 from pola.product.factories import ProductFactory
 from pola.product.models import Product
+from pola.rpc_api.paginator import TokenizedPaginator
 from pola.rpc_api.tests.test_views import JsonRequestMixin
+from pola.rpc_api.views_v4 import SearchV4ApiView
 from pola.tests.test_utils import get_dummy_image
 
 vcr = VCR(cassette_library_dir=os.path.join(os.path.dirname(__file__), "cassettes"))
@@ -333,6 +342,144 @@ class TestGetByCodeV4(TestCase, JsonRequestMixin):
         )
 
 
+class TestGetByCodeV4Caching(TestCase):
+    url = '/a/v4/get_by_code?device_id=TEST-DEVICE-ID&code=5900049011829'
+
+    def setUp(self):
+        self.company = CompanyFactory(plCapital=100, plWorkers=100, plRnD=100, plRegistered=100, plNotGlobEnt=100)
+        self.product = ProductFactory(code="5900049011829", company=self.company)
+
+    def test_should_return_etag_and_cache_control(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(200, response.status_code, response.content)
+        self.assertRegex(response['ETag'], r'^"[0-9a-f]{64}"$')
+        self.assertEqual('private, max-age=0, stale-while-revalidate=60', response['Cache-Control'])
+        self.assertEqual(response['ETag'], self.client.get(self.url)['ETag'])
+
+    def test_should_return_304_and_record_scan_when_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(304, response.status_code)
+        self.assertEqual(b'', response.content)
+        self.assertEqual(etag, response['ETag'])
+        self.assertEqual("*", response['Access-Control-Allow-Origin'])
+        self.assertEqual(2, Query.objects.filter(product=self.product).count())
+
+    def test_should_accept_weak_etag(self):
+        etag = self.client.get(self.url)['ETag']
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=f'"other", W/{etag}')
+
+        self.assertEqual(304, response.status_code)
+
+    def test_should_change_etag_when_company_changes(self):
+        etag = self.client.get(self.url)['ETag']
+        self.company.description = "NEW"
+        self.company.save()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(200, response.status_code)
+        self.assertNotEqual(etag, response['ETag'])
+        self.assertEqual("NEW", response.json()['companies'][0]['description'])
+
+    def test_should_change_etag_when_brand_is_added(self):
+        etag = self.client.get(self.url)['ETag']
+        BrandFactory(company=self.company)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(200, response.status_code)
+
+    @override_settings(SCAN_RESULT_CACHE_TIMEOUT=60)
+    def test_should_return_304_for_cached_result(self):
+        cache.clear()
+        etag = self.client.get(self.url)['ETag']
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(304, response.status_code)
+
+    def test_should_change_etag_when_donate_text_changes(self):
+        etag = self.client.get(self.url)['ETag']
+        app_config = AppConfiguration.get_singleton()
+        app_config.donate_text = 'TEST-DONATE-TEXT'
+        app_config.save()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(200, response.status_code)
+
+
+class TestGetByCodesV4(TestCase, JsonRequestMixin):
+    url = '/a/v4/get_by_codes?device_id=TEST-DEVICE-ID'
+
+    def test_should_return_results_in_order_of_codes(self):
+        c = CompanyFactory(plCapital=100, plWorkers=100, plRnD=100, plRegistered=100, plNotGlobEnt=100)
+        p1 = ProductFactory(code="5900049011829", company=c)
+        p2 = ProductFactory(code="5900049011836", company=c)
+
+        response = self.json_request(self.url, data={'codes': [p2.code, "123", p1.code]})
+
+        self.assertEqual(200, response.status_code, response.content)
+        products = json.loads(response.content)['products']
+        self.assertEqual([p2.code, "123", p1.code], [p['code'] for p in products])
+        self.assertEqual([p2.pk, None, p1.pk], [p['product_id'] for p in products])
+        self.assertEqual(c.official_name, products[0]['companies'][0]['name'])
+        self.assertEqual(DEFAULT_DONATE_URL, products[1]['donate']['url'])
+
+    def test_should_return_the_same_results_as_get_by_code(self):
+        c = CompanyFactory(plCapital=100, plWorkers=100, plRnD=100, plRegistered=100, plNotGlobEnt=100)
+        p = ProductFactory(code="5900049011829", company=c, brand=BrandFactory(company=c))
+        p.replacements.add(ProductFactory(company=c))
+
+        single = self.json_request(f'/a/v4/get_by_code?device_id=TEST-DEVICE-ID&code={p.code}')
+        batch = self.json_request(self.url, data={'codes': [p.code]})
+
+        self.assertEqual(json.loads(single.content), json.loads(batch.content)['products'][0])
+
+    def test_should_record_all_scans(self):
+        p1 = ProductFactory(code="5900049011829")
+        p2 = ProductFactory(code="5900049011836")
+
+        response = self.json_request(self.url, data={'codes': [p1.code, p2.code, p1.code]})
+
+        self.assertEqual(200, response.status_code, response.content)
+        self.assertEqual(3, len(response.json()['products']))
+        self.assertEqual(
+            [p1.pk, p2.pk], sorted(Query.objects.filter(client='TEST-DEVICE-ID').values_list('product_id', flat=True))
+        )
+
+    def test_should_return_error_when_too_many_codes(self):
+        response = self.json_request(self.url, data={'codes': [str(5900049011829 + i) for i in range(21)]})
+
+        self.assertEqual(400, response.status_code, response.content)
+        self.assertEqual(0, Product.objects.count())
+
+    def test_should_return_error_when_codes_missing(self):
+        response = self.json_request(self.url, data={})
+
+        self.assertEqual(400, response.status_code, response.content)
+
+    def test_should_count_every_code_in_rate_limit(self):
+        with mock.patch('pola.integrations.throttling.SlidingWindow.hit', return_value=True) as hit:
+            self.json_request(self.url, data={'codes': ["123", "456", "789"]}, REMOTE_ADDR='10.0.0.1')
+
+        hit.assert_called_once_with(['ip:10.0.0.1', 'device:TEST-DEVICE-ID'], 3)
+
+    def test_should_reject_requests_over_rate_limit_without_queries(self):
+        with mock.patch('pola.integrations.throttling.SlidingWindow.hit', return_value=False):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.json_request(self.url, data={'codes': ["123"]}, REMOTE_ADDR='10.0.0.1')
+
+        self.assertEqual(403, response.status_code)
+        # Only savepoints of the transaction of the request.
+        self.assertEqual([], [q['sql'] for q in queries if 'SAVEPOINT' not in q['sql']])
+
+
 class TestSearchV4(TestCase):
     url = '/a/v4/search'
 
@@ -599,3 +746,76 @@ class TestSearchV4(TestCase):
         response_data = json.loads(response.content)
         self.assertEqual(1, len(response_data['products']))
         self.assertEqual(11, response_data['totalItems'])
+
+    def test_should_count_searches_without_results(self):
+        ProductFactory(name="baton")
+
+        self.client.get(f"{self.url}?query=Baton", content_type="application/json")
+        self.client.get(f"{self.url}?query=batonik", content_type="application/json")
+
+        self.assertEqual(
+            [('baton', 1, 0), ('batonik', 1, 1)],
+            list(SearchQueryStats.objects.order_by('text').values_list('text', 'count', 'zero_results_count')),
+        )
+
+    def test_should_paginate_by_last_seen_item(self):
+        for query_count in [5, 0, 5, 100, 0, 7, 5, 1, 0, 3, 5, 5, 0, 2, 8, 5, 9, 0, 5, 1, 4, 5, 6, 0, 5]:
+            ProductFactory(name="baton", query_count=query_count)
+        expected = list(Product.objects.search("baton").values_list('code', flat=True))
+
+        codes = []
+        page_token = None
+        while True:
+            url = f"{self.url}?query=baton" + (f"&pageToken={page_token}" if page_token else "")
+            response = self.client.get(url, content_type="application/json")
+            self.assertEqual(200, response.status_code)
+            response_data = json.loads(response.content)
+            self.assertEqual(25, response_data['totalItems'])
+            codes += [product['code'] for product in response_data['products']]
+            page_token = response_data['nextPageToken']
+            if page_token is None:
+                break
+        self.assertEqual(expected, codes)
+
+    def test_should_accept_page_number_tokens(self):
+        ProductFactory.create_batch(11, name="baton")
+        page_token = TokenizedPaginator(range(11), 10, token_salt=SearchV4ApiView.__name__).page(1).next_page_token()
+
+        response = self.client.get(f"{self.url}?query=baton&pageToken={page_token}", content_type="application/json")
+        self.assertEqual(200, response.status_code)
+        response_data = json.loads(response.content)
+        self.assertEqual(1, len(response_data['products']))
+        self.assertIsNone(response_data['nextPageToken'])
+
+    def test_should_return_error_when_page_token_is_invalid(self):
+        response = self.client.get(f"{self.url}?query=baton&pageToken=invalid", content_type="application/json")
+        self.assertEqual(400, response.status_code)
+        self.assertEqual("Invalid value of pageToken parameter", json.loads(response.content)['title'])
+
+
+class TestSuggestV4(TestCase):
+    url = '/a/v4/suggest'
+
+    def test_should_return_error_when_query_is_empty(self):
+        response = self.client.get(f"{self.url}?query=", content_type="application/json")
+        self.assertEqual(400, response.status_code)
+
+    def test_should_suggest_names(self):
+        company = CompanyFactory(name="Ciastkarnia", common_name="", official_name="", query_count=50)
+        ProductFactory(name="Ciastka owsiane", query_count=10, company=company, brand=None)
+        ProductFactory(name="ciastka Owsiane", query_count=5, company=company, brand=None)
+        ProductFactory(name="Herbatniki", query_count=100, company=company, brand=None)
+
+        response = self.client.get(f"{self.url}?query=ciast", content_type="application/json")
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(
+            {
+                'suggestions': [
+                    {'text': 'Ciastkarnia', 'type': 'company'},
+                    {'text': 'Ciastka owsiane', 'type': 'product'},
+                ]
+            },
+            json.loads(response.content),
+        )
+        self.assertEqual("*", response["Access-Control-Allow-Origin"])
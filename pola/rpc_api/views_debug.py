@@ -1,13 +1,12 @@
-from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
-from django_ratelimit.decorators import ratelimit
 
+from pola.rpc_api.http import JsonDataResponse
 from pola.rpc_api.jsonschema import validate_json_response
-from pola.rpc_api.rates import whitelist
+from pola.rpc_api.rates import rate_limit
 
 
 @csrf_exempt
-@ratelimit(key='ip', rate=whitelist('5/s'), block=True)
+@rate_limit('5/s')
 @validate_json_response(
     {
         "$schema": "http://json-schema.org/draft-07/schema#",
@@ -18,4 +17,4 @@ from pola.rpc_api.rates import whitelist
 )
 def raise_exception(request):
     del request
-    return JsonResponse({'invalid': "42"})
+    return JsonDataResponse({'invalid': "42"})
@@ -1,17 +1,17 @@
 import json
 
-from django.http import HttpResponseForbidden, JsonResponse
+from django.http import HttpResponseForbidden
 from django.views.decorators.csrf import csrf_exempt
-from django_ratelimit.decorators import ratelimit
 
 from pola.report.models import Report
+from pola.rpc_api.http import JsonDataResponse
 from pola.rpc_api.jsonschema import validate_json_response
-from pola.rpc_api.rates import whitelist
+from pola.rpc_api.rates import rate_limit
 from pola.rpc_api.views_v3 import attach_file_internal, create_report_internal
 from pola.rpc_api.views_v4 import get_by_code_internal
 
 
-@ratelimit(key='ip', rate=whitelist('2/s'), block=True)
+@rate_limit('2/s')
 @validate_json_response(
     {
         "$schema": "http://json-schema.org/draft-07/schema#",
@@ -73,11 +73,11 @@ from pola.rpc_api.views_v4 import get_by_code_internal
 def get_by_code_v2(request):
     result = get_by_code_internal(request)
 
-    return JsonResponse(result)
+    return JsonDataResponse(result)
 
 
 @csrf_exempt
-@ratelimit(key='ip', rate=whitelist('2/s'), block=True)
+@rate_limit('2/s')
 @validate_json_response(
     {
         "$schema": "http://json-schema.org/draft-07/schema#",
@@ -91,7 +91,7 @@ def create_report_v2(request):
 
 
 @csrf_exempt
-@ratelimit(key='ip', rate=whitelist('2/s'), block=True)
+@rate_limit('2/s')
 @validate_json_response(
     {
         "$schema": "http://json-schema.org/draft-07/schema#",
@@ -115,11 +115,11 @@ def update_report_v2(request):
     report.description = description
     report.save()
 
-    return JsonResponse({'id': report.id})
+    return JsonDataResponse({'id': report.id})
 
 
 @csrf_exempt
-@ratelimit(key='ip', rate=whitelist('2/s'), block=True)
+@rate_limit('2/s')
 @validate_json_response(
     {
         "$schema": "http://json-schema.org/draft-07/schema#",
@@ -143,4 +143,4 @@ def attach_file_v2(request):
 
     signed_request = attach_file_internal(report, file_ext, mime_type)
 
-    return JsonResponse({'signed_request': [signed_request]})
+    return JsonDataResponse({'signed_request': [signed_request]})
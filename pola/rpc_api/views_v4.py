@@ -1,35 +1,68 @@
+import json
+
 from django.core.paginator import InvalidPage
-from django.db.models import Q
-from django.http import JsonResponse
+from django.http import HttpResponseNotModified
 from django.utils.decorators import method_decorator
 from django.views import View
-from django_ratelimit.decorators import ratelimit
+from django.views.decorators.csrf import csrf_exempt
 
-from pola import logic, logic_ai
-from pola.models import AppConfiguration, Query, SearchQuery
+from pola import logic, logic_ai, scan_events, search_events, suggest
+from pola.models import AppConfiguration
+from pola.product import search
 from pola.product.models import Product
-from pola.rpc_api.api_models import SearchResult, SearchResultCollection
-from pola.rpc_api.http import JsonProblemResponse
+from pola.rpc_api.api_models import (
+    SearchResult,
+    SearchResultCollection,
+    Suggestion,
+    SuggestionCollection,
+)
+from pola.rpc_api.caching import (
+    get_scan_etag,
+    is_not_modified,
+    patch_scan_response,
+)
+from pola.rpc_api.http import JsonDataResponse, JsonProblemResponse
 from pola.rpc_api.openapi import validate_pola_openapi_spec
-from pola.rpc_api.paginator import TokenizedPaginator
-from pola.rpc_api.rates import whitelist
+from pola.rpc_api.paginator import KeysetPaginator
+from pola.rpc_api.rates import rate_limit
 
 
-@ratelimit(key='ip', rate=whitelist('2/s'), block=True)
+@rate_limit('2/s')
 @validate_pola_openapi_spec
 def get_by_code_v4(request):
     noai = request.GET.get('noai')
-    result = get_by_code_internal(
-        request, ai_supported=noai is None, multiple_company_supported=True, report_as_object=True
-    )
-
-    response = JsonResponse(result)
+    result, product = get_scan(request, multiple_company_supported=True, report_as_object=True)
+
+    app_configuration = AppConfiguration.get_cached()
+    etag = get_scan_etag(request.GET['code'], product, app_configuration)
+    if is_not_modified(request, etag):
+        # The scan is recorded anyway, the client only does not need the result again.
+        response = HttpResponseNotModified()
+    else:
+        if noai is None:
+            result = logic_ai.add_ask_for_pics(product, result)
+        add_donate(result, app_configuration)
+        response = JsonDataResponse(result)
+    patch_scan_response(response, etag)
     response["Access-Control-Allow-Origin"] = "*"
 
     return response
 
 
 def get_by_code_internal(request, ai_supported=False, multiple_company_supported=False, report_as_object=False):
+    result, product = get_scan(
+        request, multiple_company_supported=multiple_company_supported, report_as_object=report_as_object
+    )
+
+    if ai_supported:
+        result = logic_ai.add_ask_for_pics(product, result)
+
+    add_donate(result, AppConfiguration.get_cached())
+    return result
+
+
+def get_scan(request, multiple_company_supported=False, report_as_object=False):
+    """Look up the scanned code and record the scan. Returns the scan result and the product."""
     code = request.GET['code']
     device_id = request.GET['device_id']
 
@@ -38,49 +71,77 @@ def get_by_code_internal(request, ai_supported=False, multiple_company_supported
     )
 
     if product is not None:
-        Query.objects.create(
-            client=device_id,
-            product=product,
-            was_verified=stats['was_verified'],
-            was_590=stats['was_590'],
-            was_plScore=stats['was_plScore'],
-        )
+        scan_events.record_scan(client=device_id, product=product, stats=stats)
 
-    if product:
-        product.increment_query_count()
-        if product.company:
-            product.company.increment_query_count()
+    return result, product
 
-    if ai_supported:
-        result = logic_ai.add_ask_for_pics(product, result)
 
-    app_configuration = AppConfiguration.get_singleton()
+def count_codes(request):
+    try:
+        return max(1, len(json.loads(request.body)['codes']))
+    except (ValueError, KeyError, TypeError):
+        # Invalid requests are rejected by the validation of the OpenAPI spec.
+        return 1
+
+
+# Every code costs as much as a request to get_by_code_v4, with bursts of a few full baskets.
+@csrf_exempt
+@rate_limit('60/30s', cost=count_codes)
+@validate_pola_openapi_spec
+def get_by_codes_v4(request):
+    device_id = request.GET['device_id']
+    noai = request.GET.get('noai')
+    codes = json.loads(request.body)['codes']
+
+    results = logic.get_results_from_codes(codes, multiple_company_supported=True, report_as_object=True)
+
+    scan_events.record_scans(
+        client=device_id,
+        scans=[(product, stats) for _, stats, product in results.values() if product is not None],
+    )
+
+    app_configuration = AppConfiguration.get_cached()
+    products = []
+    for code in codes:
+        result, _, product = results[code]
+        result = result.copy()
+        if noai is None:
+            result = logic_ai.add_ask_for_pics(product, result)
+        add_donate(result, app_configuration)
+        products.append(result)
+
+    response = JsonDataResponse({'products': products})
+    response["Access-Control-Allow-Origin"] = "*"
+
+    return response
+
+
+def add_donate(result, app_configuration):
     result["donate"] = {
         "show_button": True,
         "title": app_configuration.donate_text,
         "url": app_configuration.donate_url,
     }
-    return result
 
 
 class SearchV4ApiView(View):
     PAGE_SIZE = 10
 
-    @method_decorator(ratelimit(key='ip', rate=whitelist('2/s'), block=True))
+    @method_decorator(rate_limit('2/s'))
     @method_decorator(validate_pola_openapi_spec)
     def get(self, request):
         query = request.GET['query']
         qs = self.get_queryset(query)
-        paginator = TokenizedPaginator(qs.all(), self.PAGE_SIZE, token_salt=self.__class__.__name__)
+        paginator = KeysetPaginator(qs, self.PAGE_SIZE, ordering=search.ORDERING, token_salt=self.__class__.__name__)
         page_token = request.GET.get('pageToken')
-        if page_token is None:
-            SearchQuery(client=request.GET.get('device_id'), text=query).save()
         try:
             page = paginator.get_page_by_token(page_token)
         except InvalidPage as e:
             return JsonProblemResponse(status=400, title="Invalid value of pageToken parameter", detail=str(e))
+        if page_token is None:
+            search_events.record_search(client=request.GET.get('device_id'), text=query, result_count=paginator.count)
 
-        return JsonResponse(
+        return JsonDataResponse(
             SearchResultCollection(
                 nextPageToken=page.next_page_token() if page.has_next() else None,
                 products=[SearchResult.create_from_product(p) for p in page],
@@ -89,8 +150,21 @@ class SearchV4ApiView(View):
         )
 
     def get_queryset(self, query):
-        pred = Q(name__icontains=query)
-        if len(query) in (13, 9) and query.isnumeric():
-            pred = pred | Q(code=query)
-        qs = Product.objects.filter(pred).order_by('pk')
-        return qs
+        return Product.objects.search(query).select_related('company', 'brand')
+
+
+SUGGEST_LIMIT = 10
+
+
+# Suggestions are requested while typing, so more often than searches.
+@rate_limit('10/s')
+@validate_pola_openapi_spec
+def suggest_v4(request):
+    suggestions = suggest.suggest(request.GET['query'], limit=SUGGEST_LIMIT, unique_texts=True)
+    response = JsonDataResponse(
+        SuggestionCollection(
+            suggestions=[Suggestion(text=suggestion.text, type=suggestion.kind) for suggestion in suggestions]
+        )
+    )
+    response["Access-Control-Allow-Origin"] = "*"
+    return response
@@ -10,6 +10,13 @@ redis_url = os.getenv('REDISTOGO_URL', 'redis://localhost:6379')
 conn = redis.from_url(redis_url)
 
 if __name__ == '__main__':
+    # Some jobs (e.g. writing buffered scan events) use the Django ORM.
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "pola.config.settings.production")
+    import django
+
+    django.setup()
+
     with Connection(conn):
         worker = Worker(map(Queue, listen))
-        worker.work()
+        # The scheduler runs jobs enqueued with ``enqueue_in``, e.g. periodic flushes of scan events.
+        worker.work(with_scheduler=True)
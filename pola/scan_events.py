@@ -0,0 +1,280 @@
+"""Buffered recording of product scans.
+
+Every scan creates a ``Query`` row and increments ``query_count`` of the scanned product and its company.
+To keep the scan API free of writes, scan events are pushed to a buffer and written in batches: all
+``Query`` rows of a batch are inserted with a single ``bulk_create`` and query counts are incremented with one
+statement per counter (see :mod:`pola.counters`).
+
+The buffer is selected with ``SCAN_EVENTS['BACKEND']``:
+
+* ``sync`` - events are written immediately, in the transaction of the request,
+* ``memory`` - events are kept in the memory of the process and written by a background thread,
+* ``redis`` - events are pushed to a Redis list, which is drained by the RQ worker.
+"""
+
+import atexit
+import functools
+import json
+import logging
+import os
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Optional, TypedDict
+
+from django.conf import settings
+from django.db import DataError, IntegrityError, connections, transaction
+from django.utils import timezone
+from rq import Queue
+
+from pola import counters
+from pola.company.models import Company
+from pola.models import Query
+from pola.product.models import Product
+from pola.rq_worker import conn
+
+LOGGER = logging.getLogger(__name__)
+
+REDIS_LIST_KEY = 'pola:scan_events'
+REDIS_FLUSH_SCHEDULED_KEY = 'pola:scan_events:flush_scheduled'
+
+# Device IDs are not limited by the API, longer ones are truncated to fit the column.
+CLIENT_MAX_LENGTH = Query._meta.get_field('client').max_length
+
+
+class ScanEvent(TypedDict):
+    client: Optional[str]
+    product_id: int
+    company_id: Optional[int]
+    was_verified: bool
+    was_590: bool
+    was_plScore: bool
+    timestamp: str
+
+
+def create_scan_event(client, product, stats) -> ScanEvent:
+    return ScanEvent(
+        client=client[:CLIENT_MAX_LENGTH] if client else client,
+        product_id=product.pk,
+        company_id=product.company_id,
+        was_verified=stats['was_verified'],
+        was_590=stats['was_590'],
+        was_plScore=stats['was_plScore'],
+        timestamp=timezone.now().isoformat(),
+    )
+
+
+def write_scan_events(events: list[ScanEvent]):
+    """Write a batch of scan events to the database."""
+    # A product might have been deleted after it was scanned. Skip such events instead of failing the whole batch.
+    existing_ids = set(
+        Product.objects.filter(pk__in={event['product_id'] for event in events}).values_list('pk', flat=True)
+    )
+    valid_events = [event for event in events if event['product_id'] in existing_ids]
+    if len(valid_events) != len(events):
+        LOGGER.warning("Skipped %d scan events of deleted products", len(events) - len(valid_events))
+    if not valid_events:
+        return
+    with transaction.atomic():
+        Query.objects.bulk_create(
+            Query(
+                client=event['client'],
+                product_id=event['product_id'],
+                was_verified=event['was_verified'],
+                was_590=event['was_590'],
+                was_plScore=event['was_plScore'],
+                timestamp=datetime.fromisoformat(event['timestamp']),
+            )
+            for event in valid_events
+        )
+        counters.increment(Product, Counter(event['product_id'] for event in valid_events))
+        counters.increment(Company, Counter(event['company_id'] for event in valid_events if event['company_id']))
+
+
+class BaseScanEventBuffer:
+    """Buffer of scan events. Subclasses for other kinds of events override ``name`` and ``write``."""
+
+    name = 'scan events'
+
+    def write(self, events):
+        write_scan_events(events)
+
+    def push(self, event: ScanEvent):
+        self.push_many([event])
+
+    def push_many(self, events: list[ScanEvent]):
+        raise NotImplementedError('subclasses of BaseScanEventBuffer must provide a push_many(events) method')
+
+    def flush(self):
+        """Write all buffered events. Returns the number of written events."""
+        return 0
+
+    def write_valid(self, events):
+        """Write ``events``, dropping those that can never be written. Returns the number of written events.
+
+        A batch rejected by the database is split, so that only invalid events are dropped. Other errors, e.g. of the
+        connection, are raised and the buffer keeps the events to write them again.
+        """
+        try:
+            self.write(events)
+        except (DataError, IntegrityError):
+            if len(events) == 1:
+                LOGGER.exception("Dropped invalid %s: %r", self.name, events)
+                return 0
+            middle = len(events) // 2
+            return self.write_valid(events[:middle]) + self.write_valid(events[middle:])
+        return len(events)
+
+
+class SyncScanEventBuffer(BaseScanEventBuffer):
+    def push_many(self, events: list[ScanEvent]):
+        self.write(events)
+
+
+class MemoryScanEventBuffer(BaseScanEventBuffer):
+    def __init__(self, flush_size, flush_interval):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._events = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._worker = None
+        self._worker_pid = None
+        atexit.register(self._flush_at_exit)
+
+    def push_many(self, events: list[ScanEvent]):
+        # The events may refer to products created by the current request, so they can be written only
+        # once the request is committed.
+        transaction.on_commit(functools.partial(self._append, events))
+
+    def _append(self, events: list[ScanEvent]):
+        with self._lock:
+            self._events.extend(events)
+            size = len(self._events)
+        self._ensure_worker()
+        if size >= self.flush_size:
+            self._wakeup.set()
+
+    def _ensure_worker(self):
+        # Threads do not survive a fork, so every worker process of the web server starts its own thread.
+        if self._worker is not None and self._worker_pid == os.getpid() and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is not None and self._worker_pid == os.getpid() and self._worker.is_alive():
+                return
+            self._worker_pid = os.getpid()
+            thread_name = self.name.replace(' ', '-') + '-flush'
+            self._worker = threading.Thread(target=self._run, name=thread_name, daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(timeout=self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                LOGGER.exception("Failed to write %s", self.name)
+            finally:
+                connections.close_all()
+
+    def _flush_at_exit(self):
+        if not self._events:
+            return
+        try:
+            self.flush()
+        except Exception:
+            LOGGER.exception("Failed to write %d %s at exit", len(self._events), self.name)
+
+    def flush(self):
+        written = 0
+        while True:
+            with self._lock:
+                events, self._events = self._events[: self.flush_size], self._events[self.flush_size :]
+            if not events:
+                return written
+            try:
+                written += self.write_valid(events)
+            except Exception:
+                with self._lock:
+                    self._events[:0] = events
+                raise
+
+
+class RedisScanEventBuffer(BaseScanEventBuffer):
+    list_key = REDIS_LIST_KEY
+    flush_scheduled_key = REDIS_FLUSH_SCHEDULED_KEY
+    # Function of the RQ job writing the events
+    flush_job = 'pola.scan_events.flush_scan_events'
+
+    def __init__(self, flush_size, flush_interval, connection=conn):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.connection = connection
+
+    def push_many(self, events: list[ScanEvent]):
+        transaction.on_commit(functools.partial(self._append, events))
+
+    def _append(self, events: list[ScanEvent]):
+        size = self.connection.rpush(self.list_key, *(json.dumps(event) for event in events))
+        queue = Queue(connection=self.connection)
+        # Flush whenever the list grows past another multiple of the batch size.
+        if size // self.flush_size > (size - len(events)) // self.flush_size:
+            queue.enqueue(self.flush_job)
+        elif self.connection.set(self.flush_scheduled_key, 1, nx=True, ex=self.flush_interval):
+            queue.enqueue_in(timedelta(seconds=self.flush_interval), self.flush_job)
+
+    def flush(self):
+        written = 0
+        while True:
+            with self.connection.pipeline() as pipe:
+                pipe.lrange(self.list_key, 0, self.flush_size - 1)
+                pipe.ltrim(self.list_key, self.flush_size, -1)
+                raw_events, _ = pipe.execute()
+            if not raw_events:
+                self.connection.delete(self.flush_scheduled_key)
+                return written
+            events = [json.loads(raw_event) for raw_event in raw_events]
+            try:
+                written += self.write_valid(events)
+            except Exception:
+                self.connection.lpush(self.list_key, *reversed(raw_events))
+                raise
+
+
+BACKENDS = {
+    'sync': SyncScanEventBuffer,
+    'memory': MemoryScanEventBuffer,
+    'redis': RedisScanEventBuffer,
+}
+
+
+@functools.cache
+def _create_buffer(backend, flush_size, flush_interval):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown scan events backend: {backend}")
+    buffer_cls = BACKENDS[backend]
+    if buffer_cls is SyncScanEventBuffer:
+        return buffer_cls()
+    return buffer_cls(flush_size=flush_size, flush_interval=flush_interval)
+
+
+def get_buffer() -> BaseScanEventBuffer:
+    config = settings.SCAN_EVENTS
+    return _create_buffer(config['BACKEND'], config['FLUSH_SIZE'], config['FLUSH_INTERVAL'])
+
+
+def record_scan(client, product, stats):
+    get_buffer().push(create_scan_event(client, product, stats))
+
+
+def record_scans(client, scans):
+    """Record scans of many products at once. ``scans`` is an iterable of ``(product, stats)`` pairs."""
+    events = [create_scan_event(client, product, stats) for product, stats in scans]
+    if events:
+        get_buffer().push_many(events)
+
+
+def flush_scan_events():
+    """Write all buffered events. Used by the RQ worker and the ``flush_scan_events`` command."""
+    return get_buffer().flush()
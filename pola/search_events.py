@@ -0,0 +1,141 @@
+"""Buffered recording of searches.
+
+Every search creates a ``SearchQuery`` row and increments the ``SearchQueryStats`` of its normalized text
+and day, so the most common searches (and searches without results) can be read without scanning the
+``SearchQuery`` table. Search events go through the same buffers as scan events (see :mod:`pola.scan_events`),
+selected with ``SEARCH_EVENTS['BACKEND']``.
+"""
+
+import functools
+from collections import Counter
+from datetime import datetime
+from typing import Optional, TypedDict
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from pola.models import SearchQuery, SearchQueryStats
+from pola.product.search import normalize_query
+from pola.scan_events import (
+    BaseScanEventBuffer,
+    MemoryScanEventBuffer,
+    RedisScanEventBuffer,
+    SyncScanEventBuffer,
+)
+
+# Device IDs and texts are not limited by the API, longer ones are truncated to fit the columns.
+CLIENT_MAX_LENGTH = SearchQuery._meta.get_field('client').max_length
+TEXT_MAX_LENGTH = SearchQuery._meta.get_field('text').max_length
+STATS_TEXT_MAX_LENGTH = SearchQueryStats._meta.get_field('text').max_length
+
+
+class SearchEvent(TypedDict):
+    client: Optional[str]
+    text: str
+    result_count: int
+    timestamp: str
+
+
+def create_search_event(client, text, result_count) -> SearchEvent:
+    return SearchEvent(
+        client=client[:CLIENT_MAX_LENGTH] if client else client,
+        text=text[:TEXT_MAX_LENGTH],
+        result_count=result_count,
+        timestamp=timezone.now().isoformat(),
+    )
+
+
+def write_search_events(events: list[SearchEvent]):
+    """Write a batch of search events to the database."""
+    with transaction.atomic():
+        SearchQuery.objects.bulk_create(
+            SearchQuery(
+                client=event['client'], text=event['text'], timestamp=datetime.fromisoformat(event['timestamp'])
+            )
+            for event in events
+        )
+        update_search_query_stats(events)
+
+
+def update_search_query_stats(events: list[SearchEvent]):
+    counts = Counter()
+    zero_results_counts = Counter()
+    for event in events:
+        text = normalize_query(event['text'])[:STATS_TEXT_MAX_LENGTH]
+        # Texts without words, e.g. "!!!", are not searched for.
+        if not text:
+            continue
+        key = (text, timezone.localdate(datetime.fromisoformat(event['timestamp'])))
+        counts[key] += 1
+        zero_results_counts[key] += event['result_count'] == 0
+    if not counts:
+        return
+    # Sorted keys keep the lock order stable and prevent deadlocks between concurrent writers.
+    keys = sorted(counts)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'insert into pola_searchquerystats (text, day, count, zero_results_count) '
+            'select * from unnest(%s::varchar[], %s::date[], %s::integer[], %s::integer[]) '
+            'on conflict (day, text) do update set '
+            'count = pola_searchquerystats.count + excluded.count, '
+            'zero_results_count = pola_searchquerystats.zero_results_count + excluded.zero_results_count',
+            [
+                [text for text, _ in keys],
+                [day for _, day in keys],
+                [counts[key] for key in keys],
+                [zero_results_counts[key] for key in keys],
+            ],
+        )
+
+
+class SearchEventBufferMixin:
+    name = 'search events'
+
+    def write(self, events):
+        write_search_events(events)
+
+
+class SyncSearchEventBuffer(SearchEventBufferMixin, SyncScanEventBuffer):
+    pass
+
+
+class MemorySearchEventBuffer(SearchEventBufferMixin, MemoryScanEventBuffer):
+    pass
+
+
+class RedisSearchEventBuffer(SearchEventBufferMixin, RedisScanEventBuffer):
+    list_key = 'pola:search_events'
+    flush_scheduled_key = 'pola:search_events:flush_scheduled'
+    flush_job = 'pola.search_events.flush_search_events'
+
+
+BACKENDS = {
+    'sync': SyncSearchEventBuffer,
+    'memory': MemorySearchEventBuffer,
+    'redis': RedisSearchEventBuffer,
+}
+
+
+@functools.cache
+def _create_buffer(backend, flush_size, flush_interval):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown search events backend: {backend}")
+    buffer_cls = BACKENDS[backend]
+    if buffer_cls is SyncSearchEventBuffer:
+        return buffer_cls()
+    return buffer_cls(flush_size=flush_size, flush_interval=flush_interval)
+
+
+def get_buffer() -> BaseScanEventBuffer:
+    config = settings.SEARCH_EVENTS
+    return _create_buffer(config['BACKEND'], config['FLUSH_SIZE'], config['FLUSH_INTERVAL'])
+
+
+def record_search(client, text, result_count):
+    get_buffer().push(create_search_event(client, text, result_count))
+
+
+def flush_search_events():
+    """Write all buffered events. Used by the RQ worker and the ``flush_search_events`` command."""
+    return get_buffer().flush()
@@ -4,6 +4,7 @@ from unittest import mock
 
 from faker import Faker
 from parameterized import parameterized
+from urllib3.util.retry import Retry
 from vcr import VCR
 
 from pola.social.forms import SubscribeNewsletterForm
@@ -31,8 +32,7 @@ class TestSubscribeNewsletterForm(unittest.TestCase):
         self.assertTrue(form.is_valid())
         form.save()
 
-    @vcr.use_cassette('get_response_create_contact_server_error.yaml', filter_headers=['X-Auth-Token'])
-    @mock.patch('pola.integrations.get_response.sleep')
+    @mock.patch.object(Retry, 'sleep')
     def test_form_server_error(self, mock_sleep):
         form = SubscribeNewsletterForm(
             data={
@@ -41,10 +41,14 @@ class TestSubscribeNewsletterForm(unittest.TestCase):
             }
         )
         self.assertTrue(form.is_valid())
-        form.save()
+        with vcr.use_cassette(
+            'get_response_create_contact_server_error.yaml', filter_headers=['X-Auth-Token']
+        ) as cassette:
+            form.save()
 
-        self.assertEqual(len(mock_sleep.mock_calls), 5)
-        self.assertLess(sum(d.args[0] for d in mock_sleep.mock_calls), 20)
+        # The contact might have been created, so the request is not retried.
+        self.assertEqual(1, cassette.play_count)
+        mock_sleep.assert_not_called()
 
     def test_form_invalid_email(self):
         form = SubscribeNewsletterForm(
@@ -60,7 +64,7 @@ class TestSubscribeNewsletterForm(unittest.TestCase):
         )
 
     @vcr.use_cassette('get_response_create_contact_duplicate_email.yaml', filter_headers=['X-Auth-Token'])
-    @mock.patch('pola.integrations.get_response.sleep')
+    @mock.patch.object(Retry, 'sleep')
     def test_form_duplicate_email(self, mock_sleep):
         for _ in range(2):
             form = SubscribeNewsletterForm(
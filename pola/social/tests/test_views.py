@@ -4,6 +4,7 @@ from unittest import mock
 
 from django.urls import reverse_lazy
 from test_plus.test import TestCase
+from urllib3.util.retry import Retry
 from vcr import VCR
 
 vcr = VCR(cassette_library_dir=os.path.join(os.path.dirname(__file__), 'cassettes'))
@@ -35,7 +36,7 @@ class TestSubscribeNewsletterFormView(TestCase):
         )
 
     @vcr.use_cassette('get_response_create_contact_invalid_email.yaml', filter_headers=['X-Auth-Token'])
-    @mock.patch('pola.integrations.get_response.sleep')
+    @mock.patch.object(Retry, 'sleep')
     def test_form_valid_unable_to_save(self, mock_sleep):
         response = self.client.post(
             self.url, data=json.dumps({'contact_email': 'A@example.org'}), content_type='application/json'
@@ -4,15 +4,14 @@ from django.http import HttpResponse
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 from django.views.generic.edit import BaseFormView
-from django_ratelimit.decorators import ratelimit
 
 from pola.rpc_api.http import JsonProblemResponse
 from pola.rpc_api.openapi import validate_pola_openapi_spec
-from pola.rpc_api.rates import whitelist
+from pola.rpc_api.rates import rate_limit
 from pola.social.forms import SubscribeNewsletterForm
 
 
-@method_decorator(ratelimit(key='ip', rate=whitelist('2/s'), block=True), name='dispatch')
+@method_decorator(rate_limit('2/s'), name='dispatch')
 @method_decorator(validate_pola_openapi_spec, name='dispatch')
 @method_decorator(csrf_exempt, name='dispatch')
 class SubscribeNewsletterFormView(BaseFormView):
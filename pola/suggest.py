@@ -0,0 +1,456 @@
+"""Prefix suggestions of product, brand and company names.
+
+Every process keeps a :class:`SuggestIndex` in memory: names normalized like the search does (see
+:func:`pola.product.search.normalize_query`), sorted, with a segment tree of their weights. The names matching a
+prefix are a continuous range of the index, and the heaviest of them are read from the tree without visiting the
+whole range. Names are indexed from every word among the first ``MAX_KEY_WORDS``, so "gorz" suggests
+"Czekolada gorzka". Products weigh their ``query_count``, companies too, and brands the sum of their products.
+
+The index is immutable. Changes are kept in a small overlay instead:
+
+* the receivers in :mod:`pola.models` add saved and deleted objects of this process and publish them in
+  a log in the shared cache,
+* every ``SYNC_INTERVAL`` seconds objects published by other processes are read from the database,
+* every ``REBUILD_INTERVAL`` seconds, or when the overlay grows past ``MAX_CHANGES``, the index is rebuilt in
+  a background thread. The previous index serves suggestions until the new one is ready, the first one is
+  built after the first suggestion is requested.
+
+Query counts change without saves, so new weights are visible after the rebuild.
+"""
+
+import heapq
+import logging
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from collections.abc import Iterable, Sequence
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Sum
+from redis.exceptions import RedisError
+
+from pola.company.models import Brand, Company
+from pola.product.models import Product
+from pola.product.search import normalize_query
+
+LOGGER = logging.getLogger(__name__)
+
+PRODUCT = 'product'
+BRAND = 'brand'
+COMPANY = 'company'
+KINDS = (PRODUCT, BRAND, COMPANY)
+
+# Names are suggested from any of their first words.
+MAX_KEY_WORDS = 3
+
+CHANGES_KEY = 'pola:suggest:changes'
+
+# Greater than any byte of UTF-8, so that keys starting with a prefix sort before prefix + MAX_BYTE.
+MAX_BYTE = b'\xff'
+
+
+class Suggestion(NamedTuple):
+    kind: str
+    object_id: int
+    text: str
+    weight: int
+    # All names of the object, the text is one of them. Indexes do not keep them.
+    names: tuple = ()
+
+
+def get_keys(names):
+    keys = set()
+    for name in names:
+        words = normalize_query(name or '').split()
+        keys.update(' '.join(words[i:]) for i in range(min(len(words), MAX_KEY_WORDS)))
+    return keys
+
+
+def create_product_suggestion(product, weight=None):
+    return Suggestion(
+        PRODUCT, product.pk, product.name, product.query_count if weight is None else weight, (product.name,)
+    )
+
+
+def create_brand_suggestion(brand, weight=0):
+    return Suggestion(BRAND, brand.pk, brand.common_name or brand.name, weight, (brand.name, brand.common_name))
+
+
+def create_company_suggestion(company, weight=None):
+    return Suggestion(
+        COMPANY,
+        company.pk,
+        company.common_name or company.name or company.official_name,
+        company.query_count if weight is None else weight,
+        (company.name, company.common_name, company.official_name),
+    )
+
+
+def load_suggestions(ids=None) -> Iterable[Suggestion]:
+    """Read suggestions from the database, only of ``ids`` (a mapping of kinds to object IDs) if given."""
+    products = Product.objects.exclude(name=None).exclude(name='')
+    brands = Brand.objects.all()
+    companies = Company.objects.all()
+    if ids is not None:
+        products = products.filter(pk__in=ids.get(PRODUCT, []))
+        brands = brands.filter(pk__in=ids.get(BRAND, []))
+        companies = companies.filter(pk__in=ids.get(COMPANY, []))
+    min_query_count = settings.SUGGEST['MIN_PRODUCT_QUERY_COUNT']
+    if min_query_count:
+        products = products.filter(query_count__gte=min_query_count)
+
+    for pk, name, query_count in products.values_list('pk', 'name', 'query_count').iterator(chunk_size=10000):
+        yield Suggestion(PRODUCT, pk, name, query_count, (name,))
+    brand_weights = dict(
+        Product.objects.filter(brand__in=brands).values_list('brand').annotate(weight=Sum('query_count')).order_by()
+    )
+    for brand in brands.only('pk', 'name', 'common_name').iterator():
+        yield create_brand_suggestion(brand, brand_weights.get(brand.pk) or 0)
+    for company in companies.only('pk', 'name', 'common_name', 'official_name', 'query_count').iterator():
+        yield create_company_suggestion(company)
+
+
+class PackedKeys(Sequence):
+    """Sorted keys encoded in UTF-8 in a single bytes object, which takes a fraction of the memory of strings.
+
+    UTF-8 keeps the order of code points, so bytes sort like the strings.
+    """
+
+    def __init__(self, keys: list[bytes]):
+        self.data = b''.join(keys)
+        self.offsets = array('I', [0])
+        offset = 0
+        for key in keys:
+            offset += len(key)
+            self.offsets.append(offset)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        return self.data[self.offsets[index] : self.offsets[index + 1]]
+
+
+class SuggestIndex:
+    """Immutable index of suggestions by the prefixes of their names.
+
+    Suggestions are stored in columns, which takes less memory than tuples.
+    """
+
+    def __init__(self, suggestions: Iterable[Suggestion]):
+        self.kinds = []
+        self.object_ids = array('q')
+        self.texts = []
+        suggestion_weights = array('q')
+        entries = []
+        for suggestion in suggestions:
+            position = len(self.texts)
+            entries.extend((key.encode(), position) for key in get_keys(suggestion.names))
+            self.kinds.append(suggestion.kind)
+            self.object_ids.append(suggestion.object_id)
+            self.texts.append(suggestion.text)
+            suggestion_weights.append(suggestion.weight)
+        entries.sort()
+        self.keys = PackedKeys([key for key, _ in entries])
+        self.positions = array('i', (position for _, position in entries))
+        del entries
+        self.weights = array('q', (suggestion_weights[position] for position in self.positions))
+        self.tree = self._build_tree()
+
+    def __len__(self):
+        return len(self.texts)
+
+    def _build_tree(self):
+        # tree[size + i] is entry i, tree[node] is the heaviest entry of its subtree. Ties go to the first key,
+        # so the order of suggestions is stable.
+        size = len(self.keys)
+        weights = self.weights
+        tree = array('i', [0]) * size + array('i', range(size))
+        for node in range(size - 1, 0, -1):
+            left, right = tree[2 * node], tree[2 * node + 1]
+            tree[node] = right if weights[right] > weights[left] else left
+        return tree
+
+    def _heaviest(self, lo, hi):
+        """Return the heaviest entry in the range [lo, hi)."""
+        tree = self.tree
+        weights = self.weights
+        best = best_weight = -1
+        size = len(self.positions)
+        lo += size
+        hi += size
+        while lo < hi:
+            if lo & 1:
+                entry = tree[lo]
+                if weights[entry] > best_weight or (weights[entry] == best_weight and entry < best):
+                    best, best_weight = entry, weights[entry]
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                entry = tree[hi]
+                if weights[entry] > best_weight or (weights[entry] == best_weight and entry < best):
+                    best, best_weight = entry, weights[entry]
+            lo //= 2
+            hi //= 2
+        return best
+
+    def iter_matches(self, prefix):
+        """Yield ``(key, suggestion)`` of keys starting with ``prefix``, from the heaviest.
+
+        A suggestion is yielded once for every key matching the prefix.
+        """
+        prefix = prefix.encode()
+        lo = bisect_left(self.keys, prefix)
+        hi = bisect_left(self.keys, prefix + MAX_BYTE, lo)
+        ranges = []
+
+        def push(lo, hi):
+            if lo < hi:
+                entry = self._heaviest(lo, hi)
+                heapq.heappush(ranges, (-self.weights[entry], entry, lo, hi))
+
+        push(lo, hi)
+        while ranges:
+            weight, entry, lo, hi = heapq.heappop(ranges)
+            position = self.positions[entry]
+            suggestion = Suggestion(self.kinds[position], self.object_ids[position], self.texts[position], -weight)
+            yield self.keys[entry].decode(), suggestion
+            push(lo, entry)
+            push(entry + 1, hi)
+
+
+EMPTY_INDEXES = {kind: SuggestIndex([]) for kind in KINDS}
+
+
+class Suggester:
+    """Indexes of a process, one for every kind, together with the changes made after they were built."""
+
+    def __init__(self, load=load_suggestions):
+        self.load = load
+        self._indexes = None
+        self._built_at = None
+        # (kind, object_id) -> (suggestion or None if deleted, its keys, time of the change)
+        self._changes = {}
+        self._synced_at = None
+        # Number of the last read entry of the change log
+        self._change_number = None
+        self._missing_change_number = None
+        self._lock = threading.Lock()
+        self._rebuilding = False
+
+    def suggest(self, text, limit=10, kinds=KINDS, unique_texts=False) -> list[Suggestion]:
+        """Return up to ``limit`` heaviest suggestions with a name starting with words of ``text``."""
+        prefix = normalize_query(text)
+        if not prefix:
+            return []
+        indexes = self._get_indexes()
+        changes = self._changes
+
+        matches = [
+            (
+                (-suggestion.weight, key, suggestion)
+                for key, suggestion in indexes[kind].iter_matches(prefix)
+                if (suggestion.kind, suggestion.object_id) not in changes
+            )
+            for kind in kinds
+        ]
+        matches.append(
+            sorted(
+                (
+                    (-suggestion.weight, key, suggestion)
+                    for suggestion, keys, _ in changes.values()
+                    if suggestion is not None and suggestion.kind in kinds
+                    for key in keys
+                    if key.startswith(prefix)
+                ),
+                key=lambda match: match[:2],
+            )
+        )
+        results = []
+        seen = set()
+        for _, key, suggestion in heapq.merge(*matches, key=lambda match: match[:2]):
+            # Names differing only in diacritics or case are the same suggestion of the search query.
+            identity = normalize_query(suggestion.text) if unique_texts else (suggestion.kind, suggestion.object_id)
+            if identity in seen:
+                continue
+            seen.add(identity)
+            results.append(suggestion)
+            if len(results) == limit:
+                break
+        return results
+
+    def is_ready(self):
+        """Return whether the indexes are built. Starts building them if they are not."""
+        if self._indexes is None and settings.SUGGEST['REBUILD_INTERVAL']:
+            self._start_rebuild()
+            return False
+        return True
+
+    def update(self, suggestion: Suggestion):
+        self._set_change((suggestion.kind, suggestion.object_id), suggestion)
+
+    def remove(self, kind, object_id):
+        self._set_change((kind, object_id), None)
+
+    def _set_change(self, key, suggestion):
+        keys = frozenset(get_keys(suggestion.names)) if suggestion else frozenset()
+        with self._lock:
+            self._changes = {**self._changes, key: (suggestion, keys, time.monotonic())}
+
+    def _get_indexes(self):
+        config = settings.SUGGEST
+        if not config['REBUILD_INTERVAL']:
+            self._rebuild()
+            return self._indexes
+        if self._indexes is None:
+            # Building takes a while, there are no suggestions until the first index is ready.
+            self._start_rebuild()
+            return EMPTY_INDEXES
+        now = time.monotonic()
+        if now - self._synced_at >= config['SYNC_INTERVAL']:
+            self._sync()
+        if now - self._built_at >= config['REBUILD_INTERVAL'] or len(self._changes) > config['MAX_CHANGES']:
+            self._start_rebuild()
+        return self._indexes
+
+    def _rebuild(self):
+        started_at = time.monotonic()
+        change_number = get_change_number()
+        suggestions = {kind: [] for kind in KINDS}
+        for suggestion in self.load():
+            suggestions[suggestion.kind].append(suggestion)
+        indexes = {kind: SuggestIndex(kind_suggestions) for kind, kind_suggestions in suggestions.items()}
+        with self._lock:
+            self._built_at = self._synced_at = started_at
+            self._change_number = change_number
+            # Changes made during the build might not be in the index.
+            self._changes = {key: change for key, change in self._changes.items() if change[2] >= started_at}
+            # Requests read the indexes without the lock, so they are published last.
+            self._indexes = indexes
+        LOGGER.info(
+            "Built suggest index of %d names in %.1f s",
+            sum(len(index) for index in indexes.values()),
+            time.monotonic() - started_at,
+        )
+
+    def _start_rebuild(self):
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        threading.Thread(target=self._run_rebuild, name='suggest-rebuild', daemon=True).start()
+
+    def _run_rebuild(self):
+        try:
+            self._rebuild()
+        except Exception:
+            LOGGER.exception("Failed to build the suggest index")
+        finally:
+            self._rebuilding = False
+            connections.close_all()
+
+    def _sync(self):
+        self._synced_at = time.monotonic()
+        last_number = get_change_number()
+        if last_number < self._change_number:
+            # The log was cleared.
+            self._change_number = last_number
+            self._start_rebuild()
+            return
+        numbers = range(self._change_number + 1, last_number + 1)
+        entries = cache.get_many([f'{CHANGES_KEY}:{number}' for number in numbers])
+        ids = defaultdict(set)
+        for number in numbers:
+            entry = entries.get(f'{CHANGES_KEY}:{number}')
+            if entry is None:
+                # The entry is published right after its number is taken, so it might be there next time.
+                if self._missing_change_number != number:
+                    self._missing_change_number = number
+                    break
+                LOGGER.warning("Missing entry %d of the suggest change log", number)
+                self._change_number = number
+                self._start_rebuild()
+                continue
+            kind, object_id = entry
+            ids[kind].add(object_id)
+            self._change_number = number
+        if not ids:
+            return
+        found = set()
+        for suggestion in self.load(ids=ids):
+            self.update(suggestion)
+            found.add((suggestion.kind, suggestion.object_id))
+        for kind, kind_ids in ids.items():
+            for object_id in kind_ids:
+                if (kind, object_id) not in found:
+                    self.remove(kind, object_id)
+
+
+def get_change_number():
+    return cache.get(CHANGES_KEY) or 0
+
+
+def publish_change(kind, object_id):
+    """Tell other processes that an object was saved or deleted.
+
+    This runs after the commit of the change, so errors of the cache are only logged. Other processes see the change
+    after their next rebuild.
+    """
+    try:
+        cache.add(CHANGES_KEY, 0, timeout=None)
+        number = cache.incr(CHANGES_KEY)
+        if number is None:
+            # The shared cache is unavailable, see pola.cache.
+            return
+        cache.set(f'{CHANGES_KEY}:{number}', (kind, object_id), timeout=settings.SUGGEST['REBUILD_INTERVAL'] * 2)
+    except (RedisError, ValueError):
+        LOGGER.warning("Unable to publish the change of %s %s", kind, object_id, exc_info=True)
+
+
+def create_suggestion(instance):
+    """Return the suggestion of a product, brand or company, ``None`` if it should not be suggested."""
+    if isinstance(instance, Product):
+        if not instance.name or instance.query_count < settings.SUGGEST['MIN_PRODUCT_QUERY_COUNT']:
+            return None
+        return create_product_suggestion(instance)
+    if isinstance(instance, Brand):
+        weight = Product.objects.filter(brand=instance).aggregate(weight=Sum('query_count'))['weight']
+        return create_brand_suggestion(instance, weight or 0)
+    return create_company_suggestion(instance)
+
+
+def get_kind(model):
+    return {Product: PRODUCT, Brand: BRAND, Company: COMPANY}[model]
+
+
+def record_saved(instance):
+    """Add a saved object to the suggestions of this process and publish the change to other processes."""
+    suggestion = create_suggestion(instance)
+    kind = get_kind(type(instance))
+    if suggestion is None:
+        suggester.remove(kind, instance.pk)
+    else:
+        suggester.update(suggestion)
+    publish_change(kind, instance.pk)
+
+
+def record_deleted(model, object_id):
+    kind = get_kind(model)
+    suggester.remove(kind, object_id)
+    publish_change(kind, object_id)
+
+
+suggester = Suggester()
+
+
+def is_ready():
+    return suggester.is_ready()
+
+
+def suggest(text, limit=10, kinds=KINDS, unique_texts=False) -> list[Suggestion]:
+    return suggester.suggest(text, limit=limit, kinds=kinds, unique_texts=unique_texts)
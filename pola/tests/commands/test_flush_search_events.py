@@ -0,0 +1,10 @@
+from unittest import TestCase
+
+import pytest
+from django.core.management import call_command
+
+
+class FlushSearchEventsTestCase(TestCase):
+    @pytest.mark.django_db
+    def test_run_command(self):
+        call_command('flush_search_events')
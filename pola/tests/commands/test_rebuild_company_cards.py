@@ -0,0 +1,40 @@
+from unittest import mock
+
+from django.core.management import call_command
+from test_plus import TestCase
+
+from pola.company.factories import CompanyFactory
+from pola.company.models import SCAN_CARD_VERSION, Company
+
+
+class RebuildCompanyCardsTestCase(TestCase):
+    def test_run_command(self):
+        companies = CompanyFactory.create_batch(3)
+        Company.objects.update(scan_card=None)
+
+        call_command('rebuild_company_cards', '--batch-size', '2')
+
+        for company in companies:
+            company.refresh_from_db()
+            self.assertEqual(SCAN_CARD_VERSION, company.scan_card['version'])
+            self.assertEqual(company.build_scan_card(), company.get_scan_card())
+
+    def test_should_rebuild_only_outdated_cards(self):
+        outdated, current = CompanyFactory.create_batch(2)
+        Company.objects.filter(pk=outdated.pk).update(scan_card={'version': SCAN_CARD_VERSION - 1, 'data': {}})
+        Company.objects.filter(pk=current.pk).update(scan_card={'version': SCAN_CARD_VERSION, 'data': {}})
+
+        call_command('rebuild_company_cards', '--only-outdated')
+
+        outdated.refresh_from_db()
+        current.refresh_from_db()
+        self.assertEqual(outdated.build_scan_card(), outdated.get_scan_card())
+        self.assertEqual({}, current.scan_card['data'])
+
+    def test_should_invalidate_cached_scan_results(self):
+        CompanyFactory()
+
+        with mock.patch('pola.result_cache.invalidate_all') as invalidate_mock:
+            call_command('rebuild_company_cards')
+
+        invalidate_mock.assert_called_once_with()
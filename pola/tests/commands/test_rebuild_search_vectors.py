@@ -0,0 +1,15 @@
+from django.core.management import call_command
+from test_plus import TestCase
+
+from pola.product.factories import ProductFactory
+from pola.product.models import Product
+
+
+class RebuildSearchVectorsTestCase(TestCase):
+    def test_run_command(self):
+        products = ProductFactory.create_batch(3, name="baton")
+        Product.objects.update(search_vector=None)
+
+        call_command('rebuild_search_vectors', '--batch-size', '2')
+
+        self.assertEqual(sorted(p.pk for p in products), sorted(p.pk for p in Product.objects.search("baton")))
@@ -8,3 +8,7 @@ class RecalculateQueryCountTestCase(TestCase):
     @pytest.mark.django_db
     def test_run_command(self):
         call_command('recalculate_query_count')
+
+    @pytest.mark.django_db
+    def test_run_command_full(self):
+        call_command('recalculate_query_count', '--full')
@@ -8,3 +8,7 @@ class Requery590CodesTestCase(TestCase):
     @pytest.mark.django_db
     def test_run_command(self):
         call_command('requery_590_codes')
+
+    @pytest.mark.django_db
+    def test_run_command_with_options(self):
+        call_command('requery_590_codes', '--concurrency', '2', '--rate', '0')
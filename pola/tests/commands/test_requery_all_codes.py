@@ -8,3 +8,7 @@ class RequeryAllCodesTestCase(TestCase):
     @pytest.mark.django_db
     def test_run_command(self):
         call_command('requery_all_codes')
+
+    @pytest.mark.django_db
+    def test_run_command_with_options(self):
+        call_command('requery_all_codes', '--concurrency', '2', '--rate', '0')
@@ -0,0 +1,176 @@
+import threading
+import time
+import uuid
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+from redis.exceptions import RedisError
+
+from pola.cache import TieredCache
+
+
+def create_cache(location=None, **options):
+    return TieredCache(
+        location or uuid.uuid4().hex,
+        {
+            'TIMEOUT': 300,
+            'OPTIONS': {
+                'SHARED_CACHE': 'shared',
+                'LOCAL_TIMEOUT': 5,
+                'NAMESPACES': {'lock:': {'LOCAL_TIMEOUT': 0}, 'page:': {'TIMEOUT': 600, 'LOCAL_TIMEOUT': 60}},
+                **options,
+            },
+        },
+    )
+
+
+@override_settings(
+    CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'default'},
+        'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'shared'},
+    }
+)
+class TestTieredCache(SimpleTestCase):
+    def setUp(self):
+        self.shared = caches['shared']
+        self.shared.clear()
+        self.cache = create_cache()
+
+    def test_should_keep_copy_of_shared_value(self):
+        self.shared.set('product', {'name': 'Pola'})
+
+        with mock.patch('pola.cache.time.monotonic', return_value=1000):
+            value = self.cache.get('product')
+        value['name'] = 'Changed'
+        self.shared.set('product', {'name': 'Changed in another process'})
+
+        with mock.patch('pola.cache.time.monotonic', return_value=1004):
+            self.assertEqual({'name': 'Pola'}, self.cache.get('product'))
+        with mock.patch('pola.cache.time.monotonic', return_value=1005):
+            self.assertEqual({'name': 'Changed in another process'}, self.cache.get('product'))
+
+    def test_should_write_through_to_shared_cache(self):
+        self.cache.set('product', 'Pola')
+        self.cache.set_many({'brand': 'Wedel', 'page:/': 'Home'})
+
+        self.assertEqual(
+            {'product': 'Pola', 'brand': 'Wedel', 'page:/': 'Home'},
+            self.shared.get_many(['product', 'brand', 'page:/']),
+        )
+
+    def test_should_apply_timeouts_of_namespaces(self):
+        with mock.patch.object(self.shared, 'set') as shared_set:
+            self.cache.set('page:/', 'Home')
+            self.cache.set('product', 'Pola')
+            self.cache.set('page:/about', 'About', timeout=10)
+
+        self.assertEqual(
+            [
+                mock.call('page:/', 'Home', timeout=600, version=None),
+                mock.call('product', 'Pola', timeout=300, version=None),
+                mock.call('page:/about', 'About', timeout=10, version=None),
+            ],
+            shared_set.call_args_list,
+        )
+
+    def test_should_always_read_namespaces_without_local_timeout_from_shared_cache(self):
+        self.cache.set('lock:product', 'worker-1')
+        self.shared.set('lock:product', 'worker-2')
+
+        self.assertEqual('worker-2', self.cache.get('lock:product'))
+        self.assertEqual({'lock:product': 'worker-2'}, self.cache.get_many(['lock:product']))
+
+    def test_should_evict_least_recently_used_values(self):
+        cache = create_cache(MAX_ENTRIES=2)
+        cache.set_many({'a': 1, 'b': 2})
+        cache.get('a')
+        cache.set('c', 3)
+        self.shared.set_many({'a': 10, 'b': 20, 'c': 30})
+
+        self.assertEqual({'a': 1, 'b': 20, 'c': 3}, cache.get_many(['a', 'b', 'c']))
+
+    def test_should_delete_from_both_tiers(self):
+        self.cache.set_many({'a': 1, 'b': 2, 'c': 3})
+
+        self.cache.delete('a')
+        self.cache.delete_many(['b'])
+
+        self.assertEqual({'c': 3}, self.cache.get_many(['a', 'b', 'c']))
+        self.assertEqual({'c': 3}, self.shared.get_many(['a', 'b', 'c']))
+
+    def test_should_count_in_shared_cache(self):
+        self.assertTrue(self.cache.add('counter', 1))
+        self.assertFalse(self.cache.add('counter', 1))
+        self.shared.incr('counter')
+
+        self.assertEqual(3, self.cache.incr('counter'))
+        self.assertEqual(3, self.cache.get('counter'))
+
+    def test_should_share_local_tier_by_threads(self):
+        location = uuid.uuid4().hex
+        create_cache(location).set('product', 'Pola')
+        self.shared.delete('product')
+
+        self.assertEqual('Pola', create_cache(location).get('product'))
+
+    def test_should_compute_value_once(self):
+        computed = []
+        barrier = threading.Barrier(5)
+
+        def compute():
+            computed.append(1)
+            time.sleep(0.1)
+            return 'Pola'
+
+        def get():
+            barrier.wait()
+            results.append(self.cache.get_or_set('product', compute))
+
+        results = []
+        threads = [threading.Thread(target=get) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(['Pola'] * 5, results)
+        self.assertEqual(1, len(computed))
+        self.assertFalse(self.shared.has_key('product:flight'))
+
+    def test_should_wait_for_value_computed_by_another_process(self):
+        self.shared.add('product:flight', True)
+        timer = threading.Timer(0.1, lambda: self.shared.set('product', 'Pola'))
+        timer.start()
+        self.addCleanup(timer.cancel)
+
+        self.assertEqual('Pola', self.cache.get_or_set('product', mock.Mock(side_effect=AssertionError)))
+
+    def test_should_compute_value_when_another_process_fails(self):
+        self.shared.add('product:flight', True)
+        timer = threading.Timer(0.1, lambda: self.shared.delete('product:flight'))
+        timer.start()
+        self.addCleanup(timer.cancel)
+
+        self.assertEqual('Pola', self.cache.get_or_set('product', lambda: 'Pola'))
+        self.assertEqual('Pola', self.shared.get('product'))
+
+    def test_should_not_fail_when_shared_cache_fails(self):
+        self.cache.set('product', 'Pola')
+        methods = ['add', 'get', 'get_many', 'set', 'set_many', 'delete', 'delete_many', 'has_key', 'incr']
+        for method in methods:
+            patcher = mock.patch.object(self.shared, method, side_effect=RedisError)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        with self.assertLogs('pola.cache', level='WARNING'):
+            self.assertEqual('Pola', self.cache.get('product'))
+            self.assertIsNone(self.cache.get('brand'))
+            self.assertEqual({'product': 'Pola'}, self.cache.get_many(['product', 'brand']))
+            self.assertFalse(self.cache.add('lock:product', 1))
+            self.assertIsNone(self.cache.incr('counter'))
+            self.assertEqual(['brand'], self.cache.set_many({'brand': 'Wedel'}))
+            self.cache.set('company', 'Wedel')
+            self.cache.delete('product')
+            self.cache.delete_many(['brand'])
+            self.assertEqual('Pola', self.cache.get_or_set('page:/', lambda: 'Pola'))
@@ -0,0 +1,82 @@
+from django.test import override_settings
+from test_plus import TestCase
+
+from pola import counters
+from pola.company.factories import CompanyFactory
+from pola.company.models import Company
+from pola.models import Query, QueryCountDelta
+from pola.product.factories import ProductFactory
+from pola.product.models import Product
+
+
+class TestCounters(TestCase):
+    def setUp(self):
+        self.company = CompanyFactory(query_count=10)
+        self.p1 = ProductFactory(company=self.company, query_count=1)
+        self.p2 = ProductFactory(company=self.company, query_count=2)
+
+    def test_should_increment_with_single_query(self):
+        with self.assertNumQueries(1):
+            counters.increment(Product, {self.p1.pk: 3, self.p2.pk: 1})
+
+    def test_should_skip_empty_increments(self):
+        with self.assertNumQueries(0):
+            counters.increment(Product, {self.p1.pk: 0})
+
+    @override_settings(QUERY_COUNT_SHARDS=1)
+    def test_should_merge_increments_of_the_same_shard(self):
+        counters.increment(Product, {self.p1.pk: 3})
+        counters.increment(Product, {self.p1.pk: 4})
+
+        self.assertEqual([7], list(QueryCountDelta.objects.values_list('value', flat=True)))
+
+    def test_should_fold_pending_increments(self):
+        for _ in range(20):
+            counters.increment(Product, {self.p1.pk: 1, self.p2.pk: 2})
+        counters.increment(Company, {self.company.pk: 5})
+
+        self.assertEqual(3, counters.fold())
+
+        self.p1.refresh_from_db()
+        self.p2.refresh_from_db()
+        self.company.refresh_from_db()
+        self.assertEqual((21, 42, 15), (self.p1.query_count, self.p2.query_count, self.company.query_count))
+        self.assertFalse(QueryCountDelta.objects.exists())
+
+    def test_should_fold_only_given_model(self):
+        counters.increment(Product, {self.p1.pk: 1})
+        counters.increment(Company, {self.company.pk: 1})
+
+        counters.fold(Product)
+
+        self.assertEqual(['company'], list(QueryCountDelta.objects.values_list('counter', flat=True)))
+
+    def test_should_drop_increments_of_deleted_objects(self):
+        counters.increment(Product, {self.p1.pk: 1, self.p2.pk: 1})
+        Query.objects.filter(product=self.p2).delete()
+        self.p2.delete()
+
+        self.assertEqual(1, counters.fold(Product))
+        self.assertFalse(QueryCountDelta.objects.exists())
+
+    @override_settings(QUERY_COUNT_SHARDS=1)
+    def test_should_move_pending_increments(self):
+        other = CompanyFactory()
+        counters.increment(Company, {self.company.pk: 1, other.pk: 2})
+
+        counters.move(Company, [other.pk], self.company.pk)
+
+        self.assertEqual([(self.company.pk, 3)], list(QueryCountDelta.objects.values_list('object_id', 'value')))
+
+    def test_should_read_exact_query_counts(self):
+        counters.increment(Product, {self.p1.pk: 3})
+
+        self.assertEqual(1, counters.get_query_count(self.p1))
+        self.assertEqual(4, counters.get_query_count(self.p1, exact=True))
+        self.assertEqual(
+            {self.p1.pk: 4, self.p2.pk: 2}, counters.get_query_counts(Product, [self.p1.pk, self.p2.pk], exact=True)
+        )
+
+    def test_should_raise_for_model_without_counter(self):
+        with self.assertRaises(ValueError):
+            counters.increment(Query, {1: 1})
@@ -0,0 +1,26 @@
+from parameterized import parameterized
+from test_plus import TestCase
+
+from pola.countries import _find_registration_country, get_registration_country
+
+
+class TestGetRegistrationCountry(TestCase):
+    def test_should_match_linear_lookup_for_all_prefixes(self):
+        for prefix in range(1000):
+            code = f'{prefix:03}0000000000'
+            self.assertEqual(_find_registration_country(code), get_registration_country(code), code)
+
+    @parameterized.expand(
+        [
+            ("5901234123457", None),
+            ("4601234123457", "Federacja Rosyjska"),
+            ("4811234123457", "Białoruś"),
+            ("40", "Niemcy"),
+            ("4", None),
+            ("", None),
+            ("ABC", None),
+            ("٤٦١٢٣٤٥", None),
+        ]
+    )
+    def test_should_resolve_country(self, code, expected):
+        self.assertEqual(expected, get_registration_country(code))
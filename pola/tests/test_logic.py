@@ -1,21 +1,38 @@
 import os
 from unittest import mock
 
+import redis
+from django.conf import settings
+from django.core.cache import cache
 from django.core.files.base import ContentFile
+from django.test import override_settings
 from parameterized import parameterized
 from test_plus import TestCase
 from vcr import VCR
 
+from pola import result_cache
 from pola.company.factories import BrandFactory, CompanyFactory
 from pola.gpc.factories import GPCBrickFactory
 from pola.logic import (
     _find_replacements,
     get_by_code,
+    get_enrichment_lock_key,
     get_result_from_code,
     handle_product_replacements,
 )
+from pola.logic_bot_report import (
+    BotReport,
+    create_bot_report,
+    create_bot_reports,
+)
+from pola.logic_produkty_w_sieci import (
+    get_not_found_key,
+    is_known_not_found,
+    remember_not_found,
+)
 from pola.product.factories import ProductFactory
 from pola.product.models import Product
+from pola.report.models import Report
 from pola.tests.test_utils import get_dummy_image
 
 TEST_EAN13 = "5901520000059"
@@ -612,6 +629,143 @@ class TestGetByCode(TestCase):
         self.assertEqual(1, Product.objects.count())
 
 
+class TestGetResultFromCodeQueries(TestCase):
+    def _create_product(self, replacements_count, brands_count):
+        company = CompanyFactory(display_brands_in_description=True)
+        brand_company = CompanyFactory(display_brands_in_description=True)
+        BrandFactory.create_batch(brands_count, company=company)
+        BrandFactory.create_batch(brands_count, company=brand_company)
+        product = ProductFactory(company=company, brand=BrandFactory(company=brand_company))
+        for _ in range(replacements_count):
+            product.replacements.add(ProductFactory(company=CompanyFactory(), brand=BrandFactory()))
+        return product
+
+    @parameterized.expand([(False,), (True,)])
+    def test_should_use_fixed_number_of_queries(self, multiple_company_supported):
+        small = self._create_product(replacements_count=1, brands_count=1)
+        large = self._create_product(replacements_count=5, brands_count=5)
+
+        with self.assertNumQueries(4):
+            get_result_from_code(small.code, multiple_company_supported=multiple_company_supported)
+        with self.assertNumQueries(4):
+            result, _, _ = get_result_from_code(large.code, multiple_company_supported=multiple_company_supported)
+        self.assertEqual(5, len(result['replacements']))
+
+
+@override_settings(PRODUKTY_W_SIECI_ASYNC=True)
+class TestScheduleEnrichment(TestCase):
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch('pola.logic.Queue')
+        self.queue_mock = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+
+    def test_should_return_unknown_product_without_calling_api(self):
+        with mock.patch('pola.logic.produkty_w_sieci_client') as client_mock:
+            with self.captureOnCommitCallbacks(execute=True):
+                result, _, product = get_result_from_code(TEST_EAN13)
+
+        client_mock.get_products.assert_not_called()
+        self.assertEqual("Tego produktu nie mamy jeszcze w bazie", result['name'])
+        self.assertEqual(TEST_EAN13, product.code)
+        self.queue_mock.enqueue.assert_called_once_with('pola.logic_workers.enrich_product', TEST_EAN13)
+
+    def test_should_enqueue_code_once(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            get_result_from_code(TEST_EAN13)
+            get_result_from_code(TEST_EAN13)
+
+        self.assertEqual(1, self.queue_mock.enqueue.call_count)
+
+    def test_should_skip_unsupported_codes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            get_result_from_code("4601234123457")
+
+        self.queue_mock.enqueue.assert_not_called()
+
+    def test_should_release_lock_when_enqueue_fails(self):
+        self.queue_mock.enqueue.side_effect = redis.exceptions.ConnectionError()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            get_result_from_code(TEST_EAN13)
+
+        self.assertIsNone(cache.get(get_enrichment_lock_key(TEST_EAN13)))
+
+
+@override_settings(SCAN_RESULT_CACHE_TIMEOUT=60)
+class TestCircuitBreakerOpen(TestCase):
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch('pola.logic.produkty_w_sieci_client')
+        self.client_mock = patcher.start()
+        self.client_mock.is_available.return_value = False
+        self.client_mock.circuit_breaker.reset_timeout = 30
+        self.addCleanup(patcher.stop)
+
+    def test_should_skip_lookup(self):
+        result, _, product = get_result_from_code(TEST_EAN13)
+
+        self.client_mock.get_products.assert_not_called()
+        self.assertEqual("Tego produktu nie mamy jeszcze w bazie", result['name'])
+        self.assertIsNone(product.company)
+
+    @override_settings(PRODUKTY_W_SIECI_ASYNC=True)
+    def test_should_not_schedule_enrichment(self):
+        with mock.patch('pola.logic.schedule_enrichment') as schedule_mock:
+            get_result_from_code(TEST_EAN13)
+
+        schedule_mock.assert_not_called()
+
+    def test_should_cache_result_until_circuit_breaker_may_close(self):
+        with mock.patch('pola.logic.result_cache.store', wraps=result_cache.store) as store_mock:
+            get_result_from_code(TEST_EAN13)
+
+        self.assertEqual(30, store_mock.call_args.kwargs['timeout'])
+        with self.assertNumQueries(0):
+            get_result_from_code(TEST_EAN13)
+
+
+@override_settings(PRODUKTY_W_SIECI={**settings.PRODUKTY_W_SIECI, 'NOT_FOUND_TIMEOUT': 3600})
+class TestNotFoundCache(TestCase):
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch('pola.logic.produkty_w_sieci_client')
+        self.client_mock = patcher.start()
+        self.client_mock.get_products.return_value = None
+        self.addCleanup(patcher.stop)
+
+    def test_should_not_look_up_unknown_code_again(self):
+        _, _, product = get_result_from_code(TEST_EAN13)
+        get_result_from_code(TEST_EAN13)
+
+        self.assertIsNone(product.company)
+        self.client_mock.get_products.assert_called_once_with(gtin_number=TEST_EAN13)
+        self.assertTrue(is_known_not_found(TEST_EAN13))
+
+    def test_should_expire_with_jitter(self):
+        with mock.patch('pola.logic_produkty_w_sieci.cache') as cache_mock:
+            with mock.patch('pola.logic_produkty_w_sieci.random.uniform', return_value=1.1):
+                remember_not_found(TEST_EAN13)
+
+        cache_mock.set.assert_called_once_with(get_not_found_key(TEST_EAN13), 1, timeout=3960)
+
+    @override_settings(PRODUKTY_W_SIECI_ASYNC=True)
+    def test_should_not_schedule_enrichment_of_unknown_code(self):
+        remember_not_found(TEST_EAN13)
+
+        with mock.patch('pola.logic.schedule_enrichment') as schedule_mock:
+            get_result_from_code(TEST_EAN13)
+
+        schedule_mock.assert_not_called()
+
+    @override_settings(SCAN_RESULT_CACHE_TIMEOUT=60)
+    def test_should_cache_result_of_unknown_code(self):
+        get_result_from_code(TEST_EAN13)
+
+        with self.assertNumQueries(0):
+            get_result_from_code(TEST_EAN13)
+
+
 class TestCreateFromApi(TestCase):
     pass
 
@@ -621,7 +775,49 @@ class TestUpdateCompanyFromKrs(TestCase):
 
 
 class TestCreateBotReport(TestCase):
-    pass
+    def test_should_skip_existing_report(self):
+        product = ProductFactory()
+        create_bot_report(product, "Opis", check_if_already_exists=True)
+
+        with self.assertNumQueries(1):
+            create_bot_report(product, "Opis", check_if_already_exists=True)
+
+        self.assertEqual(1, Report.objects.count())
+        report = Report.objects.get()
+        self.assertEqual(
+            ('krs-bot', Report.get_dedup_key(product.pk, 'krs-bot', "Opis")), (report.client, report.dedup_key)
+        )
+
+    def test_should_create_reports_in_bulk(self):
+        p1, p2 = ProductFactory.create_batch(2)
+        create_bot_report(p1, "Opis 1")
+
+        with self.assertNumQueries(2):
+            created = create_bot_reports(
+                [
+                    BotReport(p1, "Opis 1", check_if_already_exists=True),
+                    BotReport(p1, "Opis 2", check_if_already_exists=True),
+                    BotReport(p1, "Opis 2", check_if_already_exists=True),
+                    BotReport(p2, "Opis 1", check_if_already_exists=True),
+                    BotReport(p2, "Opis 3"),
+                ]
+            )
+
+        self.assertEqual(3, created)
+        self.assertEqual(
+            [(p1.pk, "Opis 1"), (p1.pk, "Opis 2"), (p2.pk, "Opis 1"), (p2.pk, "Opis 3")],
+            sorted(Report.objects.values_list('product_id', 'description')),
+        )
+
+    def test_should_set_dedup_key_on_save(self):
+        product = ProductFactory()
+        report = Report.objects.create(product=product, client='user', description="Opis")
+
+        report.description = "Nowy opis"
+        report.save(update_fields=['description'])
+
+        report.refresh_from_db()
+        self.assertEqual(Report.get_dedup_key(product.pk, 'user', "Nowy opis"), report.dedup_key)
 
 
 class TestGetPlScore(TestCase):
@@ -1,12 +1,17 @@
 from functools import reduce
 
 from parameterized import parameterized
+from reversion.models import Version
 from test_plus import TestCase
 
 from pola import logic_produkty_w_sieci
 from pola.gpc.factories import GPCBrickFactory
 from pola.integrations.produkty_w_sieci import ProductBase
-from pola.logic_produkty_w_sieci import create_from_api, is_code_supported
+from pola.logic_produkty_w_sieci import (
+    create_from_api,
+    get_gs1_response_hash,
+    is_code_supported,
+)
 from pola.product.models import Product
 from pola.report.models import Report
 
@@ -480,6 +485,62 @@ class TestCreateFromApi(TestCase):
         self.assertIn('A previously unknown brand was found. Updating the product.', logConcat)
 
 
+class TestCreateFromApiUnchangedResponse(TestCase):
+    RESPONSE = {
+        "gtinNumber": TEST_EAN13,
+        "name": "Nowa nazwa",
+        "targetMarket": ["PL"],
+        "netContent": ["30", "G"],
+        "imageUrls": [],
+        "description": None,
+        "descriptionLanguage": "pl",
+        "productPage": None,
+        "isPublic": True,
+        "lastModified": "2020-06-01T14:03:41.722000+00:00",
+        "brand": "brand-name",
+        "gpc": [],
+    }
+
+    def setUp(self):
+        self.product = Product.objects.create(
+            name=TEST_PRODUCT_NAME, code=TEST_EAN13, commit_desc="Utworzono produkt przez test"
+        )
+
+    def test_should_store_hash_of_response(self):
+        create_from_api(TEST_EAN13, ProductBase.parse_obj(self.RESPONSE), product=self.product)
+
+        self.product.refresh_from_db()
+        self.assertEqual(get_gs1_response_hash(self.product.gs1_last_response), self.product.gs1_response_hash)
+
+    def test_should_skip_product_when_response_did_not_change(self):
+        create_from_api(TEST_EAN13, ProductBase.parse_obj(self.RESPONSE), product=self.product)
+        self.product.refresh_from_db()
+        reports_count = Report.objects.count()
+        versions_count = Version.objects.get_for_object(self.product).count()
+
+        with self.assertNumQueries(0):
+            create_from_api(TEST_EAN13, ProductBase.parse_obj(self.RESPONSE), product=self.product)
+
+        self.assertEqual(1, reports_count)
+        self.assertEqual(reports_count, Report.objects.count())
+        self.assertEqual(versions_count, Version.objects.get_for_object(self.product).count())
+
+    def test_should_update_product_when_response_changed(self):
+        create_from_api(TEST_EAN13, ProductBase.parse_obj(self.RESPONSE), product=self.product)
+        self.product.refresh_from_db()
+
+        create_from_api(
+            TEST_EAN13, ProductBase.parse_obj({**self.RESPONSE, "name": "Inna nazwa"}), product=self.product
+        )
+
+        self.product.refresh_from_db()
+        self.assertEqual("Inna nazwa", self.product.gs1_last_response['name'])
+        self.assertEqual(2, Report.objects.count())
+
+    def test_should_not_depend_on_key_order(self):
+        self.assertEqual(get_gs1_response_hash({'a': 1, 'b': [1, 2]}), get_gs1_response_hash({'b': [1, 2], 'a': 1}))
+
+
 class TestCreateFromApiUnsupportedCode(TestCase):
     def test_raises_exception_for_unsupported_code(self):
         # Use a 13-digit code that doesn't start with 590
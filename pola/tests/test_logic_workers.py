@@ -1,5 +1,20 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import override_settings
+from django.utils import timezone
 from test_plus import TestCase
 
+from pola import logic, result_cache
+from pola.company.factories import CompanyFactory
+from pola.integrations.produkty_w_sieci import ApiException
+from pola.logic_produkty_w_sieci import is_known_not_found, remember_not_found
+from pola.logic_workers import enrich_product, requery_products
+from pola.product.factories import ProductFactory
+from pola.product.models import Product
+
 
 class TestRequery590Codes(TestCase):
     pass
@@ -10,8 +25,122 @@ class TestRequeryAlCodes(TestCase):
 
 
 class TestRequeryProducts(TestCase):
-    pass
+    def setUp(self):
+        queried_at = timezone.now() - timedelta(days=90)
+        self.products = [ProductFactory(code=f"590000000{i:04}", company=None) for i in range(5)]
+        self.products.append(ProductFactory(code="4000000000001", company=None))
+        Product.objects.update(ilim_queried_at=queried_at)
+        client_patcher = mock.patch('pola.logic_workers.create_client')
+        self.create_client_mock = client_patcher.start()
+        self.client_mock = self.create_client_mock.return_value
+        self.client_mock.is_available.return_value = True
+        self.addCleanup(client_patcher.stop)
+        create_patcher = mock.patch('pola.logic_workers.create_from_api')
+        self.create_mock = create_patcher.start()
+        self.addCleanup(create_patcher.stop)
+
+    def test_should_query_supported_codes_concurrently(self):
+        stats = requery_products(Product.objects.order_by('code'), concurrency=3, rate=0)
+
+        self.assertEqual({'products': 6, 'errors': 0}, stats)
+        self.assertEqual(
+            sorted(p.code for p in self.products[:5]),
+            sorted(c.kwargs['gtin_number'] for c in self.client_mock.get_products.call_args_list),
+        )
+        self.assertEqual(5, self.create_mock.call_count)
+        self.assertEqual(6, Product.objects.filter(ilim_queried_at__gt=timezone.now() - timedelta(minutes=1)).count())
+
+    def test_should_count_failed_lookups(self):
+        self.client_mock.get_products.side_effect = [ApiException("error")] + [mock.Mock()] * 4
+
+        stats = requery_products(Product.objects.order_by('code'), concurrency=1, rate=0)
+
+        self.assertEqual({'products': 6, 'errors': 1}, stats)
+        self.assertEqual(4, self.create_mock.call_count)
+        # The failed product is requeried by the next run.
+        self.assertEqual(
+            ["5900000000000"],
+            list(
+                Product.objects.filter(ilim_queried_at__lt=timezone.now() - timedelta(days=1)).values_list(
+                    'code', flat=True
+                )
+            ),
+        )
+
+    @override_settings(PRODUKTY_W_SIECI={**settings.PRODUKTY_W_SIECI, 'NOT_FOUND_TIMEOUT': 3600})
+    def test_should_refresh_codes_unknown_to_produkty_w_sieci(self):
+        cache.clear()
+        remember_not_found("5900000000001")
+        self.client_mock.get_products.side_effect = [None, mock.Mock(), None, None, None]
+
+        requery_products(Product.objects.order_by('code'), concurrency=1, rate=0)
+
+        self.assertEqual(1, self.create_mock.call_count)
+        self.assertTrue(is_known_not_found("5900000000000"))
+        self.assertFalse(is_known_not_found("5900000000001"))
+        self.assertEqual(6, Product.objects.filter(ilim_queried_at__gt=timezone.now() - timedelta(minutes=1)).count())
+
+    def test_should_stop_when_circuit_breaker_opens(self):
+        self.client_mock.is_available.side_effect = [True, True, False]
+
+        stats = requery_products(Product.objects.order_by('code'), concurrency=1, rate=0)
+
+        self.assertEqual({'products': 2, 'errors': 0}, stats)
+        self.assertEqual(2, Product.objects.filter(ilim_queried_at__gt=timezone.now() - timedelta(minutes=1)).count())
+
+    def test_should_limit_rate_of_lookups(self):
+        with mock.patch('pola.logic_workers.RateLimiter') as rate_limiter_mock:
+            requery_products(Product.objects.order_by('code'), concurrency=2, rate=5)
+
+        rate_limiter_mock.assert_called_once_with(5)
+        self.assertEqual(5, rate_limiter_mock.return_value.wait.call_count)
+
+    def test_should_use_pool_large_enough_for_concurrency(self):
+        requery_products(Product.objects.order_by('code'), concurrency=20, rate=0)
+
+        self.create_client_mock.assert_called_once_with(pool_size=20, rate_limit_timeout=mock.ANY)
 
 
 class TestUpdateFromKbpoz(TestCase):
     pass
+
+
+@override_settings(PRODUKTY_W_SIECI_ASYNC=True, SCAN_RESULT_CACHE_TIMEOUT=60)
+class TestEnrichProduct(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = ProductFactory(code="5900000000001", company=None)
+
+    def _assign_company(self, code, product):
+        product.company = CompanyFactory(common_name="TEST-COMPANY")
+        product.save()
+        return product
+
+    def test_should_refresh_cached_results(self):
+        logic.get_result_from_code(self.product.code, multiple_company_supported=True, report_as_object=True)
+        cache.add(logic.get_enrichment_lock_key(self.product.code), 1)
+
+        with mock.patch('pola.logic.process_with_produkty_w_sieci', side_effect=self._assign_company):
+            enrich_product(self.product.code)
+
+        (result, _, _), _ = result_cache.lookup(self.product.code, True, True)
+        self.assertEqual("TEST-COMPANY", result['companies'][0]['name'])
+        self.assertIsNone(cache.get(logic.get_enrichment_lock_key(self.product.code)))
+
+    def test_should_skip_lookup_of_products_with_company(self):
+        self.product.company = CompanyFactory()
+        self.product.save()
+
+        with mock.patch('pola.logic.process_with_produkty_w_sieci') as process_mock:
+            enrich_product(self.product.code)
+
+        process_mock.assert_not_called()
+
+    def test_should_release_lock_when_lookup_fails(self):
+        cache.add(logic.get_enrichment_lock_key(self.product.code), 1)
+
+        with mock.patch('pola.logic.process_with_produkty_w_sieci', side_effect=RuntimeError()):
+            with self.assertRaises(RuntimeError):
+                enrich_product(self.product.code)
+
+        self.assertIsNone(cache.get(logic.get_enrichment_lock_key(self.product.code)))
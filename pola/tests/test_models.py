@@ -1,5 +1,54 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import override_settings
 from test_plus import TestCase
 
+from pola.models import AppConfiguration
+
 
 class TestStats(TestCase):
     pass
+
+
+@override_settings(APP_CONFIGURATION_CACHE_TIMEOUT=60)
+class TestAppConfigurationCache(TestCase):
+    def setUp(self):
+        cache.clear()
+        AppConfiguration.invalidate_cache()
+        self.addCleanup(AppConfiguration.invalidate_cache)
+
+    def test_should_read_database_once(self):
+        app_config = AppConfiguration.get_cached()
+
+        with self.assertNumQueries(0):
+            self.assertIs(app_config, AppConfiguration.get_cached())
+        self.assertEqual(1, AppConfiguration.objects.count())
+
+    def test_should_read_cache_when_copy_expires(self):
+        AppConfiguration.objects.create(donate_text="Wesprzyj nas")
+        with mock.patch('pola.models.time.monotonic', return_value=1000):
+            AppConfiguration.get_cached()
+
+        with mock.patch('pola.models.time.monotonic', return_value=1060), self.assertNumQueries(0):
+            app_config = AppConfiguration.get_cached()
+
+        self.assertEqual("Wesprzyj nas", app_config.donate_text)
+
+    def test_should_invalidate_on_commit_of_save(self):
+        app_config = AppConfiguration.get_singleton()
+        AppConfiguration.get_cached()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            app_config.donate_text = "Wesprzyj nas"
+            app_config.save()
+            self.assertNotEqual("Wesprzyj nas", AppConfiguration.get_cached().donate_text)
+
+        self.assertEqual("Wesprzyj nas", AppConfiguration.get_cached().donate_text)
+
+    @override_settings(APP_CONFIGURATION_CACHE_TIMEOUT=0)
+    def test_should_read_database_when_disabled(self):
+        AppConfiguration.get_cached()
+
+        with self.assertNumQueries(1):
+            AppConfiguration.get_cached()
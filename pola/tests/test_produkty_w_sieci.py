@@ -1,19 +1,44 @@
+import json
 import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from unittest import mock
 
 import pytest
 from django.test import TestCase, override_settings
 from requests.exceptions import HTTPError
+from urllib3.util.retry import Retry
 from vcr import VCR
 
+from pola.integrations.http import RateLimiter
 from pola.integrations.produkty_w_sieci import (
     ApiException,
     ProduktyWSieciClient,
+    ServiceUnavailable,
     produkty_w_sieci_client,
 )
+from pola.integrations.throttling import CircuitBreaker, LocalStore
 
 TEST_EAN13 = "5901520000059"
 
+PRODUCT_RESPONSE = {
+    "gtinNumber": TEST_EAN13,
+    "gtinStatus": "active",
+    "name": "Mocked Product",
+    "targetMarket": ["PL"],
+    "netContent": ["500", "ml"],
+    "description": "Mocked description",
+    "descriptionLanguage": "pl",
+    "imageUrls": [],
+    "productPage": None,
+    "isPublic": True,
+    "isVerified": True,
+    "lastModified": "2023-01-01T00:00:00+00:00",
+    "gpc": [],
+    "brand": None,
+    "company": None,
+}
+
 vcr = VCR(cassette_library_dir=os.path.join(os.path.dirname(__file__), "cassettes"))
 
 
@@ -30,7 +55,7 @@ class TestGetProductsFromRealAPI(TestCase):
 # 🔸 Testy mockowane
 class TestProduktyWSieciClientMocked:
     def setup_method(self):
-        self.client = ProduktyWSieciClient(api_token="FAKE-TOKEN")
+        self.client = ProduktyWSieciClient(api_token="FAKE-TOKEN", max_retries=0)
 
     def test_should_return_none_when_not_found(self):
         mocked_resp = {"errors": [{"message": "not_found"}]}
@@ -41,7 +66,7 @@ class TestProduktyWSieciClientMocked:
             mock_response.raise_for_status = mock.Mock()
             mock_request.return_value = mock_response
 
-            result = self.client.get_products(gtin_number=TEST_EAN13, num_retries=0)
+            result = self.client.get_products(gtin_number=TEST_EAN13)
             assert result is None
 
     def test_should_raise_api_exception_on_custom_error(self):
@@ -54,7 +79,7 @@ class TestProduktyWSieciClientMocked:
             mock_request.return_value = mock_response
 
             with pytest.raises(ApiException, match="rate_limit_exceeded"):
-                self.client.get_products(gtin_number=TEST_EAN13, num_retries=0)
+                self.client.get_products(gtin_number=TEST_EAN13)
 
     def test_should_raise_key_error_on_unknown_error_structure(self):
         mocked_resp = {"errors": [{"foo": "bar"}]}
@@ -66,7 +91,7 @@ class TestProduktyWSieciClientMocked:
             mock_request.return_value = mock_response
 
             with pytest.raises(ApiException):
-                self.client.get_products(gtin_number=TEST_EAN13, num_retries=0)
+                self.client.get_products(gtin_number=TEST_EAN13)
 
     def test_should_handle_empty_response_json(self):
         """Test dla odpowiedzi: pusty słownik, brak 'errors'"""
@@ -79,7 +104,7 @@ class TestProduktyWSieciClientMocked:
             mock_request.return_value = mock_response
 
             with pytest.raises(Exception):
-                self.client.get_products(gtin_number=TEST_EAN13, num_retries=0)
+                self.client.get_products(gtin_number=TEST_EAN13)
 
     def test_should_handle_non_list_errors_field(self):
         """Test dla: {'errors': 'unexpected string'}"""
@@ -92,48 +117,7 @@ class TestProduktyWSieciClientMocked:
             mock_request.return_value = mock_response
 
             with pytest.raises(ApiException, match="Unknown error response"):
-                self.client.get_products(gtin_number=TEST_EAN13, num_retries=0)
-
-    def test_should_retry_until_failure_and_raise_error(self):
-        """Test, który wyczerpuje wszystkie próby i rzuca HTTPError"""
-        failing_resp = mock.Mock()
-        failing_resp.status_code = 500
-        failing_resp.raise_for_status.side_effect = HTTPError("Server error")
-
-        with mock.patch("requests.Session.request", return_value=failing_resp):
-            with pytest.raises(ApiException, match="Server error"):
-                self.client.get_products(gtin_number=TEST_EAN13, num_retries=2)
-
-    def test_should_retry_on_server_error_then_succeed(self):
-        retry_resp = mock.Mock()
-        retry_resp.status_code = 500
-        retry_resp.raise_for_status.side_effect = HTTPError("Server error")
-
-        success_resp = mock.Mock()
-        success_resp.status_code = 200
-        success_resp.json.return_value = {
-            "gtinNumber": TEST_EAN13,
-            "gtinStatus": "active",
-            "name": "Mocked Product",
-            "targetMarket": ["PL"],
-            "netContent": ["500", "ml"],
-            "description": "Mocked description",
-            "descriptionLanguage": "pl",
-            "imageUrls": [],
-            "productPage": None,
-            "isPublic": True,
-            "isVerified": True,
-            "lastModified": "2023-01-01T00:00:00+00:00",
-            "gpc": [],
-            "brand": None,
-            "company": None,
-        }
-        success_resp.raise_for_status = mock.Mock()
-
-        with mock.patch("requests.Session.request", side_effect=[retry_resp, success_resp]) as mock_request:
-            result = self.client.get_products(gtin_number=TEST_EAN13, num_retries=1)
-            assert result.gtinNumber == TEST_EAN13
-            assert mock_request.call_count == 2
+                self.client.get_products(gtin_number=TEST_EAN13)
 
     def test_should_raise_api_error_on_client_error(self):
         client_error = mock.Mock()
@@ -142,4 +126,155 @@ class TestProduktyWSieciClientMocked:
 
         with mock.patch("requests.Session.request", return_value=client_error):
             with pytest.raises(ApiException, match="Not found"):
-                self.client.get_products(gtin_number="BAD-CODE", num_retries=1)
+                self.client.get_products(gtin_number="BAD-CODE")
+
+
+class TestProduktyWSieciClientBackPressure:
+    def setup_method(self):
+        self.store = LocalStore()
+        self.circuit_breaker = CircuitBreaker(
+            'test', failure_threshold=2, failure_window=60, reset_timeout=30, connection=self.store
+        )
+        self.rate_limiter = mock.Mock()
+        self.rate_limiter.acquire.return_value = True
+        self.client = ProduktyWSieciClient(
+            api_token="FAKE-TOKEN", max_retries=0, rate_limiter=self.rate_limiter, circuit_breaker=self.circuit_breaker
+        )
+
+    def _mock_response(self, status_code):
+        response = mock.Mock()
+        response.status_code = status_code
+        response.raise_for_status.side_effect = HTTPError(str(status_code), response=response)
+        return response
+
+    def test_should_open_circuit_after_server_errors(self):
+        with mock.patch("requests.Session.request", return_value=self._mock_response(503)) as mock_request:
+            for _ in range(2):
+                with pytest.raises(ApiException):
+                    self.client.get_products(gtin_number=TEST_EAN13)
+            with pytest.raises(ServiceUnavailable):
+                self.client.get_products(gtin_number=TEST_EAN13)
+
+        assert mock_request.call_count == 2
+        assert not self.client.is_available()
+        assert self.client.get_circuit_breaker_stats()['state'] == CircuitBreaker.OPEN
+
+    def test_should_not_count_client_errors_as_failures(self):
+        with mock.patch("requests.Session.request", return_value=self._mock_response(404)):
+            for _ in range(3):
+                with pytest.raises(ApiException):
+                    self.client.get_products(gtin_number=TEST_EAN13)
+
+        assert self.client.is_available()
+
+    def test_should_not_send_request_when_rate_limited(self):
+        self.rate_limiter.acquire.return_value = False
+
+        with mock.patch("requests.Session.request") as mock_request:
+            with pytest.raises(ServiceUnavailable):
+                self.client.get_products(gtin_number=TEST_EAN13)
+
+        mock_request.assert_not_called()
+
+    def test_should_let_another_request_probe_when_probe_is_throttled(self):
+        for _ in range(2):
+            self.circuit_breaker.record_failure()
+        self.store.delete(self.circuit_breaker._open_key)
+        self.rate_limiter.acquire.return_value = False
+
+        with pytest.raises(ServiceUnavailable):
+            self.client.get_products(gtin_number=TEST_EAN13)
+
+        assert self.circuit_breaker.get_state() == CircuitBreaker.HALF_OPEN
+        assert self.circuit_breaker.allow_request()
+
+
+class _ScriptedHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        status, body = self.server.responses.pop(0) if len(self.server.responses) > 1 else self.server.responses[0]
+        self.server.requests.append(self.path)
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestProduktyWSieciClientHttp:
+    """Retries and connection reuse, tested against a local HTTP server."""
+
+    def setup_method(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _ScriptedHandler)
+        self.server.responses = []
+        self.server.requests = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.client = ProduktyWSieciClient(
+            api_token="FAKE-TOKEN", base_url=f"http://127.0.0.1:{self.server.server_port}/", max_retries=2
+        )
+
+    def teardown_method(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    @pytest.fixture(autouse=True)
+    def no_backoff(self):
+        with mock.patch.object(Retry, "sleep"):
+            yield
+
+    def test_should_retry_until_failure_and_raise_error(self):
+        self.server.responses = [(500, {})]
+
+        with pytest.raises(ApiException, match="500 Server Error"):
+            self.client.get_products(gtin_number=TEST_EAN13)
+        assert len(self.server.requests) == 3
+
+    def test_should_retry_on_server_error_then_succeed(self):
+        self.server.responses = [(503, {}), (200, PRODUCT_RESPONSE)]
+
+        result = self.client.get_products(gtin_number=TEST_EAN13)
+
+        assert result.gtinNumber == TEST_EAN13
+        assert len(self.server.requests) == 2
+
+    def test_should_not_retry_client_error(self):
+        self.server.responses = [(404, {})]
+
+        with pytest.raises(ApiException, match="404 Client Error"):
+            self.client.get_products(gtin_number=TEST_EAN13)
+        assert len(self.server.requests) == 1
+
+    def test_should_reuse_connections(self):
+        self.server.responses = [(200, PRODUCT_RESPONSE)]
+
+        for _ in range(3):
+            self.client.get_products(gtin_number=TEST_EAN13)
+
+        assert self.client.get_pool_stats() == {'requests': 3, 'connections': 1, 'reused': 2}
+
+
+class TestRateLimiter:
+    def test_should_space_out_calls(self):
+        rate_limiter = RateLimiter(rate=10)
+        with mock.patch('pola.integrations.http.time') as time_mock:
+            time_mock.monotonic.return_value = 100.0
+            rate_limiter._next_at = 100.0
+            for _ in range(3):
+                rate_limiter.wait()
+
+        assert [c.args[0] for c in time_mock.sleep.call_args_list] == pytest.approx([0.1, 0.2])
+
+    def test_should_not_wait_after_idle_period(self):
+        rate_limiter = RateLimiter(rate=10)
+        with mock.patch('pola.integrations.http.time') as time_mock:
+            time_mock.monotonic.side_effect = [100.0, 105.0]
+            rate_limiter._next_at = 100.0
+            rate_limiter.wait()
+            rate_limiter.wait()
+
+        time_mock.sleep.assert_not_called()
@@ -0,0 +1,122 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import override_settings
+from test_plus import TestCase
+
+from pola.company.factories import BrandFactory, CompanyFactory
+from pola.logic import (
+    get_by_codes,
+    get_result_from_code,
+    get_results_from_codes,
+)
+from pola.product.factories import ProductFactory
+
+
+@override_settings(SCAN_RESULT_CACHE_TIMEOUT=60)
+class TestScanResultCache(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.company = CompanyFactory(plCapital=100, plWorkers=100, plRnD=100, plRegistered=100, plNotGlobEnt=100)
+        self.product = ProductFactory(code="5900000000001", company=self.company)
+
+    def test_should_serve_repeated_scan_from_cache(self):
+        result, stats, product = get_result_from_code(self.product.code, multiple_company_supported=True)
+
+        with self.assertNumQueries(0):
+            cached_result, cached_stats, cached_product = get_result_from_code(
+                self.product.code, multiple_company_supported=True
+            )
+
+        self.assertEqual(result, cached_result)
+        self.assertEqual(stats, cached_stats)
+        self.assertEqual(product.pk, cached_product.pk)
+        self.assertEqual(self.company.pk, cached_product.company.pk)
+
+    def test_should_share_entries_with_batch_lookup(self):
+        other = ProductFactory(code="5900000000002", company=self.company)
+        result, _, _ = get_result_from_code(self.product.code, multiple_company_supported=True)
+
+        with mock.patch('pola.logic.get_by_codes', wraps=get_by_codes) as get_by_codes_mock:
+            results = get_results_from_codes([self.product.code, other.code], multiple_company_supported=True)
+        get_by_codes_mock.assert_called_once_with([other.code])
+        self.assertEqual(result, results[self.product.code][0])
+
+        with self.assertNumQueries(0):
+            cached = get_results_from_codes([other.code, self.product.code], multiple_company_supported=True)
+        self.assertEqual(results, cached)
+
+    def test_should_key_results_by_flags(self):
+        get_result_from_code(self.product.code)
+
+        result, _, _ = get_result_from_code(self.product.code, multiple_company_supported=True, report_as_object=True)
+
+        self.assertIn('companies', result)
+        self.assertIn('report', result)
+
+    def test_should_return_independent_copies(self):
+        result, _, _ = get_result_from_code(self.product.code)
+        result['donate'] = {}
+
+        cached_result, _, _ = get_result_from_code(self.product.code)
+
+        self.assertNotIn('donate', cached_result)
+
+    def test_should_invalidate_on_product_save(self):
+        get_result_from_code(self.product.code)
+
+        self.product.company = CompanyFactory(common_name="Inna firma")
+        self.product.save()
+
+        result, _, _ = get_result_from_code(self.product.code)
+        self.assertEqual("Inna firma", result['name'])
+
+    def test_should_invalidate_on_company_save(self):
+        get_result_from_code(self.product.code)
+
+        self.company.common_name = "Nowa nazwa"
+        self.company.save()
+
+        result, _, _ = get_result_from_code(self.product.code)
+        self.assertEqual("Nowa nazwa", result['name'])
+
+    def test_should_invalidate_on_brand_save(self):
+        brand = BrandFactory(company=self.company)
+        self.company.display_brands_in_description = True
+        self.company.save()
+        get_result_from_code(self.product.code)
+
+        brand.common_name = "Nowa marka"
+        brand.save()
+
+        result, _, _ = get_result_from_code(self.product.code)
+        self.assertIn("Nowa marka", result['description'])
+
+    def test_should_invalidate_on_replacements_change(self):
+        replacement = ProductFactory(code="5900000000003", name="Zamiennik")
+        get_result_from_code(self.product.code)
+
+        self.product.replacements.add(replacement)
+
+        result, _, _ = get_result_from_code(self.product.code)
+        self.assertEqual(["5900000000003"], [r['code'] for r in result['replacements']])
+
+    def test_should_invalidate_on_reverse_replacements_change(self):
+        replacement = ProductFactory(code="5900000000003", name="Zamiennik")
+        get_result_from_code(self.product.code)
+
+        replacement.replaced_by.add(self.product)
+
+        result, _, _ = get_result_from_code(self.product.code)
+        self.assertEqual(["5900000000003"], [r['code'] for r in result['replacements']])
+
+    def test_should_not_cache_invalid_codes(self):
+        get_result_from_code("ABC")
+
+        self.assertIsNone(cache.get("scan_result_v1_ABC_0_0"))
+
+    @override_settings(SCAN_RESULT_CACHE_TIMEOUT=0)
+    def test_should_not_use_cache_when_disabled(self):
+        get_result_from_code(self.product.code)
+
+        self.assertIsNone(cache.get("scan_result_v1_5900000000001_0_0"))
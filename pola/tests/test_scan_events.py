@@ -0,0 +1,151 @@
+from unittest import mock
+
+from django.test import override_settings
+from test_plus import TestCase
+
+from pola import counters, scan_events
+from pola.company.factories import CompanyFactory
+from pola.models import Query
+from pola.product.factories import ProductFactory
+from pola.product.models import Product
+from pola.scan_events import (
+    MemoryScanEventBuffer,
+    create_scan_event,
+    record_scan,
+    write_scan_events,
+)
+
+STATS = {'was_verified': True, 'was_590': True, 'was_plScore': False}
+
+
+class TestWriteScanEvents(TestCase):
+    def test_should_create_queries_and_aggregate_counts(self):
+        company = CompanyFactory()
+        p1 = ProductFactory(company=company)
+        p2 = ProductFactory(company=company)
+        p3 = ProductFactory(company=None)
+        events = [
+            create_scan_event('device-1', p1, STATS),
+            create_scan_event('device-2', p1, STATS),
+            create_scan_event('device-1', p2, STATS),
+            create_scan_event('device-3', p3, STATS),
+        ]
+
+        with self.assertNumQueries(6):
+            write_scan_events(events)
+
+        self.assertEqual(4, Query.objects.count())
+        self.assertEqual({'device-1', 'device-2', 'device-3'}, set(Query.objects.values_list('client', flat=True)))
+        self.assertTrue(all(Query.objects.values_list('was_verified', flat=True)))
+        counters.fold()
+        p1.refresh_from_db()
+        p2.refresh_from_db()
+        p3.refresh_from_db()
+        company.refresh_from_db()
+        self.assertEqual((2, 1, 1), (p1.query_count, p2.query_count, p3.query_count))
+        self.assertEqual(3, company.query_count)
+
+    def test_should_keep_scan_timestamp(self):
+        product = ProductFactory()
+        event = create_scan_event('device-1', product, STATS)
+        event['timestamp'] = '2024-01-02T03:04:05+00:00'
+
+        write_scan_events([event])
+
+        self.assertEqual('2024-01-02T03:04:05+00:00', Query.objects.get().timestamp.isoformat())
+
+    def test_should_skip_events_of_deleted_products(self):
+        product = ProductFactory()
+        deleted_product = ProductFactory()
+        events = [create_scan_event('device-1', product, STATS), create_scan_event('device-1', deleted_product, STATS)]
+        Product.objects.filter(pk=deleted_product.pk).delete()
+
+        write_scan_events(events)
+
+        self.assertEqual([product.pk], list(Query.objects.values_list('product_id', flat=True)))
+
+
+class TestRecordScan(TestCase):
+    def test_should_write_immediately_with_sync_backend(self):
+        product = ProductFactory()
+
+        record_scan('device-1', product, STATS)
+
+        self.assertEqual(1, Query.objects.count())
+
+    @override_settings(SCAN_EVENTS={'BACKEND': 'unknown', 'FLUSH_SIZE': 10, 'FLUSH_INTERVAL': 10})
+    def test_should_raise_for_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            record_scan('device-1', ProductFactory(), STATS)
+
+
+class TestMemoryScanEventBuffer(TestCase):
+    def setUp(self):
+        self.buffer = MemoryScanEventBuffer(flush_size=2, flush_interval=60)
+        patcher = mock.patch.object(self.buffer, '_ensure_worker')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(lambda: self.buffer._events.clear())
+
+    def test_should_buffer_events_until_commit(self):
+        product = ProductFactory()
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.buffer.push(create_scan_event('device-1', product, STATS))
+            self.assertEqual([], self.buffer._events)
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(1, len(self.buffer._events))
+        self.assertEqual(0, Query.objects.count())
+
+    def test_should_wake_up_worker_when_full(self):
+        product = ProductFactory()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.buffer.push(create_scan_event('device-1', product, STATS))
+        self.assertFalse(self.buffer._wakeup.is_set())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.buffer.push(create_scan_event('device-1', product, STATS))
+        self.assertTrue(self.buffer._wakeup.is_set())
+
+    def test_should_flush_in_batches(self):
+        product = ProductFactory()
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(5):
+                self.buffer.push(create_scan_event('device-1', product, STATS))
+
+        with mock.patch.object(scan_events, 'write_scan_events', wraps=write_scan_events) as write_mock:
+            written = self.buffer.flush()
+
+        self.assertEqual(5, written)
+        self.assertEqual([2, 2, 1], [len(c.args[0]) for c in write_mock.call_args_list])
+        self.assertEqual([], self.buffer._events)
+        self.assertEqual(5, counters.get_query_count(product, exact=True))
+
+    def test_should_keep_events_when_write_fails(self):
+        product = ProductFactory()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.buffer.push(create_scan_event('device-1', product, STATS))
+
+        with mock.patch.object(scan_events, 'write_scan_events', side_effect=RuntimeError()):
+            with self.assertRaises(RuntimeError):
+                self.buffer.flush()
+
+        self.assertEqual(1, len(self.buffer._events))
+
+    def test_should_drop_only_events_that_cannot_be_written(self):
+        product = ProductFactory()
+        invalid_event = {**create_scan_event('device-1', product, STATS), 'client': 'x' * 41}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.buffer.push_many([create_scan_event('device-1', product, STATS), invalid_event])
+
+        self.assertEqual(1, self.buffer.flush())
+
+        self.assertEqual([], self.buffer._events)
+        self.assertEqual(['device-1'], list(Query.objects.values_list('client', flat=True)))
+
+    def test_should_truncate_long_device_ids(self):
+        event = create_scan_event('x' * 50, ProductFactory(), STATS)
+
+        self.assertEqual('x' * 40, event['client'])
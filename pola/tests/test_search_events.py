@@ -0,0 +1,107 @@
+import datetime
+from unittest import mock
+
+from django.test import override_settings
+from test_plus import TestCase
+
+from pola import search_events
+from pola.models import SearchQuery, SearchQueryStats
+from pola.search_events import (
+    MemorySearchEventBuffer,
+    create_search_event,
+    record_search,
+    write_search_events,
+)
+
+
+class TestWriteSearchEvents(TestCase):
+    def test_should_create_queries_and_aggregate_stats(self):
+        events = [
+            create_search_event('device-1', 'Płatki', 10),
+            create_search_event('device-2', 'platki ', 10),
+            create_search_event('device-1', 'xyz', 0),
+            create_search_event('device-2', 'XYZ', 0),
+            create_search_event('device-3', 'xyz abc', 0),
+        ]
+
+        with self.assertNumQueries(4):
+            write_search_events(events)
+
+        self.assertEqual(5, SearchQuery.objects.count())
+        self.assertEqual(
+            [('platki', 2, 0), ('xyz', 2, 2), ('xyz abc', 1, 1)],
+            list(SearchQueryStats.objects.order_by('text').values_list('text', 'count', 'zero_results_count')),
+        )
+
+    def test_should_skip_stats_of_texts_without_words(self):
+        write_search_events([create_search_event('device-1', '!!!', 0)])
+
+        self.assertEqual(1, SearchQuery.objects.count())
+        self.assertFalse(SearchQueryStats.objects.exists())
+
+    def test_should_truncate_long_values(self):
+        event = create_search_event('x' * 50, 'y' * 300, 0)
+
+        self.assertEqual(('x' * 40, 'y' * 255), (event['client'], event['text']))
+
+    def test_should_increment_stats_of_the_same_day(self):
+        write_search_events([create_search_event('device-1', 'xyz', 0)])
+        write_search_events([create_search_event('device-1', 'xyz', 3)])
+
+        stats = SearchQueryStats.objects.get()
+        self.assertEqual((2, 1), (stats.count, stats.zero_results_count))
+
+    def test_should_keep_search_timestamp_and_day(self):
+        event = create_search_event('device-1', 'xyz', 0)
+        event['timestamp'] = '2024-01-02T23:30:00+00:00'
+
+        write_search_events([event])
+
+        self.assertEqual('2024-01-02T23:30:00+00:00', SearchQuery.objects.get().timestamp.isoformat())
+        # Days are counted in the local time zone.
+        self.assertEqual(datetime.date(2024, 1, 3), SearchQueryStats.objects.get().day)
+
+
+class TestRecordSearch(TestCase):
+    def test_should_write_immediately_with_sync_backend(self):
+        record_search('device-1', 'xyz', 0)
+
+        self.assertEqual(1, SearchQuery.objects.count())
+        self.assertEqual(1, SearchQueryStats.objects.get().zero_results_count)
+
+    @override_settings(SEARCH_EVENTS={'BACKEND': 'unknown', 'FLUSH_SIZE': 10, 'FLUSH_INTERVAL': 10})
+    def test_should_raise_for_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            record_search('device-1', 'xyz', 0)
+
+
+class TestMemorySearchEventBuffer(TestCase):
+    def setUp(self):
+        self.buffer = MemorySearchEventBuffer(flush_size=2, flush_interval=60)
+        patcher = mock.patch.object(self.buffer, '_ensure_worker')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(lambda: self.buffer._events.clear())
+
+    def test_should_flush_in_batches(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(3):
+                self.buffer.push(create_search_event('device-1', 'xyz', 0))
+        self.assertEqual(0, SearchQuery.objects.count())
+
+        with mock.patch.object(search_events, 'write_search_events', wraps=write_search_events) as write_mock:
+            written = self.buffer.flush()
+
+        self.assertEqual(3, written)
+        self.assertEqual([2, 1], [len(c.args[0]) for c in write_mock.call_args_list])
+        self.assertEqual(3, SearchQueryStats.objects.get().count)
+
+    def test_should_drop_only_events_that_cannot_be_written(self):
+        invalid_event = {**create_search_event('device-1', 'xyz', 0), 'client': 'x' * 41}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.buffer.push_many([create_search_event('device-1', 'xyz', 0), invalid_event])
+
+        self.assertEqual(1, self.buffer.flush())
+
+        self.assertEqual([], self.buffer._events)
+        self.assertEqual(['device-1'], list(SearchQuery.objects.values_list('client', flat=True)))
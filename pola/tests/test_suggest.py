@@ -0,0 +1,205 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from redis.exceptions import RedisError
+
+from pola import suggest
+from pola.company.factories import BrandFactory, CompanyFactory
+from pola.product.factories import ProductFactory
+from pola.product.models import Product
+from pola.suggest import (
+    BRAND,
+    COMPANY,
+    PRODUCT,
+    Suggester,
+    SuggestIndex,
+    Suggestion,
+    publish_change,
+)
+
+SUGGEST_SETTINGS = {'REBUILD_INTERVAL': 3600, 'SYNC_INTERVAL': 0, 'MAX_CHANGES': 10, 'MIN_PRODUCT_QUERY_COUNT': 0}
+
+
+def product(object_id, name, weight):
+    return Suggestion(PRODUCT, object_id, name, weight, (name,))
+
+
+class TestSuggestIndex(TestCase):
+    def test_should_return_matches_from_the_heaviest(self):
+        index = SuggestIndex(
+            [
+                product(1, 'Baton Prince Polo', 5),
+                product(2, 'Batonik owsiany', 50),
+                product(3, 'Czekolada gorzka', 500),
+                product(4, 'Baton', 7),
+                product(5, 'Bułka', 1000),
+            ]
+        )
+
+        self.assertEqual([2, 4, 1], [suggestion.object_id for _, suggestion in index.iter_matches('baton')])
+        self.assertEqual([], list(index.iter_matches('batonik x')))
+
+    def test_should_match_words_and_fold_diacritics(self):
+        index = SuggestIndex([product(1, 'Czekolada Gorzka', 1), product(2, 'Żółty ser', 2)])
+
+        self.assertEqual([(1, 'gorzka')], [(s.object_id, key) for key, s in index.iter_matches('gorz')])
+        self.assertEqual([2], [s.object_id for _, s in index.iter_matches('zolty s')])
+
+    def test_should_match_many_names(self):
+        suggestions = [product(i, f'Name {i % 7}', i) for i in range(1000)]
+        index = SuggestIndex(suggestions)
+
+        matches = [suggestion.object_id for _, suggestion in index.iter_matches('name 3')]
+
+        self.assertEqual(list(range(997, 0, -7)), matches)
+
+    def test_should_build_empty_index(self):
+        self.assertEqual([], list(SuggestIndex([]).iter_matches('a')))
+
+
+@override_settings(SUGGEST=SUGGEST_SETTINGS)
+class TestSuggester(TestCase):
+    def setUp(self):
+        cache.delete(suggest.CHANGES_KEY)
+        self.suggestions = [
+            product(1, 'Baton', 10),
+            product(2, 'Baton', 20),
+            Suggestion(BRAND, 1, 'Baton', 5, ('Baton',)),
+            Suggestion(COMPANY, 1, 'Batony SA', 30, ('Batony SA',)),
+        ]
+        self.suggester = Suggester(load=self.load)
+        self.suggester._rebuild()
+
+    def load(self, ids=None):
+        if ids is None:
+            return list(self.suggestions)
+        return [s for s in self.suggestions if s.object_id in ids.get(s.kind, ())]
+
+    def test_should_build_first_index_in_background(self):
+        suggester = Suggester(load=self.load)
+
+        with mock.patch.object(suggester, '_start_rebuild') as start_rebuild:
+            self.assertEqual([], suggester.suggest('bat'))
+
+        start_rebuild.assert_called_once()
+
+    def test_should_not_be_ready_until_first_index_is_built(self):
+        suggester = Suggester(load=self.load)
+
+        with mock.patch.object(suggester, '_start_rebuild') as start_rebuild:
+            self.assertFalse(suggester.is_ready())
+
+        start_rebuild.assert_called_once()
+        self.assertTrue(self.suggester.is_ready())
+
+    def test_should_suggest_kinds(self):
+        self.assertEqual(
+            [(COMPANY, 1), (PRODUCT, 2), (PRODUCT, 1), (BRAND, 1)],
+            [(s.kind, s.object_id) for s in self.suggester.suggest('bat')],
+        )
+        self.assertEqual([(BRAND, 1)], [(s.kind, s.object_id) for s in self.suggester.suggest('bat', kinds=[BRAND])])
+
+    def test_should_suggest_unique_texts(self):
+        suggestions = self.suggester.suggest('bat', limit=2, unique_texts=True)
+
+        self.assertEqual(['Batony SA', 'Baton'], [s.text for s in suggestions])
+
+    def test_should_suggest_nothing_without_words(self):
+        self.assertEqual([], self.suggester.suggest(' !'))
+
+    def test_should_include_changes(self):
+        self.suggester.update(product(1, 'Batonik', 100))
+        self.suggester.update(product(3, 'Batat', 1))
+        self.suggester.remove(PRODUCT, 2)
+
+        self.assertEqual(
+            [(PRODUCT, 1), (COMPANY, 1), (BRAND, 1), (PRODUCT, 3)],
+            [(s.kind, s.object_id) for s in self.suggester.suggest('bat')],
+        )
+        self.assertEqual([1], [s.object_id for s in self.suggester.suggest('baton', kinds=[PRODUCT])])
+
+    def test_should_read_changes_of_other_processes(self):
+        self.suggestions[0] = product(1, 'Wafel', 10)
+        self.suggestions.pop(1)
+        publish_change(PRODUCT, 1)
+        publish_change(PRODUCT, 2)
+
+        self.assertEqual([(COMPANY, 1), (BRAND, 1)], [(s.kind, s.object_id) for s in self.suggester.suggest('bat')])
+        self.assertEqual([(PRODUCT, 1)], [(s.kind, s.object_id) for s in self.suggester.suggest('waf')])
+
+    def test_should_rebuild_when_changes_grow(self):
+        for i in range(11):
+            self.suggester.update(product(100 + i, 'Wafel', i))
+
+        with mock.patch.object(self.suggester, '_start_rebuild') as start_rebuild:
+            self.suggester.suggest('bat')
+
+        start_rebuild.assert_called_once()
+
+    def test_should_keep_changes_made_during_rebuild(self):
+        self.suggester.update(product(1, 'Batonik', 100))
+
+        def load(ids=None):
+            self.suggester.update(product(4, 'Batat', 1))
+            return self.load(ids)
+
+        self.suggester.load = load
+        self.suggester._rebuild()
+
+        self.assertEqual({(PRODUCT, 4)}, set(self.suggester._changes))
+
+
+class TestSuggest(TestCase):
+    def test_should_read_names_from_database(self):
+        company = CompanyFactory(name='Wedel sp. z o.o.', common_name='Wedel', query_count=100)
+        BrandFactory(name='wedelek', common_name='Wedelek', company=company)
+        ProductFactory(name='Wedlowska czekolada', query_count=10, company=company)
+
+        self.assertEqual(['Wedel', 'Wedlowska czekolada', 'Wedelek'], [s.text for s in suggest.suggest('wed')])
+
+    @override_settings(SUGGEST={**SUGGEST_SETTINGS, 'REBUILD_INTERVAL': 0, 'MIN_PRODUCT_QUERY_COUNT': 5})
+    def test_should_skip_rarely_scanned_products(self):
+        ProductFactory(name='Baton', query_count=4)
+        ProductFactory(name='Batonik', query_count=5)
+
+        self.assertEqual(['Batonik'], [s.text for s in suggest.suggest('bat', kinds=[PRODUCT])])
+
+    @override_settings(SUGGEST=SUGGEST_SETTINGS)
+    def test_should_record_saved_and_deleted_objects(self):
+        product = ProductFactory(name='Baton')
+        product_id = product.pk
+        change_number = suggest.get_change_number()
+
+        with mock.patch.object(suggest, 'suggester', Suggester()) as suggester:
+            with self.captureOnCommitCallbacks(execute=True):
+                product.name = 'Wafel'
+                product.save()
+            self.assertEqual('Wafel', suggester._changes[(PRODUCT, product_id)][0].text)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                product.delete()
+            self.assertIsNone(suggester._changes[(PRODUCT, product_id)][0])
+
+        self.assertEqual(change_number + 2, suggest.get_change_number())
+
+    @override_settings(SUGGEST=SUGGEST_SETTINGS)
+    def test_should_not_publish_products_without_name(self):
+        change_number = suggest.get_change_number()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.create(code='5901234123457')
+            product.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            product.name = 'Baton'
+            product.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            product.name = ''
+            product.save()
+
+        self.assertEqual(change_number + 2, suggest.get_change_number())
+
+    def test_should_not_fail_when_publishing_fails(self):
+        with mock.patch.object(cache, 'incr', side_effect=RedisError):
+            with self.assertLogs('pola.suggest', level='WARNING'):
+                publish_change(PRODUCT, 1)
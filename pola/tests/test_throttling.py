@@ -0,0 +1,147 @@
+from unittest import mock
+
+from redis.exceptions import ConnectionError as RedisConnectionError
+from test_plus import TestCase
+
+from pola.integrations.throttling import (
+    CircuitBreaker,
+    LocalStore,
+    SlidingWindow,
+    TokenBucket,
+)
+
+
+def create_unavailable_connection():
+    connection = mock.Mock()
+    for method in ('exists', 'set', 'get', 'incr', 'expire', 'delete'):
+        getattr(connection, method).side_effect = RedisConnectionError()
+    connection.register_script.return_value.side_effect = RedisConnectionError()
+    return connection
+
+
+class TestCircuitBreaker(TestCase):
+    def setUp(self):
+        self.store = LocalStore()
+        self.breaker = CircuitBreaker(
+            'test', failure_threshold=3, failure_window=60, reset_timeout=30, connection=self.store
+        )
+
+    def test_should_open_after_failure_threshold(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.assertEqual({'state': CircuitBreaker.CLOSED, 'failures': 2}, self.breaker.get_stats())
+        self.assertTrue(self.breaker.allow_request())
+
+        self.breaker.record_failure()
+
+        self.assertTrue(self.breaker.is_open())
+        self.assertFalse(self.breaker.allow_request())
+
+    def test_should_reset_failures_after_success(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+
+        self.assertEqual(CircuitBreaker.CLOSED, self.breaker.get_state())
+
+    def test_should_let_single_probe_through_when_half_open(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.store.delete(self.breaker._open_key)
+
+        self.assertEqual(CircuitBreaker.HALF_OPEN, self.breaker.get_state())
+        self.assertTrue(self.breaker.allow_request())
+        self.assertFalse(self.breaker.allow_request())
+
+        self.breaker.record_success()
+
+        self.assertEqual(CircuitBreaker.CLOSED, self.breaker.get_state())
+        self.assertTrue(self.breaker.allow_request())
+
+    def test_should_open_again_when_probe_fails(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.store.delete(self.breaker._open_key)
+        self.breaker.allow_request()
+
+        self.breaker.record_failure()
+
+        self.assertTrue(self.breaker.is_open())
+
+    def test_should_fall_back_to_local_state_when_redis_is_unavailable(self):
+        breaker = CircuitBreaker(
+            'test', failure_threshold=1, failure_window=60, reset_timeout=30, connection=create_unavailable_connection()
+        )
+
+        breaker.record_failure()
+
+        self.assertTrue(breaker.is_open())
+
+
+class TestTokenBucket(TestCase):
+    def test_should_limit_requests_to_capacity(self):
+        bucket = TokenBucket('test', rate=0.01, capacity=2, connection=create_unavailable_connection())
+
+        self.assertTrue(bucket.acquire())
+        self.assertTrue(bucket.acquire())
+        self.assertFalse(bucket.acquire())
+
+    def test_should_use_redis_script(self):
+        connection = mock.Mock()
+        connection.register_script.return_value.side_effect = ['0', '0.5']
+        bucket = TokenBucket('test', rate=2, capacity=1, connection=connection)
+
+        self.assertTrue(bucket.acquire())
+        self.assertFalse(bucket.acquire(timeout=0.1))
+        _, kwargs = connection.register_script.return_value.call_args
+        self.assertEqual(['pola:token_bucket:test'], kwargs['keys'])
+
+
+class TestSlidingWindow(TestCase):
+    def setUp(self):
+        self.window = SlidingWindow('test', limit=4, window=10, connection=create_unavailable_connection())
+
+    def test_should_limit_cost_within_window(self):
+        with mock.patch('pola.integrations.throttling.time.time', return_value=1000):
+            self.assertTrue(self.window.hit(['ip:1'], cost=3))
+            self.assertFalse(self.window.hit(['ip:1'], cost=2))
+            self.assertTrue(self.window.hit(['ip:1']))
+            self.assertTrue(self.window.hit(['ip:2'], cost=4))
+
+    def test_should_count_part_of_previous_window(self):
+        with mock.patch('pola.integrations.throttling.time.time', return_value=1000):
+            self.window.hit(['ip:1'], cost=4)
+
+        # 75% of the previous window is still within the sliding window.
+        with mock.patch('pola.integrations.throttling.time.time', return_value=1012.5):
+            self.assertFalse(self.window.hit(['ip:1'], cost=2))
+            self.assertTrue(self.window.hit(['ip:1'], cost=1))
+
+    def test_should_not_count_when_any_key_is_limited(self):
+        with mock.patch('pola.integrations.throttling.time.time', return_value=1000):
+            self.window.hit(['device:a'], cost=4)
+
+            self.assertFalse(self.window.hit(['ip:1', 'device:a']))
+            self.assertTrue(self.window.hit(['ip:1'], cost=4))
+
+    def test_should_use_redis_script(self):
+        connection = mock.Mock()
+        connection.register_script.return_value.side_effect = [1, 0]
+        window = SlidingWindow('test', limit=4, window=10, connection=connection)
+
+        with mock.patch('pola.integrations.throttling.time.time', return_value=1002.5):
+            self.assertTrue(window.hit(['ip:1', 'device:a'], cost=2))
+            self.assertFalse(window.hit(['ip:1']))
+
+        _, kwargs = connection.register_script.return_value.call_args_list[0]
+        self.assertEqual(
+            [
+                'pola:sliding_window:test:ip:1:100',
+                'pola:sliding_window:test:ip:1:99',
+                'pola:sliding_window:test:device:a:100',
+                'pola:sliding_window:test:device:a:99',
+            ],
+            kwargs['keys'],
+        )
+        self.assertEqual([4, 2, 0.75, 20], kwargs['args'])
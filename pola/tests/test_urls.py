@@ -8,4 +8,5 @@ class TestHome(TestCase):
         self.assertEqual("/cms/stats", reverse("home-stats"))
         self.assertEqual("/cms/editors-stats", reverse("home-editors-stats"))
         self.assertEqual("/cms/admin-stats", reverse("home-admin-stats"))
+        self.assertEqual("/cms/metrics", reverse("metrics"))
         self.assertEqual("/cms/lang/", reverse("select_lang"))
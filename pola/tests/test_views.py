@@ -5,8 +5,9 @@ from django.urls import reverse, reverse_lazy
 from django_webtest import WebTestMixin
 from test_plus.test import TestCase
 
+from pola import metrics
 from pola.models import AppConfiguration
-from pola.users.factories import StaffFactory
+from pola.users.factories import StaffFactory, UserFactory
 
 
 class PermissionMixin:
@@ -97,6 +98,29 @@ class TestReleaseView(TemplateUsedMixin, TestCase):
             self.assertEqual(list(resp.json().keys()), ['release_sha', 'release_link'])
 
 
+class TestMetricsView(PermissionMixin, TestCase):
+    url = reverse_lazy('metrics')
+
+    def test_return_json(self):
+        metrics.increment('test.counter')
+        self.login()
+
+        resp = self.client.get(self.url)
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()['pid'], os.getpid())
+        self.assertGreaterEqual(resp.json()['counters']['test.counter'], 1)
+        self.assertIn('produkty_w_sieci.pool', resp.json()['gauges'])
+
+    def test_non_staff_denied(self):
+        user = UserFactory()
+        self.login(username=user.username)
+
+        resp = self.client.get(self.url)
+
+        self.assertEqual(resp.status_code, 403)
+
+
 class TestAppConfigurationUpdateView(TemplateUsedMixin, PermissionMixin, TestCase):
     template_name = 'pages/app_config_form.html'
     url = reverse_lazy('app-config')
@@ -1,5 +1,18 @@
 import re
 
+# Letters with diacritics and their ASCII counterparts, used to fold texts for search. Upper case letters are listed
+# too, as lower() of the database does not change them in every locale.
+DIACRITICS = 'ąćęłńóśźżáàâäãåçčďéèêëěíìîïľňñòôöõřšťúùûüůýÿž'
+FOLDED_DIACRITICS = 'acelnoszzaaaaaaccdeeeeeiiiilnnoooorstuuuuuyyz'
+DIACRITICS += DIACRITICS.upper()
+FOLDED_DIACRITICS += FOLDED_DIACRITICS
+_FOLD_TABLE = str.maketrans(DIACRITICS, FOLDED_DIACRITICS)
+
+
+def fold_diacritics(text):
+    """Lower case ``text`` and replace letters with diacritics, e.g. "Żółć" becomes "zolc"."""
+    return text.translate(_FOLD_TABLE).lower()
+
 
 def rem_dbl_newlines(str):
     return str.replace('\r\n\r\n', '\r\n').replace('\n\n', '\n')
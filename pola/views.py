@@ -1,13 +1,14 @@
+import operator
 import os
 from datetime import datetime, timedelta
 from functools import reduce
 from textwrap import dedent
 
 from braces.views import FormValidMessageMixin
-from django.contrib.auth.mixins import LoginRequiredMixin
+from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.core.exceptions import ImproperlyConfigured, ObjectDoesNotExist
 from django.db import connection
-from django.db.models import Q
+from django.db.models import Case, Q, When
 from django.db.models.functions import Length
 from django.http import HttpResponseRedirect, JsonResponse
 from django.urls import reverse_lazy
@@ -15,12 +16,13 @@ from django.utils import timezone
 from django.utils.encoding import force_str
 from django.utils.timezone import get_default_timezone
 from django.utils.translation import gettext_lazy as _
-from django.views.generic import TemplateView, UpdateView
+from django.views.generic import TemplateView, UpdateView, View
 from django.views.generic.detail import (
     BaseDetailView,
     SingleObjectTemplateResponseMixin,
 )
 
+from pola import metrics, suggest
 from pola.company.models import Company
 from pola.forms import AppConfigurationForm
 from pola.mixins import LoginPermissionRequiredMixin
@@ -101,27 +103,36 @@ class FrontPageView(LoginRequiredMixin, TemplateView):
         return c
 
 
-class ExprAutocompleteMixin:
-    def get_search_expr(self):
-        if not hasattr(self, 'search_expr'):
-            raise ImproperlyConfigured(
-                '{0} is missing a {0}.search_expr. Define '
-                '{0}.search_expr or override {0}.get_search_expr().'
-                ''.format(self.__class__.__name__)
-            )
-        return self.search_expr
+def order_by_position(ids):
+    """Return an expression ordering objects as in ``ids``, objects not in ``ids`` last."""
+    return Case(*(When(pk=pk, then=position) for position, pk in enumerate(ids)), default=len(ids))
 
-    def get_filters(self):
-        q = [Q(**{x: self.q}) for x in self.get_search_expr()]
-        return reduce(lambda x, y: x | y, q)
 
-    def get_queryset(self):
-        qs = self.model.objects.all()
+class SuggestAutocompleteMixin:
+    """Autocomplete of names that start with the typed words, from the most popular. See :mod:`pola.suggest`."""
+
+    suggest_kind = None
+    suggest_limit = 100
+    # Lookups of the typed text used until the suggest index of the process is built, which takes a while, and when
+    # no name starts with the typed words, e.g. for a part of a word.
+    search_expr = ()
 
-        if self.q:
-            qs = qs.filter(self.get_filters())
+    def get_suggested_ids(self, kind):
+        suggestions = suggest.suggest(self.q, limit=self.suggest_limit, kinds=[kind])
+        return [suggestion.object_id for suggestion in suggestions]
 
-        return qs
+    def get_search_filters(self):
+        return reduce(operator.or_, (Q(**{lookup: self.q}) for lookup in self.search_expr))
+
+    def get_queryset(self):
+        qs = self.model.objects.all()
+        if not self.q:
+            return qs
+        if suggest.is_ready():
+            ids = self.get_suggested_ids(self.suggest_kind)
+            if ids:
+                return qs.filter(pk__in=ids).order_by(order_by_position(ids))
+        return qs.filter(self.get_search_filters())
 
 
 class ActionMixin:
@@ -284,3 +295,13 @@ class AppConfigurationUpdateView(LoginPermissionRequiredMixin, FormValidMessageM
 
     def form_valid(self, form):
         return super().form_valid(form)
+
+
+class MetricsView(LoginRequiredMixin, UserPassesTestMixin, View):
+    """Metrics of the process that handles the request, see :mod:`pola.metrics`."""
+
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def get(self, request, *args, **kwargs):
+        return JsonResponse(metrics.get_metrics())